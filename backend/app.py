@@ -6,6 +6,7 @@ import traceback
 # Upload endpoints functions
 from endpoints.upload_image import detect_endpoint
 from endpoints.test import test
+from endpoints.metrics import metrics
 
 # init flask api for normal backend endpoints
 app = Flask(__name__)
@@ -19,6 +20,11 @@ socketio = SocketIO(app, cors_allowed_origins="*")
 def root():
   return test()
 
+# Backend performance metrics -----------------------------------------------------------
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+  return metrics()
+
 ## ----------------- websocket for streaming -------------------------------------------
 # Global error handler
 @socketio.on_error_default
@@ -41,9 +47,13 @@ def handle_disconnect():
   print('❌ Client disconnected!')
 
 # connection between the flutter app
+# data: {"img", "lon", "lat", "ppm"} where img is a binary attachment or a base64 string
+# the image can also be sent as a second binary argument: emit("stream_image", metadata, bytes)
 @socketio.on("stream_image")
-def stream(data):
+def stream(data, img=None):
   try:
+    if img is not None:
+      data = {**data, "img": img}
     
     # This function prepares data and then calls the model
     # then sends the response
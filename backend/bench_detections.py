@@ -0,0 +1,95 @@
+# Benchmark: post-processing of the detections of one frame in detect()
+# old: loop over the boxes, 3 tensor -> array conversions and one dict per box
+# new: Detections, the columns are converted once per frame (and the dicts built from lists),
+#      nothing is converted or built for the frames without detections
+# Uses torch tensors when torch is installed (like ultralytics Boxes), numpy arrays otherwise.
+#
+# Usage (from backend/): python bench_detections.py [n_frames]
+
+import sys
+import time
+import numpy as np
+from detections import Detections, EMPTY_DETECTIONS, NO_DETECTIONS
+
+NAMES = {i: name for i, name in enumerate([
+  'Rutting', 'Reflective & Transverse Crack', 'Block Crack', 'Longitudinal Crack', 'Alligator Crack',
+  'Patching', 'Potholes', 'Bleeding', 'Corrugation', 'Raveling & Weathering', 'Bumps & Sags'
+])}
+
+try:
+  import torch
+
+  def tensor(values):
+    return torch.from_numpy(values)
+
+  def to_numpy(values):
+    return values.cpu().numpy()
+except ImportError:
+  def tensor(values):
+    return values
+
+  def to_numpy(values):
+    return np.asarray(values)
+
+def make_boxes(n_boxes, rng):
+  return (
+    tensor(rng.integers(0, len(NAMES), n_boxes).astype(np.float32)),
+    tensor(rng.random(n_boxes).astype(np.float32)),
+    tensor((rng.random((n_boxes, 4)) * 640).astype(np.float32)),
+  )
+
+def old_labels(cls, conf, xyxy):
+  # same as the old detect() loop (one box at a time)
+  labels = []
+  for i in range(len(cls)):
+    cls_id = int(to_numpy(cls[i:i + 1])[0])
+    score = float(to_numpy(conf[i:i + 1])[0])
+    box = to_numpy(xyxy[i:i + 1])[0]
+
+    labels.append({
+      "label": NAMES[cls_id],
+      "confidence": float(score),
+      "x1": float(box[0]),
+      "y1": float(box[1]),
+      "x2": float(box[2]),
+      "y2": float(box[3]),
+    })
+  return labels
+
+def new_labels(cls, conf, xyxy):
+  # same as the torch backend + detect() + detect_endpoint (no copies or dicts for the frames without cracks)
+  arrays = (to_numpy(cls), to_numpy(conf), to_numpy(xyxy)) if len(cls) else EMPTY_DETECTIONS
+  detections = Detections(*arrays, NAMES) if len(arrays[0]) else NO_DETECTIONS
+  return detections.to_dicts() if len(detections) else []
+
+def best_run(labels, frames, runs=5):
+  # records of the frames and the best us / frame of a few runs (less noise on the small frames)
+  best = float('inf')
+  for _ in range(runs):
+    start = time.perf_counter()
+    records = [labels(*frame) for frame in frames]
+    best = min(best, (time.perf_counter() - start) / len(frames) * 1e6)
+  return records, best
+
+if __name__ == '__main__':
+  n_frames = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+  rng = np.random.default_rng(0)
+
+  print(f"{n_frames} frames per run, best of 5 runs")
+  print(f"{'boxes':>6}{'old us/frame':>15}{'new us/frame':>15}{'speedup':>9}")
+
+  for n_boxes in [0, 1, 5, 20, 100]:
+    frames = [make_boxes(n_boxes, rng) for _ in range(n_frames)]
+
+    old, old_us = best_run(old_labels, frames)
+    new, new_us = best_run(new_labels, frames)
+
+    # same records (float32 values)
+    assert all(len(old_frame) == len(new_frame) for old_frame, new_frame in zip(old, new))
+    assert all(
+      a["label"] == b["label"] and np.isclose(a["confidence"], b["confidence"]) and np.isclose(a["x2"], b["x2"])
+      for old_frame, new_frame in zip(old, new)
+      for a, b in zip(old_frame, new_frame)
+    )
+
+    print(f"{n_boxes:>6}{old_us:>15.2f}{new_us:>15.2f}{old_us / new_us:>8.1f}x")
@@ -0,0 +1,35 @@
+# Benchmark: per frame bandwidth and server CPU of base64 vs binary stream_image payloads
+# Usage (from backend/): python bench_frame_ingest.py [image.jpg] [n_frames]
+
+import sys
+import time
+import base64
+from bench_frame_storage import load_jpeg
+
+if __name__ == '__main__':
+  path = sys.argv[1] if len(sys.argv) > 1 else None
+  n_frames = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+  image_bytes = load_jpeg(path)
+
+  # what the flutter app used to send (data URL prefix handled like the server does)
+  base64_payload = 'data:image/jpeg;base64,' + base64.b64encode(image_bytes).decode()
+
+  start = time.perf_counter()
+  for _ in range(n_frames):
+    payload = base64_payload
+    if payload.startswith('data:image'):
+      payload = payload.split(',')[1]
+    decoded = base64.b64decode(payload)
+  base64_ms = (time.perf_counter() - start) * 1000 / n_frames
+
+  start = time.perf_counter()
+  for _ in range(n_frames):
+    decoded = memoryview(image_bytes)
+  binary_ms = (time.perf_counter() - start) * 1000 / n_frames
+
+  print(f"JPEG frame  : {len(image_bytes) / 1024:8.1f} KB")
+  print(f"base64      : {len(base64_payload) / 1024:8.1f} KB on the wire, {base64_ms:.3f} ms/frame to decode")
+  print(f"binary      : {len(image_bytes) / 1024:8.1f} KB on the wire, {binary_ms:.3f} ms/frame to decode")
+  print(f"saved       : {(len(base64_payload) - len(image_bytes)) / 1024:8.1f} KB/frame "
+        f"({(1 - len(image_bytes) / len(base64_payload)) * 100:.1f}%), {base64_ms - binary_ms:.3f} ms/frame CPU")
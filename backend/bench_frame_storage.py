@@ -0,0 +1,52 @@
+# Benchmark: CPU cost of storing a crack frame
+# old: decoded image -> cv2.imencode(".jpg") -> bytes (what the uploaders did)
+# new: memoryview over the JPEG bytes sent by the client (no re-encoding)
+# The decode itself is needed for inference in both cases so it isn't counted.
+#
+# Usage (from backend/): python bench_frame_storage.py [image.jpg] [n_frames]
+
+import sys
+import time
+import cv2
+import numpy as np
+
+def load_jpeg(path=None):
+  if path:
+    with open(path, 'rb') as f:
+      return f.read()
+
+  # synthetic 1280x720 road-like frame (noise + gradient), encoded like a phone camera
+  rng = np.random.default_rng(0)
+  gradient = np.linspace(60, 160, 1280, dtype=np.float32)[None, :, None]
+  frame = np.clip(gradient + rng.normal(0, 25, (720, 1280, 3)), 0, 255).astype(np.uint8)
+  ok, buffer = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, 90])
+  return buffer.tobytes()
+
+if __name__ == '__main__':
+  path = sys.argv[1] if len(sys.argv) > 1 else None
+  n_frames = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+  image_bytes = load_jpeg(path)
+  image = cv2.imdecode(np.frombuffer(image_bytes, np.uint8), cv2.IMREAD_COLOR)
+
+  start = time.perf_counter()
+  for _ in range(n_frames):
+    ok, buffer = cv2.imencode(".jpg", image)
+    data = buffer.tobytes()
+  old_ms = (time.perf_counter() - start) * 1000 / n_frames
+
+  start = time.perf_counter()
+  for _ in range(n_frames):
+    data_view = memoryview(image_bytes)
+  new_ms = (time.perf_counter() - start) * 1000 / n_frames
+
+  # quality lost by the extra JPEG generation
+  reencoded = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+  mse = np.mean((image.astype(np.float32) - reencoded.astype(np.float32)) ** 2)
+  psnr = 10 * np.log10(255 ** 2 / mse) if mse > 0 else float('inf')
+
+  print(f"Frame: {image.shape[1]}x{image.shape[0]}, original JPEG {len(image_bytes) / 1024:.1f} KB")
+  print(f"re-encode   : {old_ms:8.3f} ms/frame ({len(data) / 1024:.1f} KB uploaded)")
+  print(f"original    : {new_ms:8.3f} ms/frame ({len(image_bytes) / 1024:.1f} KB uploaded)")
+  print(f"CPU saved   : {old_ms - new_ms:8.3f} ms/frame")
+  print(f"re-encode PSNR vs original decode: {psnr:.1f} dB")
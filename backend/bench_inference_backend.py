@@ -0,0 +1,155 @@
+# Benchmark: accuracy and CPU latency of the inference backends (inference_backend.py)
+# on the EGY_PDD validation split (models/fine_tunning/EGY_PDD.yaml)
+# - accuracy: mAP50 and mAP50-95 against the ground truth labels (conf 0.001 like a YOLO val,
+#   all-point interpolated AP, so close to but not exactly the ultralytics numbers)
+# - latency: one image per call at the serving confidence, and throughput with batches
+#
+# Backends are given as name[:model path], e.g. the PyTorch model vs the INT8 exports:
+# Usage (from backend/):
+#   python bench_inference_backend.py torch onnx onnx:../models/fine_tunning/runs/main_trainging/yolov8s/weights/best_int8.onnx openvino [--limit 500] [--threads 4]
+
+import argparse
+import os
+import time
+import numpy as np
+import cv2
+from inference_backend import DATASET_YAML, get_inference_backend
+from export_model import dataset_split
+
+IOU_THRESHOLDS = np.linspace(0.5, 0.95, 10)
+
+def read_labels(path, h, w):
+  # YOLO label file (class, normalized cx, cy, w, h) -> classes and xyxy boxes in pixels
+  # images without cracks have no (or an empty) label file
+  rows = np.loadtxt(path, ndmin=2) if os.path.exists(path) and os.path.getsize(path) > 0 else np.zeros((0, 5))
+
+  if rows.size == 0:
+    return np.zeros(0, dtype=np.int64), np.zeros((0, 4))
+
+  cx, cy, bw, bh = rows[:, 1] * w, rows[:, 2] * h, rows[:, 3] * w, rows[:, 4] * h
+  return rows[:, 0].astype(np.int64), np.column_stack([cx - bw / 2, cy - bh / 2, cx + bw / 2, cy + bh / 2])
+
+def box_iou(a, b):
+  # IoU of every box of a with every box of b (xyxy)
+  tl = np.maximum(a[:, None, :2], b[None, :, :2])
+  br = np.minimum(a[:, None, 2:], b[None, :, 2:])
+  inter = np.prod(np.clip(br - tl, 0, None), axis=2)
+  area_a = np.prod(a[:, 2:] - a[:, :2], axis=1)
+  area_b = np.prod(b[:, 2:] - b[:, :2], axis=1)
+  return inter / (area_a[:, None] + area_b[None, :] - inter + 1e-9)
+
+def match(pred_cls, pred_conf, pred_xyxy, gt_cls, gt_xyxy):
+  # true positive flags of the predictions (highest confidence first) at every IoU threshold
+  tp = np.zeros((len(pred_cls), len(IOU_THRESHOLDS)), dtype=bool)
+  if len(pred_cls) == 0 or len(gt_cls) == 0:
+    return tp
+
+  iou = box_iou(pred_xyxy, gt_xyxy) * (pred_cls[:, None] == gt_cls[None, :])
+  order = np.argsort(-pred_conf)
+
+  for t, threshold in enumerate(IOU_THRESHOLDS):
+    matched = np.zeros(len(gt_cls), dtype=bool)
+    for i in order:
+      candidates = np.where(~matched & (iou[i] >= threshold))[0]
+      if len(candidates):
+        j = candidates[np.argmax(iou[i, candidates])]
+        matched[j] = True
+        tp[i, t] = True
+
+  return tp
+
+def average_precision(tp, conf, n_gt):
+  # all-point interpolated AP of one class at every IoU threshold
+  if n_gt == 0 or len(conf) == 0:
+    return np.zeros(len(IOU_THRESHOLDS))
+
+  tp = tp[np.argsort(-conf)]
+  tp_sum = np.cumsum(tp, axis=0)
+  recall = tp_sum / n_gt
+  precision = tp_sum / np.arange(1, len(tp) + 1)[:, None]
+
+  ap = np.zeros(len(IOU_THRESHOLDS))
+  for t in range(len(IOU_THRESHOLDS)):
+    r = np.concatenate([[0.0], recall[:, t], [1.0]])
+    p = np.concatenate([[1.0], precision[:, t], [0.0]])
+    p = np.maximum.accumulate(p[::-1])[::-1]
+    ap[t] = np.sum((r[1:] - r[:-1]) * p[1:])
+
+  return ap
+
+def evaluate(backend, samples, batch_size=8):
+  # mAP50 and mAP50-95 of a backend over (image path, label path) samples
+  tps, confs, classes, gt_classes = [], [], [], []
+
+  for start in range(0, len(samples), batch_size):
+    batch = samples[start:start + batch_size]
+    images = [cv2.imread(image) for image, _ in batch]
+
+    for image, (_, label_path), (cls, conf, xyxy) in zip(images, batch, backend.predict(images, conf=0.001)):
+      gt_cls, gt_xyxy = read_labels(label_path, *image.shape[:2])
+
+      tps.append(match(cls, conf, xyxy, gt_cls, gt_xyxy))
+      confs.append(conf)
+      classes.append(cls)
+      gt_classes.append(gt_cls)
+
+  tp, conf, cls, gt_cls = (np.concatenate(values) for values in (tps, confs, classes, gt_classes))
+
+  # mean over the classes of the ground truth
+  aps = np.array([average_precision(tp[cls == c], conf[cls == c], int((gt_cls == c).sum())) for c in np.unique(gt_cls)])
+  if len(aps) == 0:
+    return 0.0, 0.0
+
+  return float(aps[:, 0].mean()), float(aps.mean())
+
+def latency(backend, images, batch_size=8):
+  # ms per image with one image per call (p50, p95) and images/s with batches
+  backend.predict(images[:1])  # warm up
+
+  times = []
+  for image in images:
+    start = time.perf_counter()
+    backend.predict([image])
+    times.append((time.perf_counter() - start) * 1000)
+
+  start = time.perf_counter()
+  for i in range(0, len(images), batch_size):
+    backend.predict(images[i:i + batch_size])
+  throughput = len(images) / (time.perf_counter() - start)
+
+  return float(np.percentile(times, 50)), float(np.percentile(times, 95)), throughput
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description="Accuracy / latency of the inference backends on the EGY_PDD validation split")
+  parser.add_argument("backends", nargs="+", help="name[:model path], name: torch, onnx or openvino")
+  parser.add_argument("--data", default=DATASET_YAML, help="dataset yaml")
+  parser.add_argument("--split", default="val", help="dataset split")
+  parser.add_argument("--limit", type=int, default=0, help="max images of the accuracy run (0: all)")
+  parser.add_argument("--latency-images", type=int, default=100, help="images of the latency run")
+  parser.add_argument("--imgsz", type=int, default=640, help="inference image size")
+  parser.add_argument("--conf", type=float, default=0.25, help="serving confidence (latency run)")
+  parser.add_argument("--threads", type=int, default=0, help="CPU threads of the runtimes (0: default)")
+  parser.add_argument("--batch", type=int, default=8, help="batch size of the accuracy and throughput runs")
+  args = parser.parse_args()
+
+  samples = dataset_split(args.data, args.split)
+  if args.limit:
+    samples = samples[:args.limit]
+
+  latency_images = [cv2.imread(image) for image, _ in samples[:args.latency_images]]
+
+  rows = []
+  for spec in args.backends:
+    name, _, path = spec.partition(":")
+
+    backend = get_inference_backend(name, path or None, img_size=args.imgsz, conf=args.conf, threads=args.threads)
+
+    map50, map50_95 = evaluate(backend, samples, args.batch)
+    p50, p95, throughput = latency(backend, latency_images, args.batch)
+
+    rows.append((spec, map50, map50_95, p50, p95, throughput))
+
+  print(f"{len(samples)} images ({args.split}), latency on {len(latency_images)} images, threads: {args.threads or 'default'}")
+  print(f"{'backend':<50}{'mAP50':>8}{'mAP50-95':>10}{'p50 ms':>9}{'p95 ms':>9}{'img/s':>8}")
+  for spec, map50, map50_95, p50, p95, throughput in rows:
+    print(f"{spec[-50:]:<50}{map50:>8.3f}{map50_95:>10.3f}{p50:>9.1f}{p95:>9.1f}{throughput:>8.1f}")
@@ -0,0 +1,43 @@
+import numpy as np
+
+# Detections of one image kept as columns (class ids, confidences and xyxy boxes as arrays),
+# as returned by the inference backends (inference_backend.py), without a conversion per box.
+# The record dicts sent to Kafka and to the client ({"label", "confidence", "x1", "y1", "x2", "y2"})
+# are only built by to_dicts, from one list per column.
+
+# columns of the frames without detections (shared, read only)
+EMPTY_CLS = np.zeros(0, dtype=np.int64)
+EMPTY_CONF = np.zeros(0, dtype=np.float32)
+EMPTY_XYXY = np.zeros((0, 4), dtype=np.float32)
+for array in (EMPTY_CLS, EMPTY_CONF, EMPTY_XYXY):
+  array.flags.writeable = False
+
+EMPTY_DETECTIONS = (EMPTY_CLS, EMPTY_CONF, EMPTY_XYXY)
+
+class Detections:
+  __slots__ = ("cls", "conf", "xyxy", "names")
+
+  def __init__(self, cls, conf, xyxy, names):
+    # int64 class ids, float32 confidences and float32 (n, 4) boxes in pixels
+    self.cls = cls
+    self.conf = conf
+    self.xyxy = xyxy
+    self.names = names
+
+  def __len__(self):
+    return len(self.cls)
+
+  def arrays(self):
+    return self.cls, self.conf, self.xyxy
+
+  def to_dicts(self):
+    # record dicts (plain python values for json / avro / socket.io)
+    # (a plain loop, cheaper than a comprehension for the usual 1-5 boxes)
+    names = self.names
+    records = []
+    for cls_id, conf, (x1, y1, x2, y2) in zip(self.cls.tolist(), self.conf.tolist(), self.xyxy.tolist()):
+      records.append({"label": names[cls_id], "confidence": conf, "x1": x1, "y1": y1, "x2": x2, "y2": y2})
+    return records
+
+# result of the frames without detections (most frames have no cracks), shared
+NO_DETECTIONS = Detections(EMPTY_CLS, EMPTY_CONF, EMPTY_XYXY, {})
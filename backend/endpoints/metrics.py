@@ -0,0 +1,16 @@
+from model import scheduler, upload_queue
+from endpoints.upload_image import ingest_stats
+from kafka_producer import delivery_stats
+
+def metrics():
+
+  # Inference batching metrics (batch sizes, latency, throughput)
+  # background upload queue state (pending, retries, dropped)
+  # per frame bandwidth / decode cost of binary vs base64 frames
+  # and kafka delivery results (from the producer callbacks)
+  return {
+    "inference": scheduler.stats(),
+    "uploads": upload_queue.stats(),
+    "ingest": ingest_stats.stats(),
+    "kafka": delivery_stats.stats()
+  }
@@ -1,26 +1,75 @@
 from flask import request, jsonify
 from model import detect
-import numpy as np
-from kafka_producer import kafka_producer
+from kafka_producer import publish, publish_coverage
 from datetime import datetime
-import json
 import base64
+import threading
+import time as timer
+import os
+
+# What to do with frames without any crack:
+# "coverage" (default): small heartbeat to the coverage topic (spark aggregates it per road and time window)
+# "crack": send the full record to the main crack topic (old behaviour)
+# "drop": don't send anything
+EMPTY_FRAME_POLICY = os.getenv("EMPTY_FRAME_POLICY", "coverage")
+
+# Per frame ingestion stats for binary vs base64 payloads
+class IngestStats:
+  def __init__(self):
+    self._lock = threading.Lock()
+    self._formats = {}
+
+  def add(self, fmt, wire_bytes, image_bytes, decode_ms):
+    with self._lock:
+      s = self._formats.setdefault(fmt, {"frames": 0, "wire_bytes": 0, "image_bytes": 0, "decode_ms": 0.0})
+      s["frames"] += 1
+      s["wire_bytes"] += wire_bytes
+      s["image_bytes"] += image_bytes
+      s["decode_ms"] += decode_ms
+
+  def stats(self):
+    with self._lock:
+      return {
+        fmt: {
+          "frames": s["frames"],
+          "avg_wire_kb": round(s["wire_bytes"] / s["frames"] / 1024, 2),
+          "avg_image_kb": round(s["image_bytes"] / s["frames"] / 1024, 2),
+          "wire_overhead_pct": round((s["wire_bytes"] / max(1, s["image_bytes"]) - 1) * 100, 2),
+          "avg_decode_ms": round(s["decode_ms"] / s["frames"], 3),
+        }
+        for fmt, s in self._formats.items()
+      }
+
+ingest_stats = IngestStats()
+
+def read_image(img):
+  # Returns the original JPEG bytes from the stream_image payload
+  start = timer.perf_counter()
+  wire_bytes = len(img)
+
+  if isinstance(img, (bytes, bytearray, memoryview)):
+    # binary Socket.IO attachment, used as it is
+    image_bytes = img
+    fmt = "binary"
+  else:
+    # base64 string fallback (older clients)
+    # Remove data URL prefix if present
+    if img.startswith('data:image'):
+      img = img.split(',')[1]
+
+    image_bytes = base64.b64decode(img)
+    fmt = "base64"
+
+  ingest_stats.add(fmt, wire_bytes, len(image_bytes), (timer.perf_counter() - start) * 1000)
+
+  return image_bytes
 
 def detect_endpoint(data):
   
   try:
-    # prepare comming base64 images for the model
-    base64_string = data['img']
-        
-    # Remove data URL prefix if present
-    if base64_string.startswith('data:image'):
-      base64_string = base64_string.split(',')[1]
-        
-    # 1. Decode base64 to bytes
-    image_bytes = base64.b64decode(base64_string)
-        
-    # 2. Convert bytes to numpy array
-    nparr = np.frombuffer(image_bytes, np.uint8)
+    # Original JPEG bytes (binary attachment or decoded base64)
+    # (the model decodes them and the same bytes are uploaded as they are)
+    image_bytes = read_image(data['img'])
 
     # prepare other metadata
     lon = float(data["lon"])
@@ -28,10 +77,13 @@ def detect_endpoint(data):
     ppm = float(data["ppm"])
     time = datetime.now().isoformat()
 
-    # list of cracks and its confidence
+    # cracks and their confidence (Detections, columnar)
     # lon, lat, time to be identifier for the image name
     # that will be saved to the data lake
-    labels_list = detect(nparr, lon, lat, time)
+    detections = detect(image_bytes, lon, lat, time)
+
+    # record dicts, not built for the frames without cracks
+    labels_list = detections.to_dicts() if len(detections) else []
 
     # Organize the data
     res = {
@@ -43,8 +95,11 @@ def detect_endpoint(data):
       "image": f"{lon}_{lat}_{time}.jpg" # image name in azure datalake in folder /raw
     }
 
-    # Send data to kafka topic
-    kafka_producer.send('test', json.dumps(res))
+    # Send data to kafka topic (batched, compressed, keyed by location)
+    if labels_list or EMPTY_FRAME_POLICY == "crack":
+      publish(res)
+    elif EMPTY_FRAME_POLICY == "coverage":
+      publish_coverage(lon, lat, time)
 
     # Response to the user
     return res
@@ -0,0 +1,111 @@
+# Export of the fine tuned YOLOv8s (best.pt) for the CPU inference backends (inference_backend.py)
+# - onnx: best.onnx (dynamic batch), --int8: best_int8.onnx (static INT8 quantization with
+#   ONNX Runtime, calibrated on images of the EGY_PDD validation split)
+# - openvino: best_openvino_model/, --int8: best_int8_openvino_model/ (NNCF quantization
+#   by ultralytics, calibrated on the EGY_PDD dataset)
+#
+# Usage (from backend/):
+#   python export_model.py onnx [--int8] [--calibration-images 200]
+#   python export_model.py openvino [--int8]
+# then set INFERENCE_BACKEND (and INFERENCE_MODEL for the INT8 models) in backend/.env
+
+import argparse
+import os
+import numpy as np
+import cv2
+from inference_backend import DEFAULT_MODELS, DATASET_YAML, preprocess
+
+def dataset_split(yaml_path=DATASET_YAML, split="val"):
+  """
+  Images and YOLO label files of a split of the dataset.
+
+  Parameters:
+  - yaml_path (str): dataset yaml (path is relative to the yaml folder)
+  - split (str): 'train', 'val' or 'test'
+
+  Returns:
+  - list: (image path, label path) of each image
+  """
+  import yaml
+
+  with open(yaml_path) as f:
+    config = yaml.safe_load(f)
+
+  root = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(yaml_path)), config["path"]))
+  images_dir = os.path.join(root, config[split])
+  labels_dir = images_dir.replace(f"{os.sep}images", f"{os.sep}labels")
+
+  images = sorted(
+    name for name in os.listdir(images_dir)
+    if name.lower().endswith((".jpg", ".jpeg", ".png", ".bmp"))
+  )
+
+  return [(os.path.join(images_dir, name), os.path.join(labels_dir, os.path.splitext(name)[0] + ".txt")) for name in images]
+
+class CalibrationImages:
+  # calibration data reader of the ONNX Runtime static quantization (same preprocessing as OnnxBackend)
+  def __init__(self, input_name, paths, img_size):
+    self.input_name = input_name
+    self.paths = iter(paths)
+    self.img_size = img_size
+
+  def get_next(self):
+    path = next(self.paths, None)
+    if path is None:
+      return None
+
+    batch, _ = preprocess([cv2.imread(path)], self.img_size)
+    return {self.input_name: batch}
+
+def quantize_onnx(src, dst, data=DATASET_YAML, img_size=640, n_images=200):
+  import onnxruntime as ort
+  from onnxruntime.quantization import quantize_static, QuantFormat, QuantType, CalibrationMethod
+
+  input_name = ort.InferenceSession(src, providers=["CPUExecutionProvider"]).get_inputs()[0].name
+
+  # evenly spread over the validation split
+  images = [image for image, _ in dataset_split(data, "val")]
+  images = [images[i] for i in np.linspace(0, len(images) - 1, min(n_images, len(images))).astype(int)]
+
+  quantize_static(
+    src, dst,
+    CalibrationImages(input_name, images, img_size),
+    quant_format=QuantFormat.QDQ,
+    per_channel=True,
+    activation_type=QuantType.QUInt8,
+    weight_type=QuantType.QInt8,
+    calibrate_method=CalibrationMethod.MinMax
+  )
+
+def main():
+  parser = argparse.ArgumentParser(description="Export the crack model for the ONNX Runtime / OpenVINO backends")
+  parser.add_argument("format", choices=["onnx", "openvino"])
+  parser.add_argument("--weights", default=DEFAULT_MODELS["torch"], help="fine tuned best.pt")
+  parser.add_argument("--imgsz", type=int, default=640, help="inference image size")
+  parser.add_argument("--int8", action="store_true", help="also export an INT8 quantized model")
+  parser.add_argument("--data", default=DATASET_YAML, help="dataset yaml (INT8 calibration images)")
+  parser.add_argument("--calibration-images", type=int, default=200, help="onnx: validation images used for the INT8 calibration")
+  args = parser.parse_args()
+
+  from ultralytics import YOLO
+
+  model = YOLO(args.weights)
+
+  if args.format == "onnx":
+    path = model.export(format="onnx", imgsz=args.imgsz, dynamic=True, simplify=True)
+    print(f"Exported {path}")
+
+    if args.int8:
+      dst = os.path.join(os.path.dirname(path), "best_int8.onnx")
+      quantize_onnx(path, dst, args.data, args.imgsz, args.calibration_images)
+      print(f"Exported {dst}")
+  else:
+    path = model.export(format="openvino", imgsz=args.imgsz, dynamic=True)
+    print(f"Exported {path}")
+
+    if args.int8:
+      path = YOLO(args.weights).export(format="openvino", imgsz=args.imgsz, dynamic=True, int8=True, data=os.path.abspath(args.data))
+      print(f"Exported {path}")
+
+if __name__ == '__main__':
+  main()
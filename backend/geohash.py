@@ -0,0 +1,41 @@
+# Minimal geohash encoder, used as kafka message key
+# so frames from the same area go to the same partition
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+def geohash(lat, lon, precision=5):
+  lat_range = [-90.0, 90.0]
+  lon_range = [-180.0, 180.0]
+
+  code = []
+  bits = 0
+  bit_count = 0
+  even = True  # even bits encode longitude
+
+  while len(code) < precision:
+    if even:
+      mid = (lon_range[0] + lon_range[1]) / 2
+      if lon >= mid:
+        bits = (bits << 1) | 1
+        lon_range[0] = mid
+      else:
+        bits = bits << 1
+        lon_range[1] = mid
+    else:
+      mid = (lat_range[0] + lat_range[1]) / 2
+      if lat >= mid:
+        bits = (bits << 1) | 1
+        lat_range[0] = mid
+      else:
+        bits = bits << 1
+        lat_range[1] = mid
+
+    even = not even
+    bit_count += 1
+
+    if bit_count == 5:
+      code.append(BASE32[bits])
+      bits = 0
+      bit_count = 0
+
+  return ''.join(code)
@@ -0,0 +1,245 @@
+import ast
+import os
+import numpy as np
+import cv2
+from detections import EMPTY_DETECTIONS
+
+# Inference backends of the crack model (selected with INFERENCE_BACKEND, see model.py)
+# - torch: best.pt through ultralytics (PyTorch eager)
+# - onnx: exported best.onnx (or INT8 best_int8.onnx) through ONNX Runtime
+# - openvino: exported best_openvino_model/ (or INT8 best_int8_openvino_model/) through OpenVINO
+# Every backend takes a list of BGR images and returns one (cls, conf, xyxy) tuple of
+# arrays per image, boxes in pixels of the original image.
+# Models are exported with export_model.py, compared with bench_inference_backend.py.
+
+WEIGHTS_DIR = "../models/fine_tunning/runs/main_trainging/yolov8s/weights"
+
+# class names when the exported model has no metadata
+DATASET_YAML = "../models/fine_tunning/EGY_PDD.yaml"
+
+DEFAULT_MODELS = {
+  "torch": os.path.join(WEIGHTS_DIR, "best.pt"),
+  "onnx": os.path.join(WEIGHTS_DIR, "best.onnx"),
+  "openvino": os.path.join(WEIGHTS_DIR, "best_openvino_model"),
+}
+
+def dataset_names(path=DATASET_YAML):
+  import yaml
+
+  with open(path) as f:
+    return {int(k): v for k, v in yaml.safe_load(f)["names"].items()}
+
+def empty_detections():
+  # shared read only columns (most frames have no cracks)
+  return EMPTY_DETECTIONS
+
+# pre / post processing of the exported models --------------------------------------------------
+def letterbox(image, size, color=(114, 114, 114)):
+  # resize keeping the aspect ratio and pad to size x size (same as ultralytics, stride aligned center padding)
+  h, w = image.shape[:2]
+  r = min(size / h, size / w)
+  nw, nh = round(w * r), round(h * r)
+
+  if (nw, nh) != (w, h):
+    image = cv2.resize(image, (nw, nh), interpolation=cv2.INTER_LINEAR)
+
+  dw, dh = (size - nw) / 2, (size - nh) / 2
+  top, bottom = round(dh - 0.1), round(dh + 0.1)
+  left, right = round(dw - 0.1), round(dw + 0.1)
+
+  image = cv2.copyMakeBorder(image, top, bottom, left, right, cv2.BORDER_CONSTANT, value=color)
+  return image, r, (left, top)
+
+def preprocess(images, size):
+  # BGR uint8 images -> NCHW float32 RGB batch in [0, 1] and the letterbox of each image
+  batch = np.empty((len(images), 3, size, size), dtype=np.float32)
+  boxes = []
+
+  for i, image in enumerate(images):
+    padded, r, pad = letterbox(image, size)
+    batch[i] = padded[:, :, ::-1].transpose(2, 0, 1) / 255.0
+    boxes.append((r, pad, image.shape[:2]))
+
+  return batch, boxes
+
+def postprocess(output, boxes, conf=0.25, iou=0.7, max_det=300):
+  """
+  YOLOv8 head output to detections in pixels of the original images.
+
+  Parameters:
+  - output (ndarray): (N, 4 + classes, anchors) raw output (xywh + class scores)
+  - boxes (list): letterbox (ratio, (pad x, pad y), (h, w)) of each image
+  - conf (float): min class score
+  - iou (float): IoU threshold of the per-class NMS
+
+  Returns:
+  - list: (cls, conf, xyxy) arrays of each image
+  """
+  results = []
+
+  for prediction, (r, (pad_x, pad_y), (h, w)) in zip(output, boxes):
+    prediction = prediction.T  # anchors x (4 + classes)
+    scores = prediction[:, 4:]
+
+    cls = scores.argmax(axis=1)
+    score = scores[np.arange(len(scores)), cls]
+
+    keep = score >= conf
+    if not keep.any():
+      results.append(empty_detections())
+      continue
+
+    xywh, cls, score = prediction[keep, :4], cls[keep], score[keep]
+
+    # top left corner boxes for the NMS
+    tlwh = np.column_stack([xywh[:, 0] - xywh[:, 2] / 2, xywh[:, 1] - xywh[:, 3] / 2, xywh[:, 2], xywh[:, 3]])
+    kept = np.asarray(cv2.dnn.NMSBoxesBatched(tlwh.tolist(), score.tolist(), cls.tolist(), conf, iou), dtype=np.int64).reshape(-1)
+    kept = kept[np.argsort(-score[kept])][:max_det]
+
+    xyxy = np.column_stack([tlwh[kept, 0], tlwh[kept, 1], tlwh[kept, 0] + tlwh[kept, 2], tlwh[kept, 1] + tlwh[kept, 3]])
+
+    # letterbox -> original image pixels
+    xyxy[:, [0, 2]] = ((xyxy[:, [0, 2]] - pad_x) / r).clip(0, w)
+    xyxy[:, [1, 3]] = ((xyxy[:, [1, 3]] - pad_y) / r).clip(0, h)
+
+    results.append((cls[kept].astype(np.int64), score[kept].astype(np.float32), xyxy.astype(np.float32)))
+
+  return results
+
+# backends ---------------------------------------------------------------------------------------
+class TorchBackend:
+  def __init__(self, path, img_size=640, conf=0.25, threads=0):
+    import torch
+    from ultralytics import YOLO
+
+    if threads:
+      torch.set_num_threads(threads)
+
+    self.model = YOLO(path)
+    self.names = self.model.names
+    self.img_size = img_size
+    self.conf = conf
+
+  def predict(self, images, conf=None):
+    results = self.model.predict(source=images, imgsz=self.img_size, conf=conf or self.conf, save=False, verbose=False)
+
+    # whole arrays of each image (one device -> host copy per array, none without boxes)
+    return [
+      (
+        result.boxes.cls.cpu().numpy().astype(np.int64),
+        result.boxes.conf.cpu().numpy().astype(np.float32),
+        result.boxes.xyxy.cpu().numpy().astype(np.float32),
+      ) if len(result.boxes) else empty_detections()
+      for result in results
+    ]
+
+class OnnxBackend:
+  def __init__(self, path, img_size=640, conf=0.25, threads=0):
+    import onnxruntime as ort
+
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    if threads:
+      options.intra_op_num_threads = threads
+      options.inter_op_num_threads = 1
+
+    self.session = ort.InferenceSession(path, sess_options=options, providers=["CPUExecutionProvider"])
+    self.input = self.session.get_inputs()[0]
+
+    # static batch models (exported without dynamic=True) are run one image at a time
+    self.dynamic_batch = not isinstance(self.input.shape[0], int)
+
+    # ultralytics stores the class names in the model metadata
+    metadata = self.session.get_modelmeta().custom_metadata_map
+    self.names = ast.literal_eval(metadata["names"]) if "names" in metadata else dataset_names()
+
+    self.img_size = img_size
+    self.conf = conf
+
+  def predict(self, images, conf=None):
+    batch, boxes = preprocess(images, self.img_size)
+
+    if self.dynamic_batch:
+      output = self.session.run(None, {self.input.name: batch})[0]
+    else:
+      output = np.concatenate([self.session.run(None, {self.input.name: batch[i:i + 1]})[0] for i in range(len(batch))])
+
+    return postprocess(output, boxes, conf or self.conf)
+
+class OpenVinoBackend:
+  def __init__(self, path, img_size=640, conf=0.25, threads=0):
+    import openvino as ov
+
+    # ultralytics export folder (model xml + metadata.yaml) or the model xml itself
+    xml = path
+    if os.path.isdir(path):
+      xml = next(os.path.join(path, name) for name in os.listdir(path) if name.endswith(".xml"))
+
+    config = {"PERFORMANCE_HINT": "LATENCY"}
+    if threads:
+      config["INFERENCE_NUM_THREADS"] = threads
+
+    core = ov.Core()
+    model = core.read_model(xml)
+    self.dynamic_batch = model.input(0).get_partial_shape()[0].is_dynamic
+    self.compiled = core.compile_model(model, "CPU", config)
+    self.output = self.compiled.output(0)
+
+    self.names = self.metadata_names(os.path.dirname(xml))
+    self.img_size = img_size
+    self.conf = conf
+
+  def metadata_names(self, folder):
+    import yaml
+
+    metadata = os.path.join(folder, "metadata.yaml")
+    if not os.path.exists(metadata):
+      return dataset_names()
+
+    with open(metadata) as f:
+      return {int(k): v for k, v in yaml.safe_load(f)["names"].items()}
+
+  def predict(self, images, conf=None):
+    batch, boxes = preprocess(images, self.img_size)
+
+    if self.dynamic_batch:
+      output = self.compiled(batch)[self.output]
+    else:
+      output = np.concatenate([self.compiled(batch[i:i + 1])[self.output] for i in range(len(batch))])
+
+    return postprocess(output, boxes, conf or self.conf)
+
+BACKENDS = {
+  "torch": TorchBackend,
+  "onnx": OnnxBackend,
+  "openvino": OpenVinoBackend,
+}
+
+def get_inference_backend(name, path=None, img_size=640, conf=0.25, threads=0):
+  """
+  Parameters:
+  - name (str): 'torch', 'onnx' or 'openvino'
+  - path (str): model file / folder (default: DEFAULT_MODELS[name])
+  - img_size (int): inference image size
+  - conf (float): min confidence of the detections
+  - threads (int): CPU threads used by the runtime (0: runtime default)
+
+  Returns:
+  - backend with .names (class id -> name) and .predict(images) -> list of (cls, conf, xyxy)
+  """
+  if name not in BACKENDS:
+    raise ValueError(f"Unsupported inference backend: {name}. Available backends: {list(BACKENDS)}")
+
+  return BACKENDS[name](path or DEFAULT_MODELS[name], img_size=img_size, conf=conf, threads=threads)
+
+def draw_boxes(image, detections, names):
+  # copy of the image with the detected boxes and labels drawn (annotated uploads)
+  image = image.copy()
+  cls, conf, xyxy = detections
+
+  for cls_id, score, (x1, y1, x2, y2) in zip(cls, conf, xyxy.astype(int)):
+    cv2.rectangle(image, (x1, y1), (x2, y2), (0, 0, 255), 2)
+    cv2.putText(image, f"{names[int(cls_id)]} {score:.2f}", (x1, max(y1 - 5, 10)),
+                cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 1, cv2.LINE_AA)
+
+  return image
@@ -0,0 +1,135 @@
+import threading
+import queue
+import time
+from collections import deque
+from concurrent.futures import Future
+
+# Collects frames coming from concurrent sockets into micro-batches
+# and runs one batched predict call for each batch.
+# A batch is closed when it reaches max_batch_size or when the first
+# frame in it has waited max_wait_ms, then results are sent back to
+# each caller through its own Future.
+class InferenceScheduler:
+  def __init__(self, predict_fn, max_batch_size=8, max_wait_ms=20, metrics_window=1000):
+    # predict_fn takes a list of images and returns a list of results (same order)
+    self.predict_fn = predict_fn
+    self.max_batch_size = max(1, int(max_batch_size))
+    self.max_wait = max(0.0, float(max_wait_ms)) / 1000
+
+    self._queue = queue.Queue()
+    self._lock = threading.Lock()
+
+    # metrics
+    self._started_at = time.perf_counter()
+    self._frames = 0
+    self._batches = 0
+    self._errors = 0
+    self._latencies = deque(maxlen=metrics_window)     # submit -> result (ms)
+    self._queue_waits = deque(maxlen=metrics_window)   # submit -> batch start (ms)
+    self._batch_times = deque(maxlen=metrics_window)   # predict call time (ms)
+    self._batch_sizes = deque(maxlen=metrics_window)
+    self._done_times = deque(maxlen=metrics_window)    # to compute recent throughput
+
+    self._worker = threading.Thread(target=self._run, name="inference-scheduler", daemon=True)
+    self._worker.start()
+
+  def submit(self, image):
+    future = Future()
+    self._queue.put((image, future, time.perf_counter()))
+    return future
+
+  def infer(self, image, timeout=None):
+    # blocks the calling socket handler until its frame is processed
+    return self.submit(image).result(timeout=timeout)
+
+  def _next_batch(self):
+    # wait for the first frame, then fill the batch until it is full or the wait expires
+    batch = [self._queue.get()]
+    deadline = time.perf_counter() + self.max_wait
+
+    while len(batch) < self.max_batch_size:
+      remaining = deadline - time.perf_counter()
+      if remaining <= 0:
+        break
+      try:
+        batch.append(self._queue.get(timeout=remaining))
+      except queue.Empty:
+        break
+
+    return batch
+
+  def _predict(self, images):
+    # (result, error) of each image, when the batched call fails the images are retried
+    # one by one so a bad input only fails its own caller
+    try:
+      return [(result, None) for result in self.predict_fn(images)]
+    except Exception as e:
+      if len(images) == 1:
+        return [(None, e)]
+
+    outcomes = []
+    for image in images:
+      try:
+        outcomes.append((self.predict_fn([image])[0], None))
+      except Exception as e:
+        outcomes.append((None, e))
+    return outcomes
+
+  def _run(self):
+    while True:
+      batch = self._next_batch()
+      images = [image for image, _, _ in batch]
+      batch_start = time.perf_counter()
+
+      outcomes = self._predict(images)
+      done = time.perf_counter()
+
+      for (_, future, _), (result, error) in zip(batch, outcomes):
+        if error is None:
+          future.set_result(result)
+        else:
+          future.set_exception(error)
+
+      with self._lock:
+        self._batches += 1
+        self._frames += len(batch)
+        self._errors += sum(error is not None for _, error in outcomes)
+        self._batch_sizes.append(len(batch))
+        self._batch_times.append((done - batch_start) * 1000)
+        for _, _, submitted_at in batch:
+          self._queue_waits.append((batch_start - submitted_at) * 1000)
+          self._latencies.append((done - submitted_at) * 1000)
+          self._done_times.append(done)
+
+  def stats(self):
+    with self._lock:
+      latencies = sorted(self._latencies)
+      done_times = list(self._done_times)
+
+      def mean(values):
+        return round(sum(values) / len(values), 2) if values else 0.0
+
+      def percentile(values, p):
+        return round(values[min(len(values) - 1, int(p * len(values)))], 2) if values else 0.0
+
+      # throughput over the recent window of processed frames
+      if len(done_times) > 1 and done_times[-1] > done_times[0]:
+        throughput = (len(done_times) - 1) / (done_times[-1] - done_times[0])
+      else:
+        throughput = 0.0
+
+      return {
+        "max_batch_size": self.max_batch_size,
+        "max_wait_ms": self.max_wait * 1000,
+        "queue_size": self._queue.qsize(),
+        "frames": self._frames,
+        "batches": self._batches,
+        "errors": self._errors,
+        "avg_batch_size": mean(self._batch_sizes),
+        "avg_queue_wait_ms": mean(self._queue_waits),
+        "avg_batch_inference_ms": mean(self._batch_times),
+        "latency_p50_ms": percentile(latencies, 0.50),
+        "latency_p95_ms": percentile(latencies, 0.95),
+        "throughput_fps": round(throughput, 2),
+        "uptime_s": round(time.perf_counter() - self._started_at, 1),
+      }
@@ -1,9 +1,119 @@
 from kafka import KafkaProducer
+from dotenv import load_dotenv
+from geohash import geohash
+import threading
+import time
+import json
+import io
+import os
+
+load_dotenv()
+
+KAFKA_TOPIC = os.getenv("KAFKA_TOPIC", "test")
+
+# light heartbeat topic for frames without cracks (road coverage)
+KAFKA_COVERAGE_TOPIC = os.getenv("KAFKA_COVERAGE_TOPIC", "coverage")
+
+# "json" (default) or "avro" (compact binary with the shared schema in scripts/crack.avsc)
+# spark.py must be started with the same KAFKA_VALUE_FORMAT
+KAFKA_VALUE_FORMAT = os.getenv("KAFKA_VALUE_FORMAT", "json")
+AVRO_SCHEMA_PATH = os.getenv("AVRO_SCHEMA_PATH", "../scripts/crack.avsc")
+
+# messages are keyed by the geohash of the frame location (partition locality)
+KEY_GEOHASH_PRECISION = int(os.getenv("KAFKA_KEY_GEOHASH_PRECISION", 5))
+
+def serialize_value(v):
+  # bytes are already encoded (json/avro records), strings are encoded as utf-8
+  return v if isinstance(v, (bytes, bytearray)) else v.encode('utf-8')
 
 # Creating Kafka Producer to push messages to Kafka Topic ---------------------------------------------
 kafka_producer = KafkaProducer(
-  bootstrap_servers=['localhost:29092'],
-  value_serializer=lambda v: v.encode('utf-8'), # must for encoding (will give error if removed)
+  bootstrap_servers=os.getenv("KAFKA_BOOTSTRAP_SERVERS", "localhost:29092").split(','),
+  value_serializer=serialize_value, # must for encoding (will give error if removed)
+  key_serializer=lambda k: k.encode('utf-8') if k is not None else None,
+  linger_ms=int(os.getenv("KAFKA_LINGER_MS", 20)),            # wait a bit to send bigger batches
+  batch_size=int(os.getenv("KAFKA_BATCH_SIZE", 64 * 1024)),   # max batch size per partition (bytes)
+  compression_type=os.getenv("KAFKA_COMPRESSION", "lz4"),     # gzip, snappy, lz4 or zstd
   request_timeout_ms=5000,
   retries=3
-)
\ No newline at end of file
+)
+
+# Encoding of the records sent by detect_endpoint ---------------------------------------------------
+if KAFKA_VALUE_FORMAT == "avro":
+  import fastavro
+
+  with open(AVRO_SCHEMA_PATH) as f:
+    avro_schema = fastavro.parse_schema(json.load(f))
+
+def encode_record(record):
+  if KAFKA_VALUE_FORMAT == "avro":
+    buffer = io.BytesIO()
+    fastavro.schemaless_writer(buffer, avro_schema, record)
+    return buffer.getvalue()
+
+  return json.dumps(record).encode('utf-8')
+
+# Delivery metrics (filled by the producer callbacks) -----------------------------------------------
+class DeliveryStats:
+  def __init__(self):
+    self._lock = threading.Lock()
+    self.sent = 0
+    self.delivered = 0
+    self.failed = 0
+    self.bytes = 0
+    self.latency_ms = 0.0
+    self.last_error = None
+
+  def on_send(self, size):
+    with self._lock:
+      self.sent += 1
+      self.bytes += size
+
+  def on_success(self, start, record_metadata):
+    with self._lock:
+      self.delivered += 1
+      self.latency_ms += (time.perf_counter() - start) * 1000
+
+  def on_error(self, error):
+    with self._lock:
+      self.failed += 1
+      self.last_error = str(error)
+    print(f"❌ Kafka delivery failed: {error}")
+
+  def stats(self):
+    with self._lock:
+      return {
+        "topic": KAFKA_TOPIC,
+        "format": KAFKA_VALUE_FORMAT,
+        "sent": self.sent,
+        "delivered": self.delivered,
+        "failed": self.failed,
+        "in_flight": self.sent - self.delivered - self.failed,
+        "avg_message_bytes": round(self.bytes / self.sent, 1) if self.sent else 0.0,
+        "avg_delivery_ms": round(self.latency_ms / self.delivered, 2) if self.delivered else 0.0,
+        "last_error": self.last_error,
+      }
+
+delivery_stats = DeliveryStats()
+
+def send(topic, key, value):
+  # send without blocking on the broker, delivery is tracked by the callbacks
+  start = time.perf_counter()
+  future = kafka_producer.send(topic, key=key, value=value)
+  delivery_stats.on_send(len(value))
+
+  future.add_callback(delivery_stats.on_success, start)
+  future.add_errback(delivery_stats.on_error)
+
+  return future
+
+def publish(record, topic=KAFKA_TOPIC):
+  # send one frame record, keyed by its location
+  key = geohash(record["lat"], record["lon"], KEY_GEOHASH_PRECISION)
+  return send(topic, key, encode_record(record))
+
+def publish_coverage(lon, lat, frame_time, topic=KAFKA_COVERAGE_TOPIC):
+  # heartbeat of a frame without cracks, only what is needed to know the road was surveyed
+  key = geohash(lat, lon, KEY_GEOHASH_PRECISION)
+  value = json.dumps({"lon": lon, "lat": lat, "time": frame_time}).encode('utf-8')
+  return send(topic, key, value)
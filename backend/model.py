@@ -1,43 +1,64 @@
 import cv2
+import os
 import numpy as np
-from ultralytics import YOLO
-from upload_to_datalake import upload_to_datalake
-from upload_to_osb import upload_to_s3_compatible
+from dotenv import load_dotenv
+from inference_backend import get_inference_backend, draw_boxes
+from inference_scheduler import InferenceScheduler
+from detections import Detections, NO_DETECTIONS
+from upload_queue import UploadQueue, get_upload_backend
+
+load_dotenv()
 
 # Load the model (Yolo v8s) fine tuned version on EGY_PDD dataset
-model = YOLO("../models/fine_tunning/runs/main_trainging/yolov8s/weights/best.pt")
+# INFERENCE_BACKEND: "torch" (best.pt, PyTorch), "onnx" (ONNX Runtime) or "openvino"
+# (exported with export_model.py, INFERENCE_MODEL selects e.g. the INT8 version)
+model = get_inference_backend(
+  os.getenv("INFERENCE_BACKEND", "torch"),
+  path=os.getenv("INFERENCE_MODEL") or None,
+  img_size=int(os.getenv("INFERENCE_IMG_SIZE", 640)),
+  conf=float(os.getenv("INFERENCE_CONF", 0.25)),
+  threads=int(os.getenv("INFERENCE_THREADS", 0))
+)
+
+# Frames from all connected clients are grouped into micro-batches
+# and run through one predict call per batch
+scheduler = InferenceScheduler(
+  model.predict,
+  max_batch_size=int(os.getenv("INFERENCE_MAX_BATCH_SIZE", 8)),
+  max_wait_ms=float(os.getenv("INFERENCE_MAX_WAIT_MS", 20))
+)
+
+# Images with cracks are uploaded in the background (spooled on disk first)
+# UPLOAD_BACKEND: "datalake" (Azure Data Lake), "osb" (Huawei OBS / any S3 compatible such as MinIO)
+# or "local" (local folder for testing)
+upload_queue = UploadQueue(
+  get_upload_backend(os.getenv("UPLOAD_BACKEND", "datalake")),
+  spool_dir=os.getenv("UPLOAD_SPOOL_DIR", "./spool"),
+  workers=int(os.getenv("UPLOAD_WORKERS", 2)),
+  max_pending=int(os.getenv("UPLOAD_MAX_PENDING", 1000)),
+  max_retries=int(os.getenv("UPLOAD_MAX_RETRIES", 5))
+)
+
+# By default the original JPEG sent by the client is stored as it is (no re-encoding)
+# set UPLOAD_ANNOTATED=true to store images with the detected boxes drawn on them
+upload_annotated = os.getenv("UPLOAD_ANNOTATED", "false").lower() == "true"
+
+def detect(image_bytes, lon, lat, time):
+  # zero-copy view over the compressed JPEG bytes sent by the client
+  image_view = memoryview(image_bytes)
 
-def detect(nparr, lon, lat, time):
   # Decode the image using OpenCV
-  image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-
-  # Run inference on a folder
-  results = model.predict(source=image, conf=0.25, save=False)
-
-  # to check if any object was detected
-  labels = []
-
-  # Iterate through results
-  for result in results:
-      boxes = result.boxes  # Boxes object
-
-      # Convert to CPU and numpy for easier access
-      for box in boxes:
-          cls_id = int(box.cls.cpu().numpy()[0])        # Class ID
-          conf = float(box.conf.cpu().numpy()[0])        # Confidence
-          xyxy = box.xyxy.cpu().numpy()[0]               # Bounding box (x1, y1, x2, y2)
-
-          # Get class name from model.names dictionary
-          class_name = model.names[cls_id]
-
-          labels.append({
-            "label": class_name,
-            "confidence": float(conf),
-            "x1": float(xyxy[0]),
-            "y1": float(xyxy[1]),
-            "x2": float(xyxy[2]),
-            "y2": float(xyxy[3]),
-          })
+  image = cv2.imdecode(np.frombuffer(image_view, np.uint8), cv2.IMREAD_COLOR)
+
+  # a corrupt frame fails its own request only, it is never batched with the frames of other clients
+  if image is None:
+    raise ValueError("Could not decode the image (corrupt or not a JPEG)")
+
+  # Run inference (batched with frames from other clients)
+  # class ids, confidences and boxes (x1, y1, x2, y2) of the image as columns
+  # (the frames without cracks share one empty result, nothing is converted or built)
+  detections = scheduler.infer(image)
+  labels = Detections(*detections, model.names) if len(detections[0]) else NO_DETECTIONS
   
   # if there is labels Save processed image with labels 
   # Will store in Azure data lake in the future
@@ -46,13 +67,16 @@ def detect(nparr, lon, lat, time):
     # For local testing only
     # cv2.imwrite('./processed/output.jpg', image)
 
-    # Successfully working
-    # If you want to push images that have cracks to Azure Data Lake
-    # Just uncomment on real prodction or simple tests to avoid wasting the free plan
-    upload_to_datalake(image, f'raw/{lon}_{lat}_{time}.jpg')
-
-    # If you want to push images that have cracks to OBS
-    # upload_to_s3_compatible(image, f'raw/{lon}_{lat}_{time}.jpg')
+    # Queue the image for upload (Azure Data Lake / OBS / local based on UPLOAD_BACKEND)
+    # detect returns without waiting for the upload
+    if upload_annotated:
+      # re-encoding is only needed when the boxes are burned into the image
+      ok, buffer = cv2.imencode(".jpg", draw_boxes(image, labels.arrays(), model.names))
+      if ok:
+        upload_queue.put(buffer, f'raw/{lon}_{lat}_{time}.jpg')
+    else:
+      # original compressed bytes, no decode/re-encode round trip
+      upload_queue.put(image_view, f'raw/{lon}_{lat}_{time}.jpg')
 
-  # Return whether any labels were detected
+  # Return the detections (empty when nothing was detected)
   return labels
\ No newline at end of file
@@ -0,0 +1,214 @@
+import os
+import json
+import time
+import uuid
+import heapq
+import random
+import threading
+import queue
+
+# Uploads crack images in the background so detect() doesn't wait on the network.
+# Every image is first written to a spool folder on disk (data + json metadata),
+# so pending uploads survive a restart and are picked up again on start.
+# Failed uploads are retried with exponential backoff, after max_retries
+# they are moved to <spool_dir>/failed.
+class UploadQueue:
+  def __init__(self, upload_fn, spool_dir='./spool', workers=2, max_pending=1000,
+               max_retries=5, backoff_s=1.0, max_backoff_s=60.0):
+    # upload_fn(data, key) must raise an exception when the upload fails
+    self.upload_fn = upload_fn
+    self.spool_dir = spool_dir
+    self.failed_dir = os.path.join(spool_dir, 'failed')
+    self.max_pending = max_pending
+    self.max_retries = max_retries
+    self.backoff_s = backoff_s
+    self.max_backoff_s = max_backoff_s
+
+    os.makedirs(self.failed_dir, exist_ok=True)
+
+    self._queue = queue.Queue()
+    self._retries = []  # heap of (ready_time, item_id)
+    self._retry_cond = threading.Condition()
+    self._lock = threading.Lock()
+
+    # stats
+    self._pending = 0
+    self._in_flight = 0
+    self._uploaded = 0
+    self._retried = 0
+    self._failed = 0
+    self._dropped = 0
+    self._recovered = 0
+    self._upload_ms = 0.0
+
+    self._recover()
+
+    for i in range(workers):
+      threading.Thread(target=self._work, name=f"upload-worker-{i}", daemon=True).start()
+    threading.Thread(target=self._schedule_retries, name="upload-retry", daemon=True).start()
+
+  def _paths(self, item_id):
+    return (
+      os.path.join(self.spool_dir, f'{item_id}.bin'),
+      os.path.join(self.spool_dir, f'{item_id}.json')
+    )
+
+  def _write_meta(self, item_id, meta):
+    _, meta_path = self._paths(item_id)
+    tmp_path = meta_path + '.tmp'
+    with open(tmp_path, 'w') as f:
+      json.dump(meta, f)
+    os.replace(tmp_path, meta_path)
+
+  def _recover(self):
+    # re-queue uploads that were still in the spool when the process stopped
+    for file_name in os.listdir(self.spool_dir):
+      if not file_name.endswith('.json'):
+        continue
+
+      item_id = file_name[:-len('.json')]
+      data_path, _ = self._paths(item_id)
+
+      if os.path.exists(data_path):
+        self._pending += 1
+        self._recovered += 1
+        self._queue.put(item_id)
+
+  def put(self, data, key):
+    # data is any bytes-like object (bytes, memoryview, numpy buffer)
+    # returns False if the spool is full (upload dropped)
+    with self._lock:
+      if self._pending >= self.max_pending:
+        self._dropped += 1
+        return False
+      self._pending += 1
+
+    item_id = uuid.uuid4().hex
+    data_path, _ = self._paths(item_id)
+
+    try:
+      with open(data_path, 'wb') as f:
+        f.write(data)
+
+      # metadata is written last, so a half written image is never recovered
+      self._write_meta(item_id, {'key': key, 'attempts': 0, 'created_at': time.time()})
+    except Exception:
+      with self._lock:
+        self._pending -= 1
+        self._dropped += 1
+      raise
+
+    self._queue.put(item_id)
+    return True
+
+  def _work(self):
+    while True:
+      item_id = self._queue.get()
+      data_path, meta_path = self._paths(item_id)
+
+      with self._lock:
+        self._in_flight += 1
+
+      try:
+        with open(meta_path) as f:
+          meta = json.load(f)
+        with open(data_path, 'rb') as f:
+          data = f.read()
+
+        start = time.perf_counter()
+        self.upload_fn(data, meta['key'])
+        elapsed_ms = (time.perf_counter() - start) * 1000
+
+        os.remove(data_path)
+        os.remove(meta_path)
+
+        with self._lock:
+          self._uploaded += 1
+          self._pending -= 1
+          self._upload_ms += elapsed_ms
+      except Exception as e:
+        print(f"❌ Upload of {item_id} failed: {e}")
+        self._retry_or_fail(item_id)
+      finally:
+        with self._lock:
+          self._in_flight -= 1
+
+  def _retry_or_fail(self, item_id):
+    data_path, meta_path = self._paths(item_id)
+
+    try:
+      with open(meta_path) as f:
+        meta = json.load(f)
+    except Exception:
+      meta = None
+
+    if meta is not None and meta['attempts'] + 1 < self.max_retries:
+      meta['attempts'] += 1
+      self._write_meta(item_id, meta)
+
+      # exponential backoff with jitter
+      delay = min(self.max_backoff_s, self.backoff_s * 2 ** (meta['attempts'] - 1))
+      delay *= random.uniform(0.5, 1.5)
+
+      with self._lock:
+        self._retried += 1
+      with self._retry_cond:
+        heapq.heappush(self._retries, (time.time() + delay, item_id))
+        self._retry_cond.notify()
+      return
+
+    # give up, keep the files for inspection
+    for path in (data_path, meta_path):
+      if os.path.exists(path):
+        os.replace(path, os.path.join(self.failed_dir, os.path.basename(path)))
+
+    with self._lock:
+      self._failed += 1
+      self._pending -= 1
+
+  def _schedule_retries(self):
+    # single thread that moves retries back to the queue when their backoff ends
+    while True:
+      with self._retry_cond:
+        while not self._retries:
+          self._retry_cond.wait()
+
+        ready_time, item_id = self._retries[0]
+        wait = ready_time - time.time()
+        if wait > 0:
+          self._retry_cond.wait(timeout=wait)
+          continue
+
+        heapq.heappop(self._retries)
+
+      self._queue.put(item_id)
+
+  def stats(self):
+    with self._lock:
+      return {
+        "pending": self._pending,
+        "queued": self._queue.qsize(),
+        "waiting_retry": len(self._retries),
+        "in_flight": self._in_flight,
+        "uploaded": self._uploaded,
+        "retried": self._retried,
+        "failed": self._failed,
+        "dropped": self._dropped,
+        "recovered": self._recovered,
+        "max_pending": self.max_pending,
+        "avg_upload_ms": round(self._upload_ms / self._uploaded, 2) if self._uploaded else 0.0,
+      }
+
+def get_upload_backend(name):
+  # imported lazily so only the selected backend creates its client
+  if name == 'datalake':
+    from upload_to_datalake import upload_bytes_to_datalake
+    return upload_bytes_to_datalake
+  elif name == 'osb':
+    from upload_to_osb import upload_bytes_to_s3_compatible
+    return upload_bytes_to_s3_compatible
+  elif name == 'local':
+    from upload_to_local import upload_to_local
+    return upload_to_local
+  else:
+    raise ValueError(f"Unsupported upload backend: {name}. Available backends: ['datalake', 'osb', 'local']")
@@ -0,0 +1,27 @@
+import os
+import re
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Local folder used instead of a cloud storage (for local tests)
+LOCAL_UPLOAD_DIR = os.getenv("LOCAL_UPLOAD_DIR", "./uploads")
+
+# characters not allowed in windows file names (the keys contain the ':' of the isoformat time)
+INVALID_FILE_CHARS = re.compile(r'[<>:"\\|?*]')
+
+def local_file_path(file_path):
+  # key (e.g. raw/{lon}_{lat}_{time}.jpg) -> valid relative path on every OS, '/' separated folders kept
+  return os.path.join(*(INVALID_FILE_CHARS.sub('-', part) for part in file_path.split('/')))
+
+def upload_to_local(data, file_path, root=LOCAL_UPLOAD_DIR):
+  local_path = os.path.join(root, local_file_path(file_path))
+  os.makedirs(os.path.dirname(local_path), exist_ok=True)
+
+  # write to a temp file first, so a crash never leaves a half written image
+  tmp_path = local_path + '.tmp'
+  with open(tmp_path, 'wb') as f:
+    f.write(data)
+  os.replace(tmp_path, local_path)
+
+  print(f"Image saved locally at: {local_path}")
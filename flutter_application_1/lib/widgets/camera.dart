@@ -1,6 +1,6 @@
 import 'dart:async';
-import 'dart:convert';
 import 'dart:io';
+import 'dart:typed_data';
 import 'package:flutter/material.dart';
 import 'package:camera/camera.dart';
 import 'package:flutter_application_1/widgets/settings.dart';
@@ -245,20 +245,16 @@ class _CameraCapturePageState extends State<CameraCapturePage> with WidgetsBindi
       // Get current settings
       final settingsProvider = Provider.of<SettingsProvider>(context, listen: false);
 
-      // ✅ Convert image to base64
-      List<int> imageBytes = await imageFile.readAsBytes();
-      String base64Image = base64Encode(imageBytes);
-      
-      // ✅ Use the format you specified: without data URL prefix
-      String imageData = base64Image; // Just base64, no "data:image/..." prefix
+      // ✅ Read the JPEG bytes (sent as binary, no base64 encoding)
+      Uint8List imageBytes = await imageFile.readAsBytes();
 
       setState(() {
         _uploadStatus = "🔄 Sending via WebSocket...";
       });
 
-      // ✅ Send via WebSocket instead of HTTP
-      _socketService.sendImageData(
-        imageData, // Base64 string without prefix
+      // ✅ Send via WebSocket as a binary attachment
+      _socketService.sendImageBytes(
+        imageBytes,
         position.longitude,
         position.latitude,
         settingsProvider.ppm,
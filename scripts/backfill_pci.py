@@ -0,0 +1,35 @@
+# Backfill of the PCI tables (road_pci and pci_rollup)
+# Recomputes both tables from all the cracks (crack_by_dist), for the cracks stored
+# before the stream maintained them (or after a change of the PCI formula).
+# Stop the stream first, the tables are truncated and rewritten.
+#
+# Run (inside the pyspark container):
+#   spark-submit --packages com.datastax.spark:spark-cassandra-connector_2.12:3.5.0 /home/jovyan/scripts/backfill_pci.py
+
+import os
+import sys
+import time
+from pyspark.sql import SparkSession
+from road_index import ROADS_ARTIFACT
+
+# the PCI functions are shared with the dashboard (streamlit/)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'streamlit'))
+from pci_sink import ship_pci_modules, rebuild_pci_tables
+from crack_store import write_progress
+
+if __name__ == '__main__':
+    spark = SparkSession.builder \
+        .appName("PavementEye PCI backfill") \
+        .config("spark.cassandra.connection.host", "cassandra")\
+        .config("spark.cassandra.connection.port", "9042")\
+        .config("spark.sql.session.timeZone", "UTC")\
+        .getOrCreate()
+
+    ship_pci_modules(spark)
+
+    start = time.perf_counter()
+    roads, rollups = rebuild_pci_tables(spark, os.path.abspath(ROADS_ARTIFACT))
+    write_progress(spark, "pci_backfill", 0)
+    print(f"road_pci: {roads} roads, pci_rollup: {rollups} rows, in {time.perf_counter() - start:.1f}s")
+
+    spark.stop()
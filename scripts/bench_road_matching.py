@@ -0,0 +1,72 @@
+# Benchmark: old per-row sjoin_nearest UDF logic vs batched road matching
+# Usage (from scripts/): python bench_road_matching.py [n_points]
+# Uses ../data/egypt/geo.geojson if it exists, otherwise a synthetic road grid
+
+import os
+import sys
+import time
+import warnings
+import numpy as np
+import geopandas as gpd
+from shapely.geometry import Point, LineString
+from road_matching import match_roads
+
+ROADS_PATH = '../data/egypt/geo.geojson'
+
+def load_roads():
+    if os.path.exists(ROADS_PATH):
+        roads_df = gpd.read_file(ROADS_PATH).to_crs(epsg=4326)
+        return roads_df.drop(['index'], axis=1, errors='ignore')
+
+    # synthetic network around Cairo / Alexandria (~20k short segments)
+    rng = np.random.default_rng(0)
+    x = rng.uniform(29.5, 31.5, 20000)
+    y = rng.uniform(29.8, 31.4, 20000)
+    lines = [LineString([(a, b), (a + 0.002, b + 0.001)]) for a, b in zip(x, y)]
+    dists = rng.choice(['Muntazah', 'Nasr City', 'Giza', 'Raml'], len(lines))
+    return gpd.GeoDataFrame({'ADM2_EN': dists}, geometry=lines, crs="EPSG:4326")
+
+# Same logic as the old join_roads + get_dist UDFs (called once per row each)
+def old_join_roads(roads_df, lon, lat):
+    stream_geo_df = gpd.GeoDataFrame(geometry=[Point(lon, lat)], crs="EPSG:4326")
+    joined_data = gpd.sjoin_nearest(stream_geo_df, roads_df, how='inner', max_distance=20)
+    return int(joined_data.iloc[0]['index_right']) if not joined_data.empty else -1
+
+def old_get_dist(roads_df, lon, lat):
+    stream_geo_df = gpd.GeoDataFrame(geometry=[Point(lon, lat)], crs="EPSG:4326")
+    joined_data = gpd.sjoin_nearest(stream_geo_df, roads_df, how='inner', max_distance=20)
+    return joined_data.iloc[0]['ADM2_EN'] if not joined_data.empty else "Unkown"
+
+if __name__ == '__main__':
+    # the stream matches in EPSG:4326 (as before), silence the per-call CRS warning
+    warnings.filterwarnings('ignore', message='Geometry is in a geographic CRS')
+
+    n_points = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+
+    roads_df = load_roads()
+    minx, miny, maxx, maxy = roads_df.total_bounds
+
+    rng = np.random.default_rng(1)
+    lon = rng.uniform(minx, maxx, n_points)
+    lat = rng.uniform(miny, maxy, n_points)
+
+    print(f"Roads: {len(roads_df)}, points: {n_points}")
+
+    # the old udfs are too slow to run on every point
+    n_old = min(n_points, 500)
+    start = time.perf_counter()
+    old = [(old_join_roads(roads_df, x, y), old_get_dist(roads_df, x, y)) for x, y in zip(lon[:n_old], lat[:n_old])]
+    old_time = time.perf_counter() - start
+
+    # exclude the one time index build (done once per worker)
+    roads_df.sindex
+    start = time.perf_counter()
+    new = match_roads(roads_df, lon, lat)
+    new_time = time.perf_counter() - start
+
+    same = sum(1 for i, (r, d) in enumerate(old) if r == new['road_index'][i] and d == new['dist'][i])
+
+    print(f"per-row UDFs : {n_old / old_time:12,.0f} rows/sec")
+    print(f"batched      : {n_points / new_time:12,.0f} rows/sec")
+    print(f"speed up     : {(n_points / new_time) / (n_old / old_time):12,.1f}x")
+    print(f"same result  : {same}/{n_old}")
@@ -0,0 +1,134 @@
+# Check: the batch ids of the stream restart at 0 when its checkpoint is deleted
+# (run.ps1 does before every start). Replays batch ids 0..N of a new run against the
+# road_pci and pci_rollup tables written by an earlier run with the same batch ids, and
+# checks that every crack is counted once, including when a batch is retried, and that the
+# cumulative history matches a recompute from all the cracks. No spark / cassandra needed (the merges run on pandas like on the driver, pci_sink.py).
+#
+# Usage (from scripts/): python check_pci_replay.py [n_batches] [n_roads]
+# (a guard on the batch id only loses the cracks of the rows whose last batch of the
+# first run has the same id as their first batch of the second run)
+
+import os
+import sys
+from datetime import datetime
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'streamlit'))
+from pci import pci_from_totals
+from road_pci import ROAD_PCI_COLUMNS, batch_key, road_totals, merge_road_pci
+from pci_rollup import (
+    PARTITION_KEY, ROLLUP_KEY, ROLLUP_COLUMNS, ROAD_SCOPE, ALL_SCOPE, ALL_KEY,
+    period_start, road_rollup_totals, merge_road_rollups, merge_group_rollups
+)
+
+LABELS = ['Block Crack', 'Longitudinal Crack', 'Potholes']
+DISTS = ['Muntazah', 'Raml']
+
+def batch_totals(rng, batch_id, n_roads, day, width=5):
+    # day_totals of a micro-batch: the roads of a survey drive, the next roads of the route
+    # in each batch (the same route gives the same roads for the same batch id)
+    route = (batch_id * 2 + np.arange(width)) % n_roads
+    roads = np.sort(np.unique(rng.choice(route, size=rng.integers(1, width + 1))))
+    cracks = rng.integers(1, 5, len(roads))
+
+    return pd.DataFrame({
+        'road_index': roads,
+        'dist': [DISTS[road % len(DISTS)] for road in roads],
+        'day': day,
+        'label': rng.choice(LABELS, len(roads)),
+        'cracks': cracks,
+        'area': 0.5 * cracks,
+        'dv_sum': np.round(rng.uniform(1, 20, len(roads)), 2),
+    })
+
+def upsert(table, rows, key_columns):
+    keys = pd.MultiIndex.from_frame(rows[key_columns])
+    kept = ~pd.MultiIndex.from_frame(table[key_columns]).isin(keys) if len(table) else []
+    return pd.concat([table[kept], rows], ignore_index=True)
+
+def apply(road_pci, rollups, totals, key):
+    # one micro-batch: read the stored rows of its keys, merge, upsert (same as pci_sink)
+    updated_at = datetime(2025, 1, 1)
+
+    by_road = road_totals(totals)
+    current = road_pci[road_pci['road_index'].isin(by_road['road_index'])]
+    road_pci = upsert(road_pci, merge_road_pci(current, by_road, key, updated_at), ['road_index'])
+
+    roads, deltas = merge_road_rollups(rollups[rollups['scope'] == ROAD_SCOPE], road_rollup_totals(totals), key, updated_at)
+    groups = merge_group_rollups(rollups[rollups['scope'] != ROAD_SCOPE], deltas, key, updated_at)
+    rollups = upsert(upsert(rollups, groups, ROLLUP_KEY), roads, ROLLUP_KEY)
+
+    return road_pci, rollups
+
+def run(road_pci, rollups, batches, query_id, retry_every=3):
+    for batch_id, totals in enumerate(batches):
+        road_pci, rollups = apply(road_pci, rollups, totals, batch_key(query_id, batch_id))
+
+        # a batch retried after a failure isn't added twice
+        if batch_id % retry_every == 0:
+            road_pci, rollups = apply(road_pci, rollups, totals, batch_key(query_id, batch_id))
+
+    return road_pci, rollups
+
+def last_rows(rollups, scope, period):
+    # last row of each partition (cumulative: all the cracks of the partition)
+    rows = rollups[(rollups['scope'] == scope) & (rollups['period'] == period)]
+    return rows.sort_values('bucket').groupby(PARTITION_KEY).tail(1)
+
+def expected_history(batches, period):
+    # mean PCI of the roads with cracks up to the end of each bucket, from all the cracks
+    totals = pd.concat(batches, ignore_index=True)
+    totals['bucket'] = period_start(totals['day'], period)
+    by_road = totals.groupby(['road_index', 'bucket'])[['cracks', 'dv_sum']].sum().unstack(fill_value=0)
+    counts = by_road['cracks'].cumsum(axis=1)
+    dv_sums = by_road['dv_sum'].cumsum(axis=1)
+
+    pci = pci_from_totals(counts.to_numpy().ravel(), dv_sums.to_numpy().ravel()).reshape(counts.shape)
+    pci = pd.DataFrame(pci, index=counts.index, columns=counts.columns)
+    return pci.where(counts > 0).mean()
+
+if __name__ == '__main__':
+    n_batches = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    n_roads = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    rng = np.random.default_rng(0)
+
+    # two runs with the same batch ids 0..N (checkpoint deleted in between), the cracks of a
+    # batch are from a day of the last weeks, late ones included (earlier buckets are updated)
+    days = pd.date_range('2024-12-20', '2025-02-10', freq='D')
+    first_run = [batch_totals(rng, batch_id, n_roads, rng.choice(days)) for batch_id in range(n_batches)]
+    second_run = [batch_totals(rng, batch_id, n_roads, rng.choice(days)) for batch_id in range(n_batches)]
+
+    road_pci = pd.DataFrame(columns=ROAD_PCI_COLUMNS)
+    rollups = pd.DataFrame(columns=ROLLUP_COLUMNS)
+    road_pci, rollups = run(road_pci, rollups, first_run, "query-1")
+    road_pci, rollups = run(road_pci, rollups, second_run, "query-2")
+
+    sent = int(pd.concat(first_run + second_run)['cracks'].sum())
+
+    # cracks counted by each table (the last bucket of a history has all the cracks)
+    counted = {'road_pci': int(road_pci['crack_count'].sum())}
+    history_diff = {}
+    for period in ['day', 'month']:
+        counted[f'pci_rollup road / {period}'] = int(last_rows(rollups, ROAD_SCOPE, period)['crack_count'].sum())
+        counted[f'pci_rollup all / {period}'] = int(last_rows(rollups, ALL_SCOPE, period)['crack_count'].sum())
+
+        history = rollups[(rollups['scope'] == ALL_SCOPE) & (rollups['period'] == period)].set_index('bucket')['pci']
+        expected = expected_history(first_run + second_run, period)
+        history_diff[period] = float((history.sort_index() - expected.round(2)).abs().max())
+
+    counts_match = all(
+        sum(counts.values()) == count for counts, count in zip(road_pci['crack_counts'], road_pci['crack_count'])
+    )
+
+    print(f"batches     : 2 runs x {n_batches} (batch ids 0..{n_batches - 1}), {n_roads} roads, {sent} cracks")
+    for table, count in counted.items():
+        print(f"{table:<24}: {count} cracks, {sent - count} lost")
+    print(f"crack_counts: {'match crack_count' if counts_match else 'DIFFER from crack_count'}")
+    for period, diff in history_diff.items():
+        print(f"all / {period:<5} : max {diff:.2f} from the recomputed history")
+
+    # the running pci_sum can round the mean 0.01 off
+    assert all(count == sent for count in counted.values()) and counts_match
+    assert all(diff <= 0.01 for diff in history_diff.values())
+    print("ok")
@@ -0,0 +1,65 @@
+# Crack tables of the query-driven schema (scripts/cassandra.cql)
+# Every crack is written to one table per dashboard access pattern, each with
+# bounded partitions (one day / month of a district, road or crack type):
+# - crack_by_dist:  ((dist, day), timestamp, id)
+# - crack_by_road:  ((road_index, month), timestamp, id)
+# - crack_by_label: ((label, day), timestamp, id)
+# and the (day, dist) partitions are listed in crack_days, so readers
+# (streamlit/db.py) know which partitions to fan out to.
+#
+# stream_progress has the last micro-batch written by the stream, the dashboard
+# drops its cached results when it changes.
+#
+# Used by the stream (spark.py) and the migration of the old crack table (migrate_cracks.py).
+
+from datetime import datetime, timezone
+from pyspark.sql import functions as F
+from pyspark.sql.functions import col
+from pyspark.sql.types import StructType, StructField, StringType, LongType, TimestampType
+
+KEYSPACE = "pavementeye"
+
+CRACK_TABLES = ['crack_by_dist', 'crack_by_road', 'crack_by_label']
+
+progress_schema = StructType([
+    StructField("stream", StringType()),
+    StructField("batch_id", LongType()),
+    StructField("updated_at", TimestampType())
+])
+
+CRACK_COLUMNS = [
+    'id', 'road_index', 'dist', 'timestamp', 'label', 'confidence', 'image',
+    'lon', 'lat', 'x1', 'y1', 'x2', 'y2', 'ppm', 'sightings'
+]
+
+def with_buckets(cracks_df):
+    # day and month (first day) partition buckets of each crack, in UTC (session time zone)
+    return cracks_df\
+        .withColumn("day", F.to_date(col("timestamp")))\
+        .withColumn("month", F.trunc(col("timestamp"), "month"))
+
+def save(df, table):
+    df.write\
+        .format("org.apache.spark.sql.cassandra")\
+        .options(table=table, keyspace=KEYSPACE)\
+        .mode("append")\
+        .save()
+
+def write_cracks(cracks_df):
+    # cracks_df: crack rows (CRACK_COLUMNS), persisted by the caller as it is written 4 times
+    bucketed = with_buckets(cracks_df).select(*CRACK_COLUMNS, "day", "month")
+
+    save(bucketed.drop("month"), "crack_by_dist")
+    save(bucketed.drop("day"), "crack_by_road")
+    save(bucketed.drop("month"), "crack_by_label")
+
+    # partitions index (one row per district and day)
+    save(
+        bucketed.select(F.year(col("day")).alias("year"), col("day"), col("dist")).distinct(),
+        "crack_days"
+    )
+
+def write_progress(spark, stream, batch_id):
+    # last micro-batch written (after all the tables of the batch)
+    updated_at = datetime.now(timezone.utc).replace(tzinfo=None)
+    save(spark.createDataFrame([(stream, batch_id, updated_at)], schema=progress_schema), "stream_progress")
@@ -0,0 +1,78 @@
+# Spatial-temporal deduplication of crack detections
+# Consecutive frames from a moving vehicle see the same crack many times.
+# Detections of the same label that are closer than distance_m and seen
+# within window_s of each other are merged into one canonical crack
+# (first sighting's fields, max confidence, number of sightings).
+#
+# Used by spark.py inside applyInPandasWithState: the state of each
+# (label, grid cell) group is the list of its open clusters as JSON.
+
+import json
+import math
+import pandas as pd
+
+# columns of one crack row kept for the canonical crack
+CRACK_FIELDS = ['id', 'lon', 'lat', 'image', 'ppm', 'label', 'confidence', 'x1', 'x2', 'y1', 'y2']
+
+EARTH_RADIUS_M = 6371000
+
+def distance_m(lon1, lat1, lon2, lat2):
+    # equirectangular approximation, accurate for the few meters we compare
+    x = math.radians(lon2 - lon1) * math.cos(math.radians((lat1 + lat2) / 2))
+    y = math.radians(lat2 - lat1)
+    return EARTH_RADIUS_M * math.hypot(x, y)
+
+def merge_detections(clusters, rows, distance_m_max, window_s):
+    """
+    Adds new detections (same label) to the open clusters.
+
+    Parameters:
+    - clusters (list): open clusters (dicts with the crack fields, 'first_seen', 'last_seen', 'sightings')
+    - rows (DataFrame): new detections with CRACK_FIELDS and 'timestamp' (epoch seconds)
+    - distance_m_max (float): max distance in meters between two sightings of the same crack
+    - window_s (float): max time in seconds between two sightings of the same crack
+
+    Returns:
+    - list: updated clusters
+    """
+    for row in rows.sort_values('timestamp').to_dict('records'):
+        match = None
+
+        for cluster in clusters:
+            if row['timestamp'] - cluster['last_seen'] > window_s:
+                continue
+            if distance_m(cluster['lon'], cluster['lat'], row['lon'], row['lat']) <= distance_m_max:
+                match = cluster
+                break
+
+        if match is None:
+            cluster = {field: row[field] for field in CRACK_FIELDS}
+            cluster['first_seen'] = row['timestamp']
+            cluster['last_seen'] = row['timestamp']
+            cluster['sightings'] = 1
+            clusters.append(cluster)
+        else:
+            match['confidence'] = max(match['confidence'], row['confidence'])
+            match['last_seen'] = max(match['last_seen'], row['timestamp'])
+            match['sightings'] += 1
+
+    return clusters
+
+def pop_closed(clusters, watermark_s, window_s):
+    # clusters that can't be matched anymore (last sighting older than the window before the watermark)
+    closed = [c for c in clusters if c['last_seen'] + window_s <= watermark_s]
+    still_open = [c for c in clusters if c['last_seen'] + window_s > watermark_s]
+    return closed, still_open
+
+def clusters_to_frame(clusters):
+    # one canonical crack per cluster, timestamp of the first sighting
+    pdf = pd.DataFrame(clusters, columns=CRACK_FIELDS + ['first_seen', 'sightings'])
+    pdf['timestamp'] = pd.to_datetime(pdf['first_seen'], unit='s')
+    pdf['sightings'] = pdf['sightings'].astype('int32')
+    return pdf[CRACK_FIELDS + ['timestamp', 'sightings']]
+
+def dumps(clusters):
+    return json.dumps(clusters)
+
+def loads(value):
+    return json.loads(value) if value else []
@@ -1,61 +1,395 @@
-from ultralytics import YOLO
+# Crack detection on a survey video, output video with the detected boxes drawn
+# Pipelined: a decoder thread reads the frames, the calling thread runs batched
+# inference and a writer thread draws the boxes and encodes the output, connected
+# by bounded queues, so decode, inference and encode overlap.
+#
+# As a module:
+#   pipeline = VideoPipeline(*load_yolo(MODEL_PATH), batch_size=8, stride=2)
+#   summary = pipeline.run("survey.mp4", "survey_boxes.mp4")
+#
+# CLI (from scripts/):
+#   python detect_video.py survey.mp4 --output ../data/output_with_boxes.mp4 --stride 2 --batch 8
+#
+# Frames showing the same pavement as the last inferred one can be skipped
+# (frame_sampler.py): --sampler motion, or --sampler speed --track survey_gps.csv.
+# --report runs the model on every frame of a reference video and reports the
+# frames the sampler skips versus the detections it keeps.
+
+import argparse
+import queue
+import threading
+import time
 import cv2
-import torch
+from frame_sampler import MotionSampler, SpeedSampler, load_track, sampled_frames, sampling_report
 
 # -------------------- SETTINGS --------------------
 MODEL_PATH = "../models/fine_tunning/runs/main_trainging/yolov8s/weights/best.pt"  # path to your YOLOv8s model
-VIDEO_PATH = r"C:\Users\yahia\Downloads\case study 3 merged video - Made with Clipchamp.mp4"                    # path to your large video
 OUTPUT_PATH = "../data/output_with_boxes.mp4"             # output video with detections
 IMG_SIZE = 640                                    # inference image size
 # --------------------------------------------------
 
-# Load YOLOv8 model
-model = YOLO(MODEL_PATH)
+# end of the frames in a queue
+_END = object()
+
+def load_yolo(model_path=MODEL_PATH, device=None, img_size=IMG_SIZE, conf=0.25):
+    """
+    YOLOv8 model as the predict and annotate functions of the pipeline.
+
+    Parameters:
+    - model_path (str): weights of the model
+    - device (str): 'cuda' or 'cpu' (default: cuda if available)
+    - img_size (int): inference image size
+    - conf (float): min confidence of the detections
+
+    Returns:
+    - function: predict_fn(frames) -> one result per frame
+    - function: annotate_fn(frame, result) -> frame with the boxes drawn
+    """
+    import torch
+    from ultralytics import YOLO
+
+    model = YOLO(model_path)
+
+    # Use GPU if available
+    device = device or ('cuda' if torch.cuda.is_available() else 'cpu')
+    model.to(device)
+    print(f"Using device: {device}")
+
+    def predict(frames):
+        return model.predict(source=frames, imgsz=img_size, conf=conf, verbose=False)
+
+    def annotate(frame, result):
+        return result.plot()  # draw detections on frame
+
+    return predict, annotate
+
+class StageStats:
+    # frames processed by a pipeline stage and time spent working (not waiting on the queues)
+    def __init__(self, name):
+        self.name = name
+        self.frames = 0
+        self.busy_s = 0.0
+
+    def add(self, frames, seconds):
+        self.frames += frames
+        self.busy_s += seconds
+
+    def summary(self):
+        return {
+            "frames": self.frames,
+            "busy_s": round(self.busy_s, 2),
+            "fps": round(self.frames / self.busy_s, 1) if self.busy_s > 0 else None,
+        }
+
+class VideoPipeline:
+    def __init__(self, predict_fn, annotate_fn=None, batch_size=8, stride=1, queue_size=32, progress_every=500,
+                 sampler=None, count_fn=None, result_fn=None):
+        """
+        Parameters:
+        - predict_fn (function): list of frames -> list of results (same order)
+        - annotate_fn (function): (frame, result) -> annotated frame (None: frames written as they are)
+        - batch_size (int): frames per predict call
+        - stride (int): only every stride-th frame is processed (the others are skipped, not decoded)
+        - queue_size (int): max frames waiting between two stages
+        - progress_every (int): frames between two progress lines (0: no progress)
+        - sampler (MotionSampler or SpeedSampler): skips the frames without new pavement (None: no sampling)
+        - count_fn (function): result -> number of detections, counted per frame in self.detections
+        - result_fn (function): called with (frame index, frame, result) of every inferred frame, in the writer thread
+        """
+        self.predict_fn = predict_fn
+        self.annotate_fn = annotate_fn
+        self.batch_size = max(1, int(batch_size))
+        self.stride = max(1, int(stride))
+        self.queue_size = max(1, int(queue_size))
+        self.progress_every = progress_every
+        self.sampler = sampler
+        self.count_fn = count_fn
+        self.result_fn = result_fn
+
+    def run(self, video_path, output_path=None):
+        """
+        Runs the detection on a video.
+
+        Parameters:
+        - video_path (str): input video
+        - output_path (str): output video with the boxes (None: no output video)
+
+        Returns:
+        - dict: video properties, wall time and throughput of each stage
+        """
+        cap = cv2.VideoCapture(video_path)
+        if not cap.isOpened():
+            raise Exception(f"Cannot open video file: {video_path}")
+
+        fps = cap.get(cv2.CAP_PROP_FPS) or 30
+        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+
+        print(f"Processing video: {video_path}")
+        print(f"Resolution: {width}x{height}, FPS: {fps:.1f}, Total frames: {total_frames}, stride: {self.stride}")
+
+        out = None
+        if output_path is not None:
+            # Set up video writer (MP4 output), one frame every stride frames of the input
+            fourcc = cv2.VideoWriter_fourcc(*'mp4v')
+            out = cv2.VideoWriter(output_path, fourcc, fps / self.stride, (width, height))
+
+        self._stop = threading.Event()
+        self._errors = []
+        self._total = total_frames // self.stride if total_frames > 0 and self.sampler is None else None
+        self.sampled_out = 0
+        self.detections = {}
+
+        if self.sampler is not None:
+            self.sampler.reset()
+
+        self.stats = {name: StageStats(name) for name in ("decode", "infer", "write")}
+
+        frames = queue.Queue(maxsize=self.queue_size)
+        results = queue.Queue(maxsize=self.queue_size)
+
+        decoder = threading.Thread(target=self._guard, args=(self._decode, cap, frames), name="video-decoder", daemon=True)
+        writer = threading.Thread(target=self._guard, args=(self._write, results, out), name="video-writer", daemon=True)
+
+        start = time.perf_counter()
+        decoder.start()
+        writer.start()
+
+        try:
+            self._guard(self._infer, frames, results)
+        finally:
+            decoder.join()
+            writer.join()
+            cap.release()
+            if out is not None:
+                out.release()
+
+        wall_s = time.perf_counter() - start
+
+        if self._errors:
+            raise self._errors[0]
+
+        written = self.stats["write"].frames
+
+        return {
+            "video": video_path,
+            "output": output_path,
+            "resolution": f"{width}x{height}",
+            "fps": fps,
+            "total_frames": total_frames,
+            "stride": self.stride,
+            "batch_size": self.batch_size,
+            "sampled_out": self.sampled_out,
+            "frames": written,
+            "detections": sum(self.detections.values()) if self.count_fn is not None else None,
+            "wall_s": round(wall_s, 2),
+            "pipeline_fps": round(written / wall_s, 1) if wall_s > 0 else None,
+            "stages": {name: stats.summary() for name, stats in self.stats.items()},
+        }
+
+    # -------------------- stages --------------------
+    def _guard(self, stage, *args):
+        # an error in a stage stops the other stages, raised by run()
+        try:
+            stage(*args)
+        except Exception as e:
+            self._errors.append(e)
+            self._stop.set()
+
+    def _put(self, q, item):
+        # blocks while the next stage is behind, gives up when the pipeline stops
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _get(self, q):
+        while not self._stop.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        return _END
+
+    def _decode(self, cap, frames):
+        index = 0
+        try:
+            while not self._stop.is_set():
+                start = time.perf_counter()
+
+                # skipped frames are only grabbed (demuxed, not converted to images)
+                skip = index % self.stride != 0
+                if not skip and self.sampler is not None and not self.sampler.needs_frame:
+                    skip = not self.sampler.keep(index)
+                    self.sampled_out += skip
+
+                if skip:
+                    ok = cap.grab()
+                    self.stats["decode"].busy_s += time.perf_counter() - start
+                    if not ok:
+                        break
+                    index += 1
+                    continue
+
+                ok, frame = cap.read()
+                self.stats["decode"].add(1 if ok else 0, time.perf_counter() - start)
+                if not ok:
+                    break
+
+                if self.sampler is not None and self.sampler.needs_frame and not self.sampler.keep(index, frame):
+                    self.sampled_out += 1
+                    index += 1
+                    continue
+
+                if not self._put(frames, (index, frame)):
+                    break
+                index += 1
+        finally:
+            self._put(frames, _END)
+
+    def _infer(self, frames, results):
+        done = False
+        try:
+            while not done:
+                batch = []
+
+                # wait for the first frame, then take the frames already decoded (up to batch_size)
+                item = self._get(frames)
+                while item is not _END:
+                    batch.append(item)
+                    if len(batch) == self.batch_size:
+                        break
+                    try:
+                        item = frames.get_nowait()
+                    except queue.Empty:
+                        break
+                done = item is _END
+
+                if not batch:
+                    continue
+
+                start = time.perf_counter()
+                predictions = self.predict_fn([frame for _, frame in batch])
+                self.stats["infer"].add(len(batch), time.perf_counter() - start)
+
+                for (index, frame), result in zip(batch, predictions):
+                    if self.count_fn is not None:
+                        self.detections[index] = self.count_fn(result)
+                    if not self._put(results, (index, frame, result)):
+                        return
+        finally:
+            self._put(results, _END)
+
+    def _write(self, results, out):
+        while True:
+            item = self._get(results)
+            if item is _END:
+                break
+
+            index, frame, result = item
+
+            start = time.perf_counter()
+            if self.result_fn is not None:
+                self.result_fn(index, frame, result)
+            if self.annotate_fn is not None:
+                frame = self.annotate_fn(frame, result)
+            if out is not None:
+                out.write(frame)
+            self.stats["write"].add(1, time.perf_counter() - start)
+
+            written = self.stats["write"].frames
+            if self.progress_every and written % self.progress_every == 0:
+                print(f"Processed {written}/{self._total or '?'} frames...")
+
+def print_summary(summary):
+    print(f"Frames processed: {summary['frames']} (stride {summary['stride']}, batch {summary['batch_size']}, "
+          f"skipped by the sampler {summary['sampled_out']})")
+    print(f"{'stage':<8}{'frames':>10}{'busy s':>10}{'frames/s':>10}")
+    for name, stage in summary["stages"].items():
+        print(f"{name:<8}{stage['frames']:>10}{stage['busy_s']:>10}{str(stage['fps']):>10}")
+    print(f"{'total':<8}{summary['frames']:>10}{summary['wall_s']:>10}{str(summary['pipeline_fps']):>10}")
+
+def video_fps(video_path):
+    cap = cv2.VideoCapture(video_path)
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30
+    cap.release()
+    return fps
+
+def make_sampler(args):
+    if args.sampler == "motion":
+        return MotionSampler(threshold=args.motion_threshold, max_gap=args.max_gap)
+
+    if args.sampler == "speed":
+        if not args.track:
+            raise SystemExit("--sampler speed needs a GPS track (--track)")
+        times, distances = load_track(args.track)
+        return SpeedSampler(times, distances, video_fps(args.video), spacing_m=args.spacing, max_gap=args.max_gap)
+
+    return None
+
+def run_report(video_path, predict_fn, sampler, batch_size=8):
+    """
+    Frames skipped versus detections kept by a sampler on a reference video:
+    the model runs on every frame, the sampler is replayed on the same frames.
+
+    Returns:
+    - dict: output of frame_sampler.sampling_report, with the sampler settings
+    """
+    if sampler is None:
+        raise SystemExit("--report needs a sampler (--sampler motion or speed)")
 
-# Use GPU if available
-device = 'cuda' if torch.cuda.is_available() else 'cpu'
-model.to(device)
-print(f"Using device: {device}")
+    pipeline = VideoPipeline(predict_fn, batch_size=batch_size, count_fn=lambda result: len(result.boxes))
+    summary = pipeline.run(video_path)
 
-# Open input video
-cap = cv2.VideoCapture(VIDEO_PATH)
-if not cap.isOpened():
-    raise Exception(f"Cannot open video file: {VIDEO_PATH}")
+    kept = sampled_frames(video_path, sampler)
 
-# Get video properties
-fps = int(cap.get(cv2.CAP_PROP_FPS))
-frame_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-frame_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    # the same crack is seen for about half a second
+    report = sampling_report(pipeline.detections, kept, window=max(1, round(summary["fps"] / 2)))
+    report["sampler"] = type(sampler).__name__
+    report["inference_s_all_frames"] = summary["stages"]["infer"]["busy_s"]
 
-print(f"Processing video: {VIDEO_PATH}")
-print(f"Resolution: {frame_width}x{frame_height}, FPS: {fps}, Total frames: {total_frames}")
+    return report
 
-# Set up video writer (MP4 output)
-fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-out = cv2.VideoWriter(OUTPUT_PATH, fourcc, fps, (frame_width, frame_height))
+def main():
+    parser = argparse.ArgumentParser(description="Crack detection on a survey video (pipelined decode / inference / encode)")
+    parser.add_argument("video", help="input video")
+    parser.add_argument("--output", default=OUTPUT_PATH, help="output video with the boxes ('' for none)")
+    parser.add_argument("--model", default=MODEL_PATH, help="YOLOv8 weights")
+    parser.add_argument("--device", default=None, help="cuda or cpu (default: cuda if available)")
+    parser.add_argument("--imgsz", type=int, default=IMG_SIZE, help="inference image size")
+    parser.add_argument("--conf", type=float, default=0.25, help="min confidence of the detections")
+    parser.add_argument("--batch", type=int, default=8, help="frames per inference call")
+    parser.add_argument("--stride", type=int, default=1, help="process every n-th frame")
+    parser.add_argument("--queue", type=int, default=32, help="max frames waiting between two stages")
+    parser.add_argument("--sampler", choices=["none", "motion", "speed"], default="none", help="skip the frames without new pavement")
+    parser.add_argument("--motion-threshold", type=float, default=6.0, help="motion sampler: min mean gray level difference")
+    parser.add_argument("--max-gap", type=int, default=30, help="max frames between two inferred frames")
+    parser.add_argument("--track", help="speed sampler: GPS track CSV (time in s from the start, lon, lat)")
+    parser.add_argument("--spacing", type=float, default=4.0, help="speed sampler: meters traveled between two inferred frames")
+    parser.add_argument("--report", action="store_true", help="run on every frame and report the frames skipped vs the detections kept by the sampler")
+    args = parser.parse_args()
 
-# Process frames
-frame_idx = 0
-while True:
-    ret, frame = cap.read()
-    if not ret:
-        break
+    predict, annotate = load_yolo(args.model, args.device, args.imgsz, args.conf)
 
-    # Run YOLOv8 detection
-    results = model(frame, imgsz=IMG_SIZE, verbose=False)
-    annotated_frame = results[0].plot()  # draw detections on frame
+    sampler = make_sampler(args)
 
-    # Write the annotated frame to output
-    out.write(annotated_frame)
+    if args.report:
+        report = run_report(args.video, predict, sampler, args.batch)
+        for name, value in report.items():
+            print(f"{name:<28}{value}")
+        return
 
-    # Print progress every 50 frames
-    frame_idx += 1
-    if frame_idx % 50 == 0:
-        print(f"Processed {frame_idx}/{total_frames} frames...")
+    pipeline = VideoPipeline(predict, annotate, batch_size=args.batch, stride=args.stride,
+                             queue_size=args.queue, sampler=sampler)
+    summary = pipeline.run(args.video, args.output or None)
 
-# Release resources
-cap.release()
-out.release()
+    print_summary(summary)
+    if summary["output"]:
+        print(f"✅ Done! Saved annotated video to: {summary['output']}")
 
-print(f"✅ Done! Saved annotated video to: {OUTPUT_PATH}")
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+# Parquet snapshots of the cracks for analytics
+# Exports crack_by_dist to ../data/snapshots/cracks, partitioned by day and district
+# (day=YYYY-MM-DD/dist=.../*.parquet), with the road attributes joined to every crack,
+# so analytical reads (pandas, pyarrow, spark, duckdb, db.py Cassandra.snapshot)
+# don't scan the serving cluster.
+#
+# Incremental: only the (day, district) partitions from the last exported day
+# (minus SNAPSHOT_LOOKBACK_DAYS, for late cracks) are read from cassandra, and only
+# these partitions of the snapshot are rewritten (dynamic partition overwrite).
+#
+# Run once, or every SNAPSHOT_INTERVAL_S seconds (inside the pyspark container):
+#   spark-submit --packages com.datastax.spark:spark-cassandra-connector_2.12:3.5.0 /home/jovyan/scripts/export_snapshots.py
+
+import os
+import time
+from datetime import date, timedelta
+from pyspark.sql import SparkSession
+from pyspark.sql import functions as F
+from pyspark.sql.functions import col
+from road_index import ROADS_ARTIFACT
+from crack_store import KEYSPACE, CRACK_COLUMNS, write_progress
+
+SNAPSHOT_PATH = os.getenv("SNAPSHOT_PATH", "../data/snapshots/cracks")
+SNAPSHOT_LOOKBACK_DAYS = int(os.getenv("SNAPSHOT_LOOKBACK_DAYS", 2))
+SNAPSHOT_INTERVAL_S = float(os.getenv("SNAPSHOT_INTERVAL_S", 0)) # 0: export once
+
+def exported_days(path=SNAPSHOT_PATH):
+    # days already in the snapshot (day=YYYY-MM-DD directories)
+    if not os.path.isdir(path):
+        return []
+
+    return sorted(
+        date.fromisoformat(name[len("day="):])
+        for name in os.listdir(path)
+        if name.startswith("day=")
+    )
+
+def partitions_to_export(days, exported, lookback_days=SNAPSHOT_LOOKBACK_DAYS):
+    """
+    (day, district) partitions of the crack tables to export.
+
+    Parameters:
+    - days (list): (day, dist) partitions of the crack tables (crack_days rows)
+    - exported (list): days already in the snapshot
+    - lookback_days (int): days before the last exported one exported again (cracks written late)
+
+    Returns:
+    - list: (day, dist) partitions from the first day to export
+    """
+    if not exported:
+        return list(days)
+
+    since = exported[-1] - timedelta(days=lookback_days)
+
+    return [(day, dist) for day, dist in days if day >= since]
+
+def export_snapshot(spark, roads_path, path=SNAPSHOT_PATH):
+    # exports the new / changed partitions, returns the number of partitions exported
+    days = spark.read\
+        .format("org.apache.spark.sql.cassandra")\
+        .options(table="crack_days", keyspace=KEYSPACE)\
+        .load()\
+        .select("day", "dist")\
+        .collect()
+
+    partitions = partitions_to_export([(row.day, row.dist) for row in days], exported_days(path))
+    if not partitions:
+        return 0
+
+    # partition keys lookups (both partition key columns are pushed down to cassandra)
+    cracks_df = spark.read\
+        .format("org.apache.spark.sql.cassandra")\
+        .options(table="crack_by_dist", keyspace=KEYSPACE)\
+        .load()\
+        .filter(col("dist").isin(sorted({dist for _, dist in partitions})))\
+        .filter(col("day").isin(sorted({day for day, _ in partitions})))\
+        .select(*CRACK_COLUMNS, "day")
+
+    # road attributes (no geometries), small enough to be broadcast
+    roads_df = spark.read.parquet(roads_path).drop("geometry", "ADM2_EN")
+
+    snapshot_df = cracks_df\
+        .join(F.broadcast(roads_df), on="road_index", how="left")\
+        .repartition("day", "dist")\
+        .sortWithinPartitions("timestamp")
+
+    snapshot_df.write\
+        .mode("overwrite")\
+        .partitionBy("day", "dist")\
+        .option("compression", "zstd")\
+        .parquet(path)
+
+    return len(partitions)
+
+if __name__ == '__main__':
+    spark = SparkSession.builder \
+        .appName("PavementEye crack snapshots") \
+        .config("spark.cassandra.connection.host", "cassandra")\
+        .config("spark.cassandra.connection.port", "9042")\
+        .config("spark.sql.session.timeZone", "UTC")\
+        .config("spark.sql.sources.partitionOverwriteMode", "dynamic")\
+        .config("spark.sql.parquet.outputTimestampType", "TIMESTAMP_MICROS")\
+        .getOrCreate()
+
+    run = 0
+    while True:
+        start = time.perf_counter()
+        exported = export_snapshot(spark, os.path.abspath(ROADS_ARTIFACT))
+
+        # the dashboard drops its cached snapshot reads
+        if exported:
+            write_progress(spark, "snapshot_export", run)
+
+        print(f"Exported {exported} (day, district) partitions in {time.perf_counter() - start:.1f}s")
+
+        run += 1
+        if SNAPSHOT_INTERVAL_S <= 0:
+            break
+        time.sleep(SNAPSHOT_INTERVAL_S)
+
+    spark.stop()
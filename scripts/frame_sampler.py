@@ -0,0 +1,221 @@
+# Adaptive frame sampling of dashcam videos (used by detect_video.py)
+# Consecutive frames of a survey video mostly show the same pavement (and all of
+# them do while the vehicle is stopped), so only the frames showing new pavement
+# are sent to the model:
+# - MotionSampler: the frame changed enough since the last kept frame (mean absolute
+#   difference of small grayscale thumbnails)
+# - SpeedSampler: the vehicle moved enough since the last kept frame (GPS track of the video)
+# Both keep at least one frame every max_gap frames.
+
+import csv
+from datetime import datetime, timezone
+from xml.etree import ElementTree
+import numpy as np
+import cv2
+
+class MotionSampler:
+    # the frame is needed to decide (decoded even when skipped)
+    needs_frame = True
+
+    def __init__(self, threshold=6.0, min_gap=1, max_gap=30, size=(64, 36)):
+        """
+        Parameters:
+        - threshold (float): min mean absolute difference (0-255 gray levels) with the last kept frame
+        - min_gap (int): min frames between two kept frames
+        - max_gap (int): max frames between two kept frames (kept even without motion)
+        - size (tuple): size of the compared thumbnails (small: ignores noise and compression artifacts)
+        """
+        self.threshold = threshold
+        self.min_gap = max(1, int(min_gap))
+        self.max_gap = max(self.min_gap, int(max_gap))
+        self.size = size
+        self.reset()
+
+    def reset(self):
+        self.last_index = None
+        self.last_thumb = None
+
+    def thumbnail(self, frame):
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        return cv2.resize(gray, self.size, interpolation=cv2.INTER_AREA).astype(np.int16)
+
+    def keep(self, index, frame):
+        # True when the frame has to be inferred
+        if self.last_index is not None and index - self.last_index < self.min_gap:
+            return False
+
+        thumb = self.thumbnail(frame)
+
+        keep = self.last_index is None\
+            or index - self.last_index >= self.max_gap\
+            or float(np.abs(thumb - self.last_thumb).mean()) >= self.threshold
+
+        if keep:
+            self.last_index = index
+            self.last_thumb = thumb
+
+        return keep
+
+def haversine_m(lon1, lat1, lon2, lat2):
+    # distance in meters between points (arrays)
+    lon1, lat1, lon2, lat2 = map(np.radians, (lon1, lat1, lon2, lat2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 6371000 * 2 * np.arcsin(np.sqrt(a))
+
+def read_track(path):
+    """
+    GPS track of a video, from a GPX file or a CSV file with 'time' (seconds from
+    the start of the video), 'lon' and 'lat' columns.
+
+    Returns:
+    - ndarray: times (s from the start of the video, GPX: from the first fix)
+    - ndarray: longitudes
+    - ndarray: latitudes
+    - datetime: time of the first fix (UTC, GPX only, None for CSV)
+    """
+    start = None
+
+    if path.lower().endswith('.gpx'):
+        points = ElementTree.parse(path).getroot().findall('.//{*}trkpt')
+        fixes = [
+            (datetime.fromisoformat(point.find('{*}time').text.replace('Z', '+00:00')), float(point.get('lon')), float(point.get('lat')))
+            for point in points
+            if point.find('{*}time') is not None
+        ]
+        if fixes:
+            start = min(fix[0] for fix in fixes).astimezone(timezone.utc).replace(tzinfo=None)
+        rows = sorted(((time.astimezone(timezone.utc).replace(tzinfo=None) - start).total_seconds(), lon, lat) for time, lon, lat in fixes)
+    else:
+        with open(path, newline='') as f:
+            rows = sorted((float(row['time']), float(row['lon']), float(row['lat'])) for row in csv.DictReader(f))
+
+    if not rows:
+        raise ValueError(f"Empty GPS track: {path}")
+
+    times, lons, lats = (np.array(values) for values in zip(*rows))
+
+    return times, lons, lats, start
+
+def load_track(path):
+    """
+    Distance traveled along the GPS track of a video (see read_track).
+
+    Returns:
+    - ndarray: times (s)
+    - ndarray: distance traveled since the start of the video at each time (m)
+    """
+    times, lons, lats, _ = read_track(path)
+    steps = haversine_m(lons[:-1], lats[:-1], lons[1:], lats[1:])
+
+    return times, np.concatenate([[0.0], np.cumsum(steps)])
+
+class SpeedSampler:
+    # decided from the frame time only (skipped frames aren't decoded)
+    needs_frame = False
+
+    def __init__(self, times, distances, fps, spacing_m=4.0, max_gap=None):
+        """
+        Parameters:
+        - times, distances (ndarray): GPS track (output of load_track)
+        - fps (float): frames per second of the video
+        - spacing_m (float): distance traveled between two kept frames (~ length of road in a frame)
+        - max_gap (int): max frames between two kept frames (default: 10 s of video)
+        """
+        self.times = times
+        self.distances = distances
+        self.fps = fps
+        self.spacing_m = spacing_m
+        self.max_gap = int(max_gap or fps * 10)
+        self.reset()
+
+    def reset(self):
+        self.last_index = None
+        self.last_distance = None
+
+    def distance(self, index):
+        # distance traveled at the time of the frame (linear between the GPS fixes)
+        return float(np.interp(index / self.fps, self.times, self.distances))
+
+    def keep(self, index, frame=None):
+        distance = self.distance(index)
+
+        keep = self.last_index is None\
+            or index - self.last_index >= self.max_gap\
+            or distance - self.last_distance >= self.spacing_m
+
+        if keep:
+            self.last_index = index
+            self.last_distance = distance
+
+        return keep
+
+def sampling_report(detections, kept, window):
+    """
+    Frames skipped versus detections retained by a sampler, from a run on every frame.
+
+    Parameters:
+    - detections (dict): frame index -> number of detections (every frame of the video)
+    - kept (list): indices of the frames kept by the sampler
+    - window (int): a frame with cracks is covered when a kept frame at most `window`
+      frames away has cracks too (the same cracks are seen on consecutive frames)
+
+    Returns:
+    - dict: frames, kept / skipped frames, detections on all / kept frames and covered frames with cracks
+    """
+    frames = len(detections)
+    kept = np.array(sorted(kept), dtype='int64')
+
+    with_cracks = np.array(sorted(index for index, count in detections.items() if count > 0), dtype='int64')
+    kept_with_cracks = kept[[detections.get(int(index), 0) > 0 for index in kept]] if len(kept) else kept
+
+    covered = 0
+    if len(with_cracks) and len(kept_with_cracks):
+        # distance of every frame with cracks to the closest kept frame with cracks
+        position = np.clip(np.searchsorted(kept_with_cracks, with_cracks), 1, len(kept_with_cracks)) - 1
+        closest = np.minimum(
+            np.abs(with_cracks - kept_with_cracks[position]),
+            np.abs(with_cracks - kept_with_cracks[np.minimum(position + 1, len(kept_with_cracks) - 1)])
+        )
+        covered = int((closest <= window).sum())
+
+    total_detections = int(sum(detections.values()))
+
+    return {
+        "frames": frames,
+        "kept_frames": len(kept),
+        "skipped_frames": frames - len(kept),
+        "skipped_pct": round(100 * (frames - len(kept)) / frames, 1) if frames else 0.0,
+        "detections": total_detections,
+        "kept_detections": int(sum(detections.get(int(index), 0) for index in kept)),
+        "frames_with_cracks": len(with_cracks),
+        "covered_frames_with_cracks": covered,
+        "covered_pct": round(100 * covered / len(with_cracks), 1) if len(with_cracks) else 100.0,
+    }
+
+def sampled_frames(video_path, sampler):
+    # indices of the frames of a video kept by a sampler (no inference)
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise Exception(f"Cannot open video file: {video_path}")
+
+    sampler.reset()
+    kept = []
+    index = 0
+
+    while True:
+        if not sampler.needs_frame:
+            if not cap.grab():
+                break
+            if sampler.keep(index):
+                kept.append(index)
+        else:
+            ok, frame = cap.read()
+            if not ok:
+                break
+            if sampler.keep(index, frame):
+                kept.append(index)
+        index += 1
+
+    cap.release()
+
+    return kept
@@ -0,0 +1,185 @@
+# Ingestion of a geotagged survey video into the crack pipeline
+# Runs the detection on the frames of a video (pipelined and batched, detect_video.py),
+# places every frame on the GPS track of the drive (GPX or CSV, interpolated at the
+# frame time) and publishes the same records as the live stream_image path
+# (backend/endpoints/upload_image.py) to Kafka, so the Spark stream stores them like
+# any other frame. Whole drives are backfilled without replaying them through the socket server.
+#
+# By default only the frames every --spacing meters driven are inferred (SpeedSampler).
+# Frames without cracks follow EMPTY_FRAME_POLICY like the backend (coverage heartbeat by default).
+#
+# Run (from scripts/, same Kafka settings as the backend, see README):
+#   python ingest_video.py survey.mp4 survey.gpx --ppm 120
+#   python ingest_video.py survey.mp4 survey.csv --ppm 120 --start 2025-03-01T09:30:00 --upload local
+
+import argparse
+import os
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+import numpy as np
+import cv2
+from detect_video import MODEL_PATH, IMG_SIZE, VideoPipeline, load_yolo, print_summary
+from frame_sampler import MotionSampler, SpeedSampler, read_track, haversine_m
+
+# the kafka producer and the uploads of the backend are reused as they are
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend')
+sys.path.append(BACKEND_DIR)
+from kafka_producer import KAFKA_TOPIC, kafka_producer, publish, publish_coverage, delivery_stats
+from detections import Detections
+
+# same as the backend: "coverage", "crack" or "drop"
+EMPTY_FRAME_POLICY = os.getenv("EMPTY_FRAME_POLICY", "coverage")
+
+def result_labels(result):
+    # detections of an ultralytics result in the record format of the backend (model.detect)
+    return Detections.from_ultralytics(result).to_dicts()
+
+class FramePublisher:
+    # publishes the record of every inferred frame (called by the pipeline writer thread)
+    def __init__(self, times, lons, lats, start, fps, ppm, labels_fn=result_labels, upload_queue=None, topic=KAFKA_TOPIC):
+        """
+        Parameters:
+        - times, lons, lats (ndarray): GPS track (output of frame_sampler.read_track)
+        - start (datetime): time of the first frame of the video
+        - fps (float): frames per second of the video
+        - ppm (float): pixels per meter of the frames
+        - labels_fn (function): result -> list of detections ({"label", "confidence", "x1", "y1", "x2", "y2"})
+        - upload_queue (UploadQueue): frames with cracks are uploaded like the backend does (None: not uploaded)
+        """
+        self.times = times
+        self.lons = lons
+        self.lats = lats
+        self.start = start
+        self.fps = fps
+        self.ppm = ppm
+        self.labels_fn = labels_fn
+        self.upload_queue = upload_queue
+        self.topic = topic
+
+        self.frames = 0
+        self.cracks = 0
+        self.coverage = 0
+        self.untracked = 0
+
+    def __call__(self, index, frame, result):
+        t = index / self.fps
+
+        # no position outside of the track
+        if t < self.times[0] or t > self.times[-1]:
+            self.untracked += 1
+            return
+
+        lon = round(float(np.interp(t, self.times, self.lons)), 7)
+        lat = round(float(np.interp(t, self.times, self.lats)), 7)
+        frame_time = (self.start + timedelta(seconds=t)).isoformat()
+
+        labels = self.labels_fn(result)
+
+        # same record as detect_endpoint
+        record = {
+            "lon": lon,
+            "lat": lat,
+            "time": frame_time,
+            "labels": labels,
+            "ppm": self.ppm, # pixel per meter
+            "image": f"{lon}_{lat}_{frame_time}.jpg" # image name in azure datalake in folder /raw
+        }
+
+        self.frames += 1
+
+        if labels or EMPTY_FRAME_POLICY == "crack":
+            publish(record, self.topic)
+            self.cracks += len(labels)
+
+            if labels and self.upload_queue is not None:
+                ok, buffer = cv2.imencode(".jpg", frame)
+                if ok:
+                    self.upload_queue.put(buffer, f'raw/{record["image"]}')
+        elif EMPTY_FRAME_POLICY == "coverage":
+            publish_coverage(lon, lat, frame_time)
+            self.coverage += 1
+
+    def stats(self):
+        return {
+            "frames": self.frames,
+            "cracks": self.cracks,
+            "coverage_heartbeats": self.coverage,
+            "frames_outside_track": self.untracked,
+        }
+
+def make_upload_queue(name):
+    from upload_queue import UploadQueue, get_upload_backend
+
+    return UploadQueue(
+        get_upload_backend(name),
+        spool_dir=os.getenv("UPLOAD_SPOOL_DIR", "./spool"),
+        workers=int(os.getenv("UPLOAD_WORKERS", 2)),
+        max_pending=int(os.getenv("UPLOAD_MAX_PENDING", 1000)),
+        max_retries=int(os.getenv("UPLOAD_MAX_RETRIES", 5))
+    )
+
+def wait_uploads(upload_queue, timeout_s=600):
+    # the upload workers are daemon threads, wait for the spooled frames before exiting
+    deadline = time.monotonic() + timeout_s
+    while upload_queue.stats()["pending"] > 0 and time.monotonic() < deadline:
+        time.sleep(0.5)
+
+def main():
+    parser = argparse.ArgumentParser(description="Publish the cracks of a geotagged survey video to the crack pipeline")
+    parser.add_argument("video", help="input video")
+    parser.add_argument("track", help="GPS track of the video: GPX, or CSV with time (s from the start), lon, lat")
+    parser.add_argument("--ppm", type=float, required=True, help="pixels per meter of the frames")
+    parser.add_argument("--start", help="time of the first frame (ISO, UTC), default: first GPX fix or now")
+    parser.add_argument("--offset", type=float, default=0.0, help="seconds of track before the first frame")
+    parser.add_argument("--model", default=MODEL_PATH, help="YOLOv8 weights")
+    parser.add_argument("--device", default=None, help="cuda or cpu (default: cuda if available)")
+    parser.add_argument("--imgsz", type=int, default=IMG_SIZE, help="inference image size")
+    parser.add_argument("--conf", type=float, default=0.25, help="min confidence of the detections")
+    parser.add_argument("--batch", type=int, default=8, help="frames per inference call")
+    parser.add_argument("--sampler", choices=["none", "motion", "speed"], default="speed", help="frames inferred")
+    parser.add_argument("--spacing", type=float, default=4.0, help="speed sampler: meters driven between two inferred frames")
+    parser.add_argument("--motion-threshold", type=float, default=6.0, help="motion sampler: min mean gray level difference")
+    parser.add_argument("--max-gap", type=int, default=30, help="max frames between two inferred frames")
+    parser.add_argument("--upload", choices=["datalake", "osb", "local"], help="upload the frames with cracks (backend UPLOAD_BACKEND)")
+    parser.add_argument("--topic", default=KAFKA_TOPIC, help="kafka topic of the crack records")
+    args = parser.parse_args()
+
+    times, lons, lats, track_start = read_track(args.track)
+
+    # track times from the first frame of the video
+    times = times - args.offset
+    start = datetime.fromisoformat(args.start) if args.start else (track_start or datetime.now(timezone.utc).replace(tzinfo=None)) + timedelta(seconds=args.offset)
+
+    cap = cv2.VideoCapture(args.video)
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30
+    cap.release()
+
+    sampler = None
+    if args.sampler == "speed":
+        distances = np.concatenate([[0.0], np.cumsum(haversine_m(lons[:-1], lats[:-1], lons[1:], lats[1:]))])
+        sampler = SpeedSampler(times, distances, fps, spacing_m=args.spacing, max_gap=args.max_gap)
+    elif args.sampler == "motion":
+        sampler = MotionSampler(threshold=args.motion_threshold, max_gap=args.max_gap)
+
+    upload_queue = make_upload_queue(args.upload) if args.upload else None
+    publisher = FramePublisher(times, lons, lats, start, fps, args.ppm, upload_queue=upload_queue, topic=args.topic)
+
+    predict, _ = load_yolo(args.model, args.device, args.imgsz, args.conf)
+
+    pipeline = VideoPipeline(predict, batch_size=args.batch, sampler=sampler, result_fn=publisher)
+    summary = pipeline.run(args.video)
+
+    # records are sent in the background (batched by the producer)
+    kafka_producer.flush()
+    if upload_queue is not None:
+        wait_uploads(upload_queue)
+
+    print_summary(summary)
+    print(f"Published: {publisher.stats()}")
+    print(f"Kafka: {delivery_stats.stats()}")
+    if upload_queue is not None:
+        print(f"Uploads: {upload_queue.stats()}")
+
+if __name__ == '__main__':
+    main()
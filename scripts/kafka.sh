@@ -17,6 +17,13 @@ kafka-topics -create \
 --replication-factor 3 \
 --topic test
 
+# Heartbeats of frames without cracks (road coverage)
+kafka-topics -create \
+--bootstrap-server localhost:9092 \
+--partitions 3 \
+--replication-factor 3 \
+--topic coverage
+
 # List all topics
 kafka-topics -list \
 --bootstrap-server localhost:9092
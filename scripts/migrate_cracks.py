@@ -0,0 +1,41 @@
+# Migration of the old crack table (one partition per district) to the
+# query-driven tables (crack_by_dist, crack_by_road, crack_by_label, crack_days).
+# The old table is only read, drop it once the dashboard works on the new tables:
+#   DROP TABLE pavementeye.crack;
+#
+# Create the new tables first (scripts/cassandra.cql), then run (inside the pyspark container):
+#   spark-submit --packages com.datastax.spark:spark-cassandra-connector_2.12:3.5.0 /home/jovyan/scripts/migrate_cracks.py
+
+import time
+from pyspark.sql import SparkSession
+from pyspark.sql import functions as F
+from crack_store import KEYSPACE, CRACK_COLUMNS, write_cracks, write_progress
+
+if __name__ == '__main__':
+    spark = SparkSession.builder \
+        .appName("PavementEye crack tables migration") \
+        .config("spark.cassandra.connection.host", "cassandra")\
+        .config("spark.cassandra.connection.port", "9042")\
+        .config("spark.sql.session.timeZone", "UTC")\
+        .getOrCreate()
+
+    start = time.perf_counter()
+
+    cracks_df = spark.read\
+        .format("org.apache.spark.sql.cassandra")\
+        .options(table="crack", keyspace=KEYSPACE)\
+        .load()
+
+    # cracks stored before the deduplication stage have no sightings
+    if "sightings" not in cracks_df.columns:
+        cracks_df = cracks_df.withColumn("sightings", F.lit(None).cast("int"))
+
+    cracks_df = cracks_df.select(*CRACK_COLUMNS).persist()
+
+    write_cracks(cracks_df)
+    write_progress(spark, "migration", 0)
+
+    print(f"Migrated {cracks_df.count()} cracks in {time.perf_counter() - start:.1f}s")
+
+    cracks_df.unpersist()
+    spark.stop()
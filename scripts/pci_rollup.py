@@ -0,0 +1,282 @@
+# PCI history rollups
+# Daily and monthly aggregates of the cracks per road, per district and for
+# all roads, kept in the pci_rollup table so the history charts read a few
+# rows per period instead of every crack.
+#
+# Every row holds the state at the end of its bucket, from all the cracks seen
+# up to then (not only the cracks of the bucket), so the PCI of a bucket is the
+# PCI the road / district had at that time:
+# - road rows: cumulative cracks of the road and their PCI (same formula as the
+#   current PCI in road_pci)
+# - district / all rows: PCI = mean PCI of the roads with cracks seen so far,
+#   kept as a running sum of the road PCIs and a road count, so a batch only
+#   adds the change of the PCI of the roads it touched
+#
+# Rows are only written for the buckets with new cracks, a bucket without a row
+# has the values of the last row before it. A batch with cracks in an older
+# bucket also updates the later rows of the same partitions.
+#
+# Used by pci_sink.py on the driver, from the totals of each micro-batch.
+
+import numpy as np
+import pandas as pd
+from pci import pci_from_totals
+
+PERIODS = ['day', 'month']
+
+ROAD_SCOPE = 'road'
+DISTRICT_SCOPE = 'district'
+ALL_SCOPE = 'all'
+ALL_KEY = 'all'
+
+# partition key + clustering key of the pci_rollup table
+PARTITION_KEY = ['scope', 'scope_key', 'period']
+ROLLUP_KEY = PARTITION_KEY + ['bucket']
+
+# columns of the pci_rollup table
+ROLLUP_COLUMNS = ROLLUP_KEY + [
+    'dist', 'crack_count', 'crack_counts', 'dv_sum', 'road_count', 'pci_sum',
+    'pci', 'last_batch_key', 'last_updated'
+]
+
+# crack_counts maps are added up as one column per label while merging
+LABEL_PREFIX = 'label:'
+
+def period_start(day, period):
+    # start of the day / month of each (day truncated) timestamp
+    day = pd.to_datetime(day).astype('datetime64[ns]')
+    if period == 'month':
+        return day.dt.to_period('M').dt.start_time.astype('datetime64[ns]')
+    return day
+
+def road_rollup_totals(day_totals):
+    """
+    Totals of each road and bucket of every period.
+
+    Parameters:
+    - day_totals (DataFrame): rows with 'road_index', 'dist', 'day', 'label', 'cracks' and 'dv_sum'
+
+    Returns:
+    - DataFrame: one row per road, period and bucket with ROLLUP_KEY, 'dist',
+      'crack_count', 'crack_counts' (label -> cracks) and 'dv_sum' of the cracks of the bucket
+    """
+    frames = []
+
+    for period in PERIODS:
+        buckets = day_totals.assign(period=period, bucket=period_start(day_totals['day'], period))
+        by_label = buckets\
+            .groupby(['road_index', 'dist', 'period', 'bucket', 'label'], as_index=False)[['cracks', 'dv_sum']]\
+            .sum()
+
+        grouped = by_label.groupby(['road_index', 'dist', 'period', 'bucket'])
+        totals = grouped.agg(crack_count=('cracks', 'sum'), dv_sum=('dv_sum', 'sum')).reset_index()
+
+        # plain python values, written as a cassandra map column
+        counts = [dict(zip(g['label'].tolist(), g['cracks'].tolist())) for _, g in grouped]
+        totals['crack_counts'] = counts
+
+        frames.append(totals)
+
+    totals = pd.concat(frames, ignore_index=True)
+    totals['scope'] = ROAD_SCOPE
+    totals['scope_key'] = totals['road_index'].astype(str)
+
+    return totals[ROLLUP_KEY + ['dist', 'crack_count', 'crack_counts', 'dv_sum']]
+
+def group_keys(road_totals):
+    # district and all-roads scope keys touched by the road totals of a batch
+    return sorted(road_totals['dist'].unique().tolist()) + [ALL_KEY]
+
+def _label_columns(*frames):
+    # one column per label of the crack_counts maps of the frames
+    labels = set()
+    for frame in frames:
+        for counts in frame['crack_counts']:
+            labels.update(counts if isinstance(counts, dict) else {})
+    return [LABEL_PREFIX + label for label in sorted(labels)]
+
+def _split_counts(rows, labels):
+    # crack_counts maps as one column per label (0 when missing)
+    counts = pd.DataFrame(
+        [counts if isinstance(counts, dict) else {} for counts in rows['crack_counts']],
+        index=rows.index, columns=[label[len(LABEL_PREFIX):] for label in labels], dtype='float64'
+    ).fillna(0)
+    counts.columns = labels
+    return pd.concat([rows.drop(columns='crack_counts'), counts], axis=1)
+
+def _join_counts(values, labels):
+    # label columns back to crack_counts maps (plain python values, without the empty labels)
+    counts = np.rint(values[labels].to_numpy()).astype('int64')
+    names = [label[len(LABEL_PREFIX):] for label in labels]
+    return [{name: int(n) for name, n in zip(names, row) if n} for row in counts]
+
+def _carry(rows, series, values):
+    # values of the last row of series at or before each row, in the same partition (NaN if none)
+    if rows.empty or series.empty:
+        return pd.DataFrame(np.nan, index=rows.index, columns=values)
+
+    # same key dtypes on both sides (stored rows and batch totals can differ)
+    keys = {column: str for column in PARTITION_KEY}
+    left = rows[ROLLUP_KEY].astype(keys).reset_index().sort_values('bucket')
+    right = series[ROLLUP_KEY + values].astype(keys).sort_values('bucket')
+    carried = pd.merge_asof(left, right, on='bucket', by=PARTITION_KEY, direction='backward')
+
+    return carried.set_index('index').reindex(rows.index)[values]
+
+def _accumulate(current, steps, values, key):
+    """
+    Adds the steps of a batch to the cumulative rows of their partitions.
+
+    Parameters:
+    - current (DataFrame): stored rows (ROLLUP_KEY, 'last_batch_key' and values), at least every row
+      of the changed partitions
+    - steps (DataFrame): change of the values from each bucket on (ROLLUP_KEY and values)
+    - values (list): cumulative value columns
+    - key (str): key of the micro-batch, the rows that already have it keep their values
+
+    Returns:
+    - DataFrame: every row of the changed partitions after the batch (stored and new buckets),
+      ROLLUP_KEY, 'changed' (values changed by the batch) and 'applied' (already written by this batch)
+    - DataFrame: values of the rows before the batch (0 where the partition had no row yet)
+    - DataFrame: values of the rows after the batch
+    """
+    steps = steps.groupby(ROLLUP_KEY, as_index=False)[values].sum().sort_values(ROLLUP_KEY)
+    change = steps.copy()
+    change[values] = steps.groupby(PARTITION_KEY)[values].cumsum()
+
+    stored = current\
+        .assign(bucket=pd.to_datetime(current['bucket']).astype('datetime64[ns]'))\
+        .merge(change[PARTITION_KEY].drop_duplicates(), on=PARTITION_KEY)
+    stored = stored[ROLLUP_KEY + ['last_batch_key'] + values]
+
+    new_buckets = change[ROLLUP_KEY]\
+        .merge(stored[ROLLUP_KEY], how='left', indicator=True)\
+        .query("_merge == 'left_only'")\
+        .drop(columns='_merge')
+
+    rows = pd.concat([stored[ROLLUP_KEY + ['last_batch_key']], new_buckets], ignore_index=True)
+    is_stored = np.arange(len(rows)) < len(stored)
+    rows['applied'] = (rows['last_batch_key'] == key).to_numpy()
+
+    delta = _carry(rows, change, values)
+    rows['changed'] = delta.notna().all(axis=1).to_numpy()
+    delta = delta.fillna(0)
+
+    # values before the batch: stored values (without the batch if it's already in them),
+    # carried forward to the new buckets
+    old = pd.DataFrame(0.0, index=rows.index, columns=values)
+    stored_old = stored[values].astype('float64').to_numpy() - np.where(
+        rows.loc[is_stored, 'applied'].to_numpy()[:, None], delta[is_stored].to_numpy(), 0
+    )
+    old.loc[is_stored, values] = stored_old
+    before = rows[is_stored][ROLLUP_KEY].assign(**dict(zip(values, stored_old.T)))
+    old.loc[~is_stored, values] = _carry(rows[~is_stored], before, values).fillna(0).to_numpy()
+
+    new = old + delta
+
+    return rows.drop(columns='last_batch_key'), old, new
+
+def merge_road_rollups(current, totals, key, updated_at):
+    """
+    Adds the road totals of a batch to the stored road rollups.
+
+    Parameters:
+    - current (DataFrame): stored road rows of the totals partitions, all their buckets (ROLLUP_COLUMNS, may be empty)
+    - totals (DataFrame): road totals of the batch (output of road_rollup_totals)
+    - key (str): key of the micro-batch (road_pci.batch_key), a batch replayed after a failure isn't added twice
+    - updated_at (datetime): last_updated of the changed rows
+
+    Returns:
+    - DataFrame: new road rows (ROLLUP_COLUMNS)
+    - DataFrame: change of the road PCIs for the district / all rollups, from each road row on
+      (ROLLUP_KEY of the road row, 'dist', 'crack_count', label columns, 'pci_sum', 'road_count')
+    """
+    labels = _label_columns(current, totals)
+    values = ['crack_count', 'dv_sum'] + labels
+
+    rows, old, new = _accumulate(_split_counts(current, labels), _split_counts(totals, labels), values, key)
+
+    dists = totals.drop_duplicates('scope_key').set_index('scope_key')['dist']
+    rows['dist'] = rows['scope_key'].map(dists)
+
+    # roads without cracks before the batch (in that bucket) count as new roads of the district
+    had_road = (old['crack_count'] > 0).to_numpy()
+    old_pci = np.where(had_road, pci_from_totals(old['crack_count'], old['dv_sum']), 0)
+    new_pci = pci_from_totals(new['crack_count'], new['dv_sum'])
+
+    write = (rows['changed'] & ~rows['applied']).to_numpy()
+
+    roads = rows.loc[write, ROLLUP_KEY + ['dist']].reset_index(drop=True)
+    roads['crack_count'] = np.rint(new.loc[write, 'crack_count'].to_numpy()).astype('int32')
+    roads['crack_counts'] = _join_counts(new[write], labels)
+    roads['dv_sum'] = new.loc[write, 'dv_sum'].to_numpy()
+    roads['road_count'] = None
+    roads['pci_sum'] = None
+    roads['pci'] = new_pci[write]
+    roads['last_batch_key'] = key
+    roads['last_updated'] = updated_at
+
+    # change of each road row, as steps from one row of the road to the next
+    changes = rows[ROLLUP_KEY + ['dist']].copy()
+    changes[['crack_count'] + labels] = (new - old)[['crack_count'] + labels].to_numpy()
+    changes['pci_sum'] = np.where(rows['changed'], new_pci - old_pci, 0)
+    changes['road_count'] = (rows['changed'] & ~had_road).astype('int32')
+    changes = changes.sort_values(ROLLUP_KEY).reset_index(drop=True)
+
+    steps = changes.copy()
+    step_values = ['crack_count', 'pci_sum', 'road_count'] + labels
+    steps[step_values] = changes.groupby(PARTITION_KEY)[step_values].diff().fillna(changes[step_values])
+    steps = steps[(steps[step_values] != 0).any(axis=1)].reset_index(drop=True)
+
+    return roads[ROLLUP_COLUMNS], steps
+
+def group_rollup_deltas(deltas):
+    # changes of the road rows summed per district and for all roads
+    values = ['crack_count', 'pci_sum', 'road_count'] + [c for c in deltas.columns if c.startswith(LABEL_PREFIX)]
+    frames = []
+
+    for scope, keys in ((DISTRICT_SCOPE, ['dist']), (ALL_SCOPE, [])):
+        totals = deltas.groupby(['period', 'bucket'] + keys, as_index=False)[values].sum()
+        totals['scope'] = scope
+        totals['scope_key'] = totals['dist'] if keys else ALL_KEY
+        frames.append(totals[ROLLUP_KEY + values])
+
+    return pd.concat(frames, ignore_index=True)
+
+def merge_group_rollups(current, deltas, key, updated_at):
+    """
+    Adds the changes of the road rows to the stored district and all-roads rollups.
+
+    Parameters:
+    - current (DataFrame): stored district / all rows of the changed partitions, all their buckets
+      (ROLLUP_COLUMNS, may be empty)
+    - deltas (DataFrame): changes of the road rows (second output of merge_road_rollups)
+    - key (str): key of the micro-batch (road_pci.batch_key), a batch replayed after a failure isn't added twice
+    - updated_at (datetime): last_updated of the changed rows
+
+    Returns:
+    - DataFrame: new district / all rows (ROLLUP_COLUMNS)
+    """
+    steps = group_rollup_deltas(deltas)
+    labels = _label_columns(current) + [c for c in steps.columns if c.startswith(LABEL_PREFIX)]
+    labels = sorted(set(labels))
+    values = ['crack_count', 'road_count', 'pci_sum'] + labels
+
+    steps = steps.reindex(columns=ROLLUP_KEY + values, fill_value=0)
+    rows, _, new = _accumulate(_split_counts(current, labels), steps, values, key)
+
+    write = (rows['changed'] & ~rows['applied']).to_numpy()
+    new = new[write]
+
+    groups = rows.loc[write, ROLLUP_KEY].reset_index(drop=True)
+    groups['dist'] = None
+    groups['crack_count'] = np.rint(new['crack_count'].to_numpy()).astype('int32')
+    groups['crack_counts'] = _join_counts(new, labels)
+    groups['dv_sum'] = None
+    groups['road_count'] = np.rint(new['road_count'].to_numpy()).astype('int32')
+    groups['pci_sum'] = new['pci_sum'].to_numpy()
+    groups['pci'] = np.round(groups['pci_sum'] / groups['road_count'], 2)
+    groups['last_batch_key'] = key
+    groups['last_updated'] = updated_at
+
+    return groups[ROLLUP_COLUMNS]
@@ -0,0 +1,212 @@
+# Cassandra sinks of the PCI tables
+# - road_pci: current PCI per road (road_pci.py)
+# - pci_rollup: daily / monthly PCI history per road, district and all roads (pci_rollup.py)
+#
+# Shared by the stream (spark.py, every micro-batch of cracks) and the
+# backfill job (backfill_pci.py, all the cracks). The cracks are reduced
+# on the executors to totals per (road, district, day, crack type), which
+# are small enough to be merged with the stored rows on the driver.
+
+import os
+import threading
+from datetime import datetime, timezone
+import pandas as pd
+from pyspark.sql import functions as F
+from pyspark.sql.functions import col, pandas_udf
+from pyspark.sql.types import *
+from road_pci import ROAD_PCI_COLUMNS, batch_key, road_totals, merge_road_pci
+from pci_rollup import (
+    PERIODS, ROAD_SCOPE, DISTRICT_SCOPE, ALL_SCOPE, ROLLUP_COLUMNS,
+    road_rollup_totals, group_keys, merge_road_rollups, merge_group_rollups
+)
+
+KEYSPACE = "pavementeye"
+
+# the PCI functions are shared with the dashboard (streamlit/)
+STREAMLIT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'streamlit')
+
+road_pci_schema = StructType([
+    StructField("road_index", IntegerType()),
+    StructField("crack_count", IntegerType()),
+    StructField("dv_sum", DoubleType()),
+    StructField("crack_area", MapType(StringType(), DoubleType())),
+    StructField("crack_counts", MapType(StringType(), IntegerType())),
+    StructField("pci", DoubleType()),
+    StructField("condition", StringType()),
+    StructField("last_batch_key", StringType()),
+    StructField("last_updated", TimestampType())
+])
+
+pci_rollup_schema = StructType([
+    StructField("scope", StringType()),
+    StructField("scope_key", StringType()),
+    StructField("period", StringType()),
+    StructField("bucket", TimestampType()),
+    StructField("dist", StringType()),
+    StructField("crack_count", IntegerType()),
+    StructField("crack_counts", MapType(StringType(), IntegerType())),
+    StructField("dv_sum", DoubleType()),
+    StructField("road_count", IntegerType()),
+    StructField("pci_sum", DoubleType()),
+    StructField("pci", DoubleType()),
+    StructField("last_batch_key", StringType()),
+    StructField("last_updated", TimestampType())
+])
+
+class QueryId:
+    # id of a streaming query (StreamingQuery.id), kept in its checkpoint: the same after a
+    # restart from the checkpoint, a new one when the checkpoint is deleted
+    def __init__(self):
+        self.value = None
+        self._known = threading.Event()
+
+    def set(self, query):
+        self.value = str(query.id)
+        self._known.set()
+        return query
+
+    def get(self):
+        # the first micro-batch can start before start() returned
+        self._known.wait()
+        return self.value
+
+def ship_pci_modules(spark):
+    # modules imported by the deduct value UDF on the workers
+    scripts_dir = os.path.dirname(os.path.abspath(__file__))
+    spark.sparkContext.addPyFile(os.path.join(scripts_dir, 'road_index.py'))
+    spark.sparkContext.addPyFile(os.path.join(STREAMLIT_DIR, 'deduct_value_func.py'))
+    spark.sparkContext.addPyFile(os.path.join(STREAMLIT_DIR, 'pci.py'))
+
+def deduct_value_udf(roads_path):
+    # Deduct value of each crack (medium severity), same as the dashboard PCI
+    @pandas_udf(DoubleType())
+    def deduct_value(road_index: pd.Series, label: pd.Series, x1: pd.Series, x2: pd.Series,
+                     y1: pd.Series, y2: pd.Series, ppm: pd.Series) -> pd.Series:
+        # Import inside the UDF for execution on workers
+        from road_index import road_lengths
+        from pci import crack_deduct_values
+
+        cracks = pd.DataFrame({'label': label, 'x1': x1, 'x2': x2, 'y1': y1, 'y2': y2, 'ppm': ppm})
+        road_length = road_lengths(roads_path).reindex(road_index).to_numpy()
+
+        return pd.Series(crack_deduct_values(cracks, road_length))
+
+    return deduct_value
+
+def day_totals(cracks_df, roads_path):
+    # totals of each (road, district, day, crack type) as a pandas DataFrame
+    deduct_value = deduct_value_udf(roads_path)
+
+    return cracks_df\
+        .filter(col("road_index") != -1)\
+        .withColumn("day", F.date_trunc("day", col("timestamp")))\
+        .withColumn("area", F.abs(col("x2") - col("x1")) / col("ppm") * F.abs(col("y2") - col("y1")) / col("ppm"))\
+        .withColumn("dv", deduct_value(
+            col("road_index"), col("label"), col("x1"), col("x2"), col("y1"), col("y2"), col("ppm")
+        ))\
+        .groupBy("road_index", "dist", "day", "label")\
+        .agg(
+            F.count("*").alias("cracks"),
+            F.sum("area").alias("area"),
+            F.sum("dv").alias("dv_sum")
+        )\
+        .toPandas()
+
+def read_table(spark, table, columns, *conditions):
+    # rows of a table as pandas (conditions on the primary key are pushed down to cassandra)
+    df = spark.read\
+        .format("org.apache.spark.sql.cassandra")\
+        .options(table=table, keyspace=KEYSPACE)\
+        .load()
+
+    for condition in conditions:
+        df = df.filter(condition)
+
+    return df.select(*columns).toPandas()
+
+def save_table(spark, pdf, table, schema, mode="append", **options):
+    spark.createDataFrame(pdf, schema=schema).write\
+        .format("org.apache.spark.sql.cassandra")\
+        .options(table=table, keyspace=KEYSPACE, **options)\
+        .mode(mode)\
+        .save()
+
+def update_road_pci(spark, totals, key, updated_at):
+    totals = road_totals(totals)
+
+    # stored rows of the changed roads only (partition key lookups)
+    current = read_table(
+        spark, "road_pci", ROAD_PCI_COLUMNS,
+        col("road_index").isin(totals['road_index'].tolist())
+    )
+
+    road_pci = merge_road_pci(current, totals, key, updated_at)
+    if not road_pci.empty:
+        save_table(spark, road_pci, "road_pci", road_pci_schema)
+
+def update_pci_rollups(spark, totals, key, updated_at):
+    totals = road_rollup_totals(totals)
+
+    # stored rows of the changed keys only (partition key lookups), every bucket: the rows are
+    # cumulative, a new bucket starts from the last row before it
+    current_roads = read_table(
+        spark, "pci_rollup", ROLLUP_COLUMNS,
+        col("scope") == ROAD_SCOPE,
+        col("scope_key").isin(totals['scope_key'].unique().tolist()),
+        col("period").isin(PERIODS)
+    )
+    current_groups = read_table(
+        spark, "pci_rollup", ROLLUP_COLUMNS,
+        col("scope").isin([DISTRICT_SCOPE, ALL_SCOPE]),
+        col("scope_key").isin(group_keys(totals)),
+        col("period").isin(PERIODS)
+    )
+
+    roads, deltas = merge_road_rollups(current_roads, totals, key, updated_at)
+    groups = merge_group_rollups(current_groups, deltas, key, updated_at)
+
+    # district / all rows first: if the batch fails in between and is retried, their
+    # last_batch_key skips them while the road rows that weren't written are added again
+    if not groups.empty:
+        save_table(spark, groups, "pci_rollup", pci_rollup_schema)
+    if not roads.empty:
+        save_table(spark, roads, "pci_rollup", pci_rollup_schema)
+
+def update_pci_tables(spark, cracks_df, query_id, batch_id, roads_path):
+    # adds a micro-batch of cracks to road_pci and pci_rollup
+    # (query_id and batch_id identify the batch across the runs of the stream)
+    totals = day_totals(cracks_df, roads_path)
+    if totals.empty:
+        return
+
+    updated_at = datetime.now(timezone.utc).replace(tzinfo=None)
+
+    key = batch_key(query_id, batch_id)
+
+    update_road_pci(spark, totals, key, updated_at)
+    update_pci_rollups(spark, totals, key, updated_at)
+
+def rebuild_pci_tables(spark, roads_path):
+    # recomputes road_pci and pci_rollup from all the cracks (both are truncated first)
+    cracks_df = spark.read\
+        .format("org.apache.spark.sql.cassandra")\
+        .options(table="crack_by_dist", keyspace=KEYSPACE)\
+        .load()
+
+    totals = day_totals(cracks_df, roads_path)
+    updated_at = datetime.now(timezone.utc).replace(tzinfo=None)
+
+    road_pci = pd.DataFrame(columns=ROAD_PCI_COLUMNS)
+    rollups = pd.DataFrame(columns=ROLLUP_COLUMNS)
+
+    if not totals.empty:
+        road_pci = merge_road_pci(road_pci, road_totals(totals), batch_key("backfill", -1), updated_at)
+
+        roads, deltas = merge_road_rollups(rollups, road_rollup_totals(totals), batch_key("backfill", -1), updated_at)
+        groups = merge_group_rollups(rollups, deltas, batch_key("backfill", -1), updated_at)
+        rollups = pd.concat([groups, roads], ignore_index=True)
+
+    save_table(spark, road_pci, "road_pci", road_pci_schema, mode="overwrite", **{"confirm.truncate": "true"})
+    save_table(spark, rollups, "pci_rollup", pci_rollup_schema, mode="overwrite", **{"confirm.truncate": "true"})
+
+    return len(road_pci), len(rollups)
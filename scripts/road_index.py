@@ -0,0 +1,144 @@
+# Prebuilt road network artifact
+# Compiles the OSM roads GeoJSON once into a GeoParquet file (WKB geometries +
+# only the attribute columns we use) that every spark worker and dashboard
+# process can memory-map instead of parsing the GeoJSON on every start.
+#
+# Build it once (from scripts/):
+#   python road_index.py
+
+import os
+import sys
+import time
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+import geopandas as gpd
+
+ROADS_GEOJSON = '../data/egypt/geo.geojson'
+ROADS_ARTIFACT = '../data/egypt/roads.parquet'
+
+# attribute columns used by the stream (ADM2_EN) and the dashboard pages
+ROAD_COLUMNS = ['name', 'fclass', 'maxspeed', 'oneway', 'bridge', 'tunnel', 'ADM2_EN']
+
+# low cardinality attributes kept as categories in the attribute store
+CATEGORY_COLUMNS = ['fclass', 'oneway', 'bridge', 'tunnel', 'ADM2_EN']
+
+def build_road_index(src=ROADS_GEOJSON, dst=ROADS_ARTIFACT):
+    roads_df = gpd.read_file(src).to_crs(epsg=4326)
+
+    # road_index is the row position in the GeoJSON (what is stored in cassandra)
+    roads_df = roads_df.reset_index(drop=True)
+    roads_df['road_index'] = roads_df.index.astype('int32')
+
+    # length in meters (web mercator like the dashboard PCI), so it can be read without the geometries
+    roads_df['length_m'] = roads_df.to_crs(epsg=3857).geometry.length
+
+    roads_df = roads_df[['road_index'] + ROAD_COLUMNS + ['length_m', 'geometry']]
+
+    # geometries are stored as WKB, rows stay ordered by road_index
+    roads_df.to_parquet(dst, index=False, compression='zstd')
+
+    return roads_df
+
+@lru_cache(maxsize=None)
+def load_roads(path=ROADS_ARTIFACT):
+    """
+    Loads the road network once per process (cached).
+
+    The spatial index (STR-tree) is bulk loaded from the decoded WKB geometries
+    on the first nearest query, which takes milliseconds instead of the seconds
+    spent parsing and reprojecting the GeoJSON.
+
+    Returns:
+    - GeoDataFrame: roads in EPSG:4326 indexed by road_index
+    """
+    if not os.path.exists(path):
+        print(f"Road artifact not found at {path}, reading {ROADS_GEOJSON} (run road_index.py to build it)")
+        roads_df = gpd.read_file(ROADS_GEOJSON).to_crs(epsg=4326)
+        roads_df = roads_df.drop(['index'], axis=1, errors='ignore')
+        roads_df['road_index'] = roads_df.index
+        return roads_df
+
+    roads_df = gpd.read_parquet(path, memory_map=True)
+
+    return roads_df.set_index('road_index', drop=False).rename_axis(None)
+
+class RoadAttributes:
+    """
+    Road attributes (no geometries) as columns whose position is the road_index,
+    joined to cracks by an array lookup instead of a DataFrame merge.
+    """
+    def __init__(self, roads_df):
+        # dense by position, low cardinality attributes as categories
+        roads_df = roads_df\
+            .drop(columns=['geometry'], errors='ignore')\
+            .set_index('road_index', drop=False)\
+            .sort_index()
+        roads_df = roads_df.reindex(np.arange(roads_df.index.max() + 1 if len(roads_df) else 0))
+
+        for name in CATEGORY_COLUMNS:
+            if name in roads_df.columns:
+                roads_df[name] = roads_df[name].astype('category')
+
+        self.frame = roads_df.reset_index(drop=True)
+        self.columns = list(self.frame.columns)
+
+    def column(self, name):
+        # whole column indexed by road_index
+        return self.frame[name]
+
+    def take(self, road_index, columns):
+        """
+        Attributes of the roads of every row.
+
+        Parameters:
+        - road_index (array-like): road_index of each row (-1 when the crack has no road)
+        - columns (list): attributes to return
+
+        Returns:
+        - DataFrame: one row per road_index (NaN attributes for unknown roads)
+        """
+        road_index = np.asarray(road_index, dtype='int64')
+        valid = (road_index >= 0) & (road_index < len(self.frame))
+
+        attributes = self.frame[list(columns)]\
+            .take(np.where(valid, road_index, 0))\
+            .reset_index(drop=True)
+
+        if not valid.all():
+            attributes = attributes.where(np.broadcast_to(valid[:, None], attributes.shape))
+
+        return attributes
+
+@lru_cache(maxsize=None)
+def load_road_attributes(path=ROADS_ARTIFACT):
+    # attribute columns only (cached), the geometries are not read
+    if not os.path.exists(path):
+        return RoadAttributes(load_roads(path))
+
+    columns = [name for name in pq.read_schema(path).names if name != 'geometry']
+    return RoadAttributes(pd.read_parquet(path, columns=columns))
+
+@lru_cache(maxsize=None)
+def road_lengths(path=ROADS_ARTIFACT):
+    # length in meters of every road, indexed by road_index (web mercator like the dashboard PCI)
+    attributes = load_road_attributes(path)
+
+    # stored in the artifact (built before length_m otherwise)
+    if 'length_m' in attributes.columns:
+        return attributes.column('length_m')
+
+    return load_roads(path).to_crs(epsg=3857).geometry.length
+
+if __name__ == '__main__':
+    src = sys.argv[1] if len(sys.argv) > 1 else ROADS_GEOJSON
+    dst = sys.argv[2] if len(sys.argv) > 2 else ROADS_ARTIFACT
+
+    start = time.perf_counter()
+    roads_df = build_road_index(src, dst)
+    print(f"Built {dst} with {len(roads_df)} roads in {time.perf_counter() - start:.1f}s")
+
+    start = time.perf_counter()
+    load_roads(dst).sindex.query(roads_df.geometry.iloc[0])
+    print(f"Load + index build time: {time.perf_counter() - start:.3f}s")
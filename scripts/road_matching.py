@@ -0,0 +1,45 @@
+# Nearest road matching for crack locations
+# Used by the spark stream (inside a pandas UDF) and by the benchmark script
+
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+
+# value used when no road is found (same as the old per-row UDFs)
+NO_ROAD_INDEX = -1
+NO_DIST = "Unkown"
+
+def match_roads(roads_df, lon, lat, max_distance=20):
+    """
+    Returns the nearest road index and district for every (lon, lat) pair.
+
+    Parameters:
+    - roads_df (GeoDataFrame): roads network in EPSG:4326 with an 'ADM2_EN' column
+    - lon (array-like): longitudes of the cracks
+    - lat (array-like): latitudes of the cracks
+    - max_distance (float): max distance (in CRS units) to search for a road
+
+    Returns:
+    - DataFrame: one row per input point with 'road_index' and 'dist' columns
+    """
+    lon = np.asarray(lon, dtype='float64')
+    lat = np.asarray(lat, dtype='float64')
+
+    road_index = np.full(len(lon), NO_ROAD_INDEX, dtype='int32')
+    dist = np.full(len(lon), NO_DIST, dtype=object)
+
+    if len(lon) > 0:
+        points = gpd.points_from_xy(lon, lat, crs="EPSG:4326")
+
+        # One query against the spatial index (built once and cached on roads_df)
+        # for the whole batch instead of one sjoin_nearest per row
+        point_pos, road_pos = roads_df.sindex.nearest(
+            points,
+            return_all=False,
+            max_distance=max_distance
+        )
+
+        road_index[point_pos] = roads_df.index.to_numpy()[road_pos]
+        dist[point_pos] = roads_df['ADM2_EN'].to_numpy()[road_pos]
+
+    return pd.DataFrame({'road_index': road_index, 'dist': dist})
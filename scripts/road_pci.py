@@ -0,0 +1,95 @@
+# Materialized PCI per road
+# The PCI of a road only depends on the number of deduct values of its cracks
+# and their sum (TDV), so the stream keeps running totals per road in the
+# road_pci table and recomputes the PCI from them on every micro-batch,
+# without reading the crack table again.
+#
+# Used by spark.py on the driver (the per-road totals of a batch are small).
+#
+# A batch retried after a failure isn't added twice: every row keeps the key of the
+# last batch added to it, "<query id>:<batch id>". The batch ids restart at 0 when the
+# checkpoint is deleted (run.ps1 does before every start) but the query id changes too.
+
+import pandas as pd
+from pci import pci_from_totals, pci_condition
+
+# columns of the road_pci table
+ROAD_PCI_COLUMNS = [
+    'road_index', 'crack_count', 'dv_sum', 'crack_area', 'crack_counts',
+    'pci', 'condition', 'last_batch_key', 'last_updated'
+]
+
+def batch_key(query_id, batch_id):
+    # unique key of a micro-batch across the runs of the stream
+    return f"{query_id}:{batch_id}"
+
+def road_totals(label_totals):
+    """
+    Totals of each road from the totals of each (road, crack type).
+
+    Parameters:
+    - label_totals (DataFrame): rows with 'road_index', 'label', 'cracks', 'area' (m²) and 'dv_sum'
+      (more than one row per road and label when they are also split by day)
+
+    Returns:
+    - DataFrame: one row per road with 'road_index', 'crack_count', 'dv_sum',
+      'crack_area' (label -> m²) and 'crack_counts' (label -> cracks)
+    """
+    label_totals = label_totals\
+        .groupby(['road_index', 'label'], as_index=False)[['cracks', 'area', 'dv_sum']]\
+        .sum()
+
+    grouped = label_totals.groupby('road_index')
+
+    totals = grouped.agg(crack_count=('cracks', 'sum'), dv_sum=('dv_sum', 'sum')).reset_index()
+
+    # plain python values, the maps are written as cassandra map columns
+    areas = {road: dict(zip(g['label'].tolist(), g['area'].tolist())) for road, g in grouped}
+    counts = {road: dict(zip(g['label'].tolist(), g['cracks'].tolist())) for road, g in grouped}
+
+    totals['crack_area'] = totals['road_index'].map(areas)
+    totals['crack_counts'] = totals['road_index'].map(counts)
+
+    return totals
+
+def add_maps(a, b):
+    # label -> value maps added key by key (missing maps are empty)
+    merged = dict(a) if isinstance(a, dict) else {}
+    for label, value in (b if isinstance(b, dict) else {}).items():
+        merged[label] = merged.get(label, 0) + value
+    return merged
+
+def merge_road_pci(current, totals, key, updated_at):
+    """
+    Adds the totals of a batch to the stored rows of the same roads and recomputes their PCI.
+
+    Parameters:
+    - current (DataFrame): road_pci rows of the roads in totals (ROAD_PCI_COLUMNS, may be empty)
+    - totals (DataFrame): totals of the batch (output of road_totals)
+    - key (str): key of the micro-batch (batch_key), a batch replayed after a failure isn't added twice
+    - updated_at (datetime): last_updated of the changed roads
+
+    Returns:
+    - DataFrame: new road_pci rows (ROAD_PCI_COLUMNS) of the changed roads
+    """
+    previous = current.set_index('road_index').reindex(totals['road_index'])
+
+    # roads that already have this batch (written before the batch was retried)
+    applied = (previous['last_batch_key'] == key).to_numpy()
+    totals = totals[~applied].reset_index(drop=True)
+    previous = previous[~applied]
+
+    road_pci = pd.DataFrame({
+        'road_index': totals['road_index'].astype('int32'),
+        'crack_count': (totals['crack_count'] + previous['crack_count'].fillna(0).to_numpy()).astype('int32'),
+        'dv_sum': totals['dv_sum'] + previous['dv_sum'].fillna(0).to_numpy(),
+        'crack_area': [add_maps(a, b) for a, b in zip(previous['crack_area'], totals['crack_area'])],
+        'crack_counts': [add_maps(a, b) for a, b in zip(previous['crack_counts'], totals['crack_counts'])],
+    })
+
+    road_pci['pci'] = pci_from_totals(road_pci['crack_count'], road_pci['dv_sum'])
+    road_pci['condition'] = pci_condition(road_pci['pci'])
+    road_pci['last_batch_key'] = key
+    road_pci['last_updated'] = updated_at
+
+    return road_pci[ROAD_PCI_COLUMNS]
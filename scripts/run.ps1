@@ -10,6 +10,14 @@ Write-Host "Starting containers..." -ForegroundColor Green
 # go to PavementEye root directory
 cd ../
 
+# build the road network artifact once (used by spark and streamlit)
+if (-not (Test-Path "data/egypt/roads.parquet")) {
+  Write-Host "Building road network artifact..." -ForegroundColor Yellow
+  Push-Location scripts
+  python road_index.py
+  Pop-Location
+}
+
 # run all containers
 docker-compose up -d
 
@@ -24,7 +32,7 @@ docker exec pyspark-notebook bash -c "rm -rf /tmp/checkpoint*"
 Write-Host "Starting Spark Streaming in new window..." -ForegroundColor Green
 Start-Process powershell -ArgumentList @"
 cd $PWD
-docker exec pyspark-notebook spark-submit --packages org.apache.spark:spark-sql-kafka-0-10_2.12:3.5.0,com.datastax.spark:spark-cassandra-connector_2.12:3.5.0 /home/jovyan/scripts/spark.py
+docker exec pyspark-notebook spark-submit --packages org.apache.spark:spark-sql-kafka-0-10_2.12:3.5.0,org.apache.spark:spark-avro_2.12:3.5.0,com.datastax.spark:spark-cassandra-connector_2.12:3.5.0 /home/jovyan/scripts/spark.py
 "@
 
 Start-Sleep -Seconds 1
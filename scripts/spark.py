@@ -2,17 +2,30 @@ from pyspark.sql import SparkSession
 from pyspark.sql.functions import *
 from pyspark.sql.types import *
 from pyspark.sql import functions as F
-import geopandas as gpd
+from pyspark.sql.avro.functions import from_avro
+import pandas as pd
+import os
+import sys
+from road_index import ROADS_ARTIFACT
+
+# the PCI functions are shared with the dashboard (streamlit/)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'streamlit'))
+from pci_sink import QueryId, ship_pci_modules, update_pci_tables
+from crack_store import write_cracks as write_cracks_tables, write_progress
 
 spark = SparkSession.builder \
     .appName("PavementEye Stream") \
     .config("spark.cassandra.connection.host", "cassandra")\
     .config("spark.cassandra.connection.port", "9042")\
+    .config("spark.sql.session.timeZone", "UTC")\
     .getOrCreate()
 
 # kafka parameters
 kafka_bootstrap_servers = 'kafka:9092'  # kafka:9092 as we are inside the docker network
-kafka_topic = 'test' # Can be changed later
+kafka_topic = os.getenv("KAFKA_TOPIC", "test") # Can be changed later
+
+# must match the backend KAFKA_VALUE_FORMAT: "json" or "avro" (schema in crack.avsc)
+kafka_value_format = os.getenv("KAFKA_VALUE_FORMAT", "json")
 
 
 # read data from Kafka
@@ -23,8 +36,6 @@ kafka_stream_df = spark.readStream \
     .load()
 
 
-# To be able to see the right parsed value of the message
-parse_kafka_stream = kafka_stream_df.selectExpr('CAST(value as STRING) as json_value')
 
 # Define schema for the incoming JSON messages
 schema = StructType([
@@ -45,8 +56,18 @@ schema = StructType([
     ))
 ])
 
-#Parse JSON string into a structured DataFrame
-json_df = parse_kafka_stream.select(from_json(col("json_value"), schema).alias("data"))
+if kafka_value_format == "avro":
+    # compact binary messages, decoded natively by spark with the shared schema
+    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'crack.avsc')) as f:
+        avro_schema = f.read()
+
+    json_df = kafka_stream_df.select(from_avro(col("value"), avro_schema).alias("data"))
+else:
+    # To be able to see the right parsed value of the message
+    parse_kafka_stream = kafka_stream_df.selectExpr('CAST(value as STRING) as json_value')
+
+    #Parse JSON string into a structured DataFrame
+    json_df = parse_kafka_stream.select(from_json(col("json_value"), schema).alias("data"))
 
 #Explode the labels array so each detected object becomes one row
 exploded_df = json_df.select(
@@ -76,13 +97,8 @@ df_no_nulls = exploded_df.na.drop()
 # Convert 'time' column from string to timestamp
 df_no_nulls = df_no_nulls.withColumn("timestamp", F.col("timestamp").cast(TimestampType()))
 
-# Now deduplicate only on the last 1 minutes
-cleaned_df = df_no_nulls 
-#     .withWatermark("timestamp", "1 minutes") \
-#     .dropDuplicates(["label", "x1", "y1", "x2", "y2", "lon", "lat"])
-
 #Verify the correctness of the coordinates
-df_valid_coords = cleaned_df.filter(
+df_valid_coords = df_no_nulls.filter(
     (col("x1") < col("x2")) &
     (col("y1") < col("y2")) &
     (col("lon") >= -180) & (col("lon") <= 180) &  # التأكد من حدود longitude
@@ -92,71 +108,210 @@ df_valid_coords = cleaned_df.filter(
 # inster the id (identifier for the crack)
 df_valid_coords = df_valid_coords.withColumn("id", expr("uuid()"))
 
-# load roads dataset
-roads_df = gpd.read_file('../data/egypt/geo.geojson').to_crs(epsg=4326)
-roads_df = roads_df.drop(['index'], axis=1)
-roads_broadcast = spark.sparkContext.broadcast(roads_df)
+# Deduplication ---------------------------------------------------------------------------
+# The same crack is seen in many consecutive frames, detections with the same label closer
+# than DEDUP_DISTANCE_M and seen within DEDUP_WINDOW_S of each other become one crack
+# (first sighting, max confidence, number of sightings).
+# State is partitioned by label + grid cell (cracks on both sides of a cell edge are not merged).
+dedup_distance_m = float(os.getenv("DEDUP_DISTANCE_M", 5))
+dedup_window_s = float(os.getenv("DEDUP_WINDOW_S", 60))
+dedup_cell_deg = float(os.getenv("DEDUP_CELL_DEG", 0.001)) # ~110 m
+
+spark.sparkContext.addPyFile(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'dedup.py'))
+
+deduped_schema = StructType([
+    StructField("id", StringType()),
+    StructField("lon", DoubleType()),
+    StructField("lat", DoubleType()),
+    StructField("image", StringType()),
+    StructField("ppm", DoubleType()),
+    StructField("label", StringType()),
+    StructField("confidence", DoubleType()),
+    StructField("x1", DoubleType()),
+    StructField("x2", DoubleType()),
+    StructField("y1", DoubleType()),
+    StructField("y2", DoubleType()),
+    StructField("timestamp", TimestampType()),
+    StructField("sightings", IntegerType())
+])
+
+# open clusters of the group as json
+dedup_state_schema = StructType([StructField("clusters", StringType())])
+
+def dedup_cracks(key, pdf_iter, state):
+    # Import inside the function for execution on workers
+    from dedup import merge_detections, pop_closed, clusters_to_frame, dumps, loads
+
+    clusters = loads(state.get[0]) if state.exists else []
+    watermark_s = state.getCurrentWatermarkMs() / 1000
 
-def join_roads(lon, lat):
-    # Import necessary libraries inside the UDF for execution on workers
-    import geopandas as gpd
-    from shapely.geometry import Point
-    
-    # Access the broadcasted roads data
-    roads_df_local = roads_broadcast.value
+    if not state.hasTimedOut:
+        for pdf in pdf_iter:
+            pdf = pdf.assign(timestamp=pdf['timestamp'].astype('int64') / 1e9)
+            clusters = merge_detections(clusters, pdf, dedup_distance_m, dedup_window_s)
 
-    location = Point(lon, lat)
-    stream_geo_df = gpd.GeoDataFrame(geometry=[location], crs="EPSG:4326")
+    # emit the cracks that can't get more sightings
+    closed, clusters = pop_closed(clusters, watermark_s, dedup_window_s)
 
-    # Perform the nearest-neighbor spatial join
-    joined_data = gpd.sjoin_nearest(stream_geo_df, roads_df_local, how='inner', max_distance=20)
+    if clusters:
+        state.update((dumps(clusters),))
 
-    if not joined_data.empty:
-        # Return the index of the nearest road (scalar)
-        return int(joined_data.iloc[0]['index_right'])
+        # wake up when the oldest open cluster can be closed
+        oldest = min(c['last_seen'] for c in clusters) + dedup_window_s
+        state.setTimeoutTimestamp(int(max(oldest, watermark_s + 1) * 1000))
     else:
-        # Return a default value when no match is found
-        return -1
+        state.remove()
+
+    if closed:
+        yield clusters_to_frame(closed)
+
+df_deduped = df_valid_coords\
+    .withWatermark("timestamp", f"{int(dedup_window_s)} seconds")\
+    .withColumn("cell", concat_ws(":",
+        F.floor(col("lon") / dedup_cell_deg).cast("long"),
+        F.floor(col("lat") / dedup_cell_deg).cast("long")
+    ))\
+    .groupBy("label", "cell")\
+    .applyInPandasWithState(
+        dedup_cracks,
+        outputStructType=deduped_schema,
+        stateStructType=dedup_state_schema,
+        outputMode="append",
+        timeoutConf="EventTimeTimeout"
+    )
+
+# road network artifact (built once by road_index.py), each worker memory-maps
+# it instead of receiving the whole GeoDataFrame as a pickled broadcast
+roads_path = os.path.abspath(ROADS_ARTIFACT)
+
+# ship the road modules to the workers
+scripts_dir = os.path.dirname(os.path.abspath(__file__))
+spark.sparkContext.addPyFile(os.path.join(scripts_dir, 'road_index.py'))
+spark.sparkContext.addPyFile(os.path.join(scripts_dir, 'road_matching.py'))
+
+road_schema = StructType([
+    StructField("road_index", IntegerType()),
+    StructField("dist", StringType())
+])
 
-join_roads = udf(join_roads, IntegerType())
+# Nearest road + district for a whole arrow batch of cracks at once
+# (one spatial index query per batch instead of two sjoin_nearest per row)
+@pandas_udf(road_schema)
+def match_roads_udf(lon: pd.Series, lat: pd.Series) -> pd.DataFrame:
+    # Import inside the UDF for execution on workers
+    from road_index import load_roads
+    from road_matching import match_roads
 
+    # cached per python worker, loaded on the first batch only
+    return match_roads(load_roads(roads_path), lon, lat, max_distance=20)
 
-def get_dist(lon, lat):
-    # Import necessary libraries inside the UDF for execution on workers
-    import geopandas as gpd
-    from shapely.geometry import Point
-    
-    # Access the broadcasted roads data
-    roads_df_local = roads_broadcast.value
+# stops the optimizer from inlining the udf once per extracted field
+match_roads_udf = match_roads_udf.asNondeterministic()
 
-    location = Point(lon, lat)
-    stream_geo_df = gpd.GeoDataFrame(geometry=[location], crs="EPSG:4326")
 
-    # Perform the nearest-neighbor spatial join
-    joined_data = gpd.sjoin_nearest(stream_geo_df, roads_df_local, how='inner', max_distance=20)
+df_with_roads = df_deduped\
+    .withColumn("road", match_roads_udf(col("lon"), col("lat")))\
+    .withColumn("road_index", col("road.road_index"))\
+    .withColumn("dist", col("road.dist"))\
+    .drop("road")
 
-    if not joined_data.empty:
-        # Return the index of the nearest road (scalar)
-        return joined_data.iloc[0]['ADM2_EN']
-    else:
-        # Return a default value when no match is found
-        return "Unkown"
+# Road coverage ---------------------------------------------------------------------------
+# Frames without cracks arrive as light heartbeats on the coverage topic (EMPTY_FRAME_POLICY
+# in the backend), together with the frames that have cracks they are counted per road segment
+# and time window to know which roads were surveyed.
+coverage_topic = os.getenv("KAFKA_COVERAGE_TOPIC", "coverage")
+coverage_window = os.getenv("COVERAGE_WINDOW", "10 minutes")
 
-get_dist = udf(get_dist, StringType())
+coverage_schema = StructType([
+    StructField("lon", DoubleType()),
+    StructField("lat", DoubleType()),
+    StructField("time", StringType())
+])
 
+heartbeats_df = spark.readStream \
+    .format("kafka") \
+    .option("kafka.bootstrap.servers", kafka_bootstrap_servers) \
+    .option("subscribe", coverage_topic) \
+    .load()\
+    .select(from_json(col("value").cast("string"), coverage_schema).alias("data"))\
+    .select(col("data.lon"), col("data.lat"), col("data.time"), lit(0).alias("cracks"))
 
-df_with_roads = df_valid_coords\
-    .withColumn("road_index", join_roads(col("lon"), col("lat")))\
-    .withColumn("dist", get_dist(col("lon"), col("lat")))
+crack_frames_df = json_df.select(
+    col("data.lon"),
+    col("data.lat"),
+    col("data.time"),
+    size(col("data.labels")).alias("cracks")
+)
 
-# To insert the stream into cassandra database
-df_with_roads.writeStream\
+coverage_df = heartbeats_df.unionByName(crack_frames_df)\
+    .na.drop()\
+    .withColumn("timestamp", col("time").cast(TimestampType()))\
+    .withWatermark("timestamp", coverage_window)\
+    .withColumn("road", match_roads_udf(col("lon"), col("lat")))\
+    .withColumn("road_index", col("road.road_index"))\
+    .groupBy(col("road_index"), window(col("timestamp"), coverage_window))\
+    .agg(
+        F.count("*").alias("frames"),
+        F.sum(F.when(col("cracks") > 0, 1).otherwise(0)).alias("crack_frames"),
+        F.max("timestamp").alias("last_seen")
+    )\
+    .select(
+        col("road_index"),
+        col("window.start").alias("window_start"),
+        col("window.end").alias("window_end"),
+        col("frames"),
+        col("crack_frames"),
+        col("last_seen")
+    )
+
+def write_coverage(batch_df, batch_id):
+    # update mode: each batch has the full counts of the changed windows (upsert)
+    batch_df.write\
+        .format("org.apache.spark.sql.cassandra")\
+        .options(table="road_coverage", keyspace="pavementeye")\
+        .mode("append")\
+        .save()
+
+# Materialized PCI per road and PCI history -----------------------------------------------
+# Every micro-batch of cracks adds its totals (cracks, deduct values, crack area per label)
+# to the road_pci table (current PCI per road) and to the pci_rollup table (daily / monthly
+# PCI per road, district and all roads), so the dashboard reads a few precomputed rows
+# instead of recomputing the PCI from the whole crack table (see pci_sink.py).
+# Cracks stored before these tables existed are added by the backfill job (backfill_pci.py).
+ship_pci_modules(spark)
+
+# the batch ids restart at 0 with a new checkpoint, the PCI tables key the batches by query id too
+cracks_query_id = QueryId()
+
+def write_cracks(batch_df, batch_id):
+    batch_df.persist()
+
+    # one table per dashboard access pattern (see crack_store.py)
+    write_cracks_tables(batch_df)
+
+    update_pci_tables(spark, batch_df, cracks_query_id.get(), batch_id, roads_path)
+
+    # the dashboard drops its cached results
+    write_progress(spark, "cracks", batch_id)
+
+    batch_df.unpersist()
+
+# To insert the stream into cassandra database (cracks + PCI tables)
+cracks_query = df_with_roads.writeStream\
     .outputMode("append")\
-    .format("org.apache.spark.sql.cassandra")\
-    .options(table="crack", keyspace="pavementeye")\
-    .option('checkpointLocation', '/tmp/checkpoint40')\
-    .start()\
-    .awaitTermination()
+    .foreachBatch(write_cracks)\
+    .option('checkpointLocation', '/tmp/checkpoint_cracks')\
+    .start()
+
+cracks_query_id.set(cracks_query)
+
+coverage_df.writeStream\
+    .outputMode("update")\
+    .foreachBatch(write_coverage)\
+    .option('checkpointLocation', '/tmp/checkpoint_coverage')\
+    .start()
+
+spark.streams.awaitAnyTermination()
 
 
 # This is for testing (printing in the notebook)
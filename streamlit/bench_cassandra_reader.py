@@ -0,0 +1,63 @@
+# Benchmark: building the DataFrame of a cassandra read (no cluster needed)
+# old: named tuple rows -> one dict per row (row._asdict()) -> DataFrame
+# new: columnar_factory pages (column tuples) -> to_frame with typed columns
+# The pages have the size of the default fetch size (5000 rows).
+#
+# Usage (from streamlit/): python bench_cassandra_reader.py [n_rows]
+
+import sys
+import time
+from collections import namedtuple
+import numpy as np
+import pandas as pd
+from cassandra_reader import columnar_factory, to_frame
+
+COLUMNS = ['lon', 'lat', 'confidence', 'label', 'dist', 'road_index']
+
+def make_rows(n_rows):
+  rng = np.random.default_rng(0)
+  labels = np.array(['Alligator Crack', 'Longitudinal Crack', 'Transverse Crack', 'Pothole', 'Rutting'])
+  dists = np.array([f'District {i}' for i in range(40)])
+
+  return list(zip(
+    (29 + rng.random(n_rows)).tolist(),
+    (31 + rng.random(n_rows)).tolist(),
+    rng.random(n_rows).tolist(),
+    rng.choice(labels, n_rows).tolist(),
+    rng.choice(dists, n_rows).tolist(),
+    rng.integers(0, 200000, n_rows).tolist()
+  ))
+
+if __name__ == '__main__':
+  n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+  fetch_size = 5000
+
+  rows = make_rows(n_rows)
+  pages = [rows[i:i + fetch_size] for i in range(0, n_rows, fetch_size)]
+
+  # old: the driver named_tuple_factory + one dict per row
+  Row = namedtuple('Row', COLUMNS)
+  start = time.perf_counter()
+  data = []
+  for page in pages:
+    for row in [Row(*values) for values in page]:
+      data.append(dict(row._asdict()))
+  old_df = pd.DataFrame(data)
+  old_s = time.perf_counter() - start
+
+  # new: columnar pages
+  start = time.perf_counter()
+  new_pages = [columnar_factory(COLUMNS, page)[1] for page in pages]
+  new_df = to_frame(COLUMNS, new_pages)
+  new_s = time.perf_counter() - start
+
+  assert (old_df['road_index'].to_numpy() == new_df['road_index'].to_numpy()).all()
+  assert (old_df['label'].to_numpy() == new_df['label'].astype(str).to_numpy()).all()
+
+  old_mb = old_df.memory_usage(deep=True).sum() / 2 ** 20
+  new_mb = new_df.memory_usage(deep=True).sum() / 2 ** 20
+
+  print(f"{n_rows} rows in {len(pages)} pages")
+  print(f"dict rows : {old_s:7.2f} s, {old_mb:7.1f} MB")
+  print(f"columnar  : {new_s:7.2f} s, {new_mb:7.1f} MB")
+  print(f"speedup   : {old_s / new_s:7.1f}x")
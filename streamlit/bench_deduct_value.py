@@ -0,0 +1,32 @@
+# Benchmark: per-row deduct values (df.apply, as calc_pci did) vs vectorized get_deduct_values
+# Usage (from streamlit/): python bench_deduct_value.py [n_rows]
+
+import sys
+import time
+import numpy as np
+import pandas as pd
+from deduct_value_func import get_deduct_value, get_deduct_values, CRACK_TYPES
+
+if __name__ == '__main__':
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({
+        'label': rng.choice(CRACK_TYPES, n_rows),
+        'dd': rng.uniform(0, 100, n_rows)
+    })
+
+    # the row by row path is too slow for 1M rows, it is timed on a sample
+    sample = df.head(min(n_rows, 100_000))
+    start = time.perf_counter()
+    old = sample.apply(lambda row: get_deduct_value(row['label'], row['dd']), axis=1)
+    old_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    new = get_deduct_values(df['label'], df['dd'])
+    new_time = time.perf_counter() - start
+
+    print(f"rows        : {n_rows:,}")
+    print(f"df.apply    : {len(sample) / old_time:14,.0f} rows/sec ({old_time / len(sample) * n_rows:.1f}s for all rows)")
+    print(f"vectorized  : {n_rows / new_time:14,.0f} rows/sec ({new_time:.3f}s)")
+    print(f"same result : {bool((old.to_numpy() == new[:len(sample)]).all())}")
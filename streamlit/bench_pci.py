@@ -0,0 +1,63 @@
+# Benchmark: per-road python loop (old Cassandra.calc_pci) vs column-wise compute_pci
+# Usage (from streamlit/): python bench_pci.py [n_cracks] [n_roads] [hot_road_share]
+# hot_road_share: share of the cracks on a single road (skewed data, e.g. 0.66)
+
+import sys
+import time
+import numpy as np
+import pandas as pd
+from pci import compute_pci, pci_condition
+
+# Same grouping loop as the old Cassandra.calc_pci
+def loop_pci(df):
+    df = df.sort_values(by=['road_index', 'dv'], ascending=[True, False])
+
+    pci_list = []
+    for road_index, group in df.groupby('road_index'):
+        deduct_values = group['dv'].tolist()
+
+        if not deduct_values:
+            pci = 100.0
+        elif len(deduct_values) == 1:
+            pci = 100 - deduct_values[0]
+        else:
+            tdv = sum(deduct_values)
+            if tdv <= 100:
+                cdv = tdv - (tdv**2 / 250)
+            else:
+                cdv = 100 - 10 * np.sqrt(tdv - 100)
+            pci = max(0, 100 - cdv)
+
+        pci_list.append({'road_index': road_index, 'pci': round(pci, 2)})
+
+    pci_df = pd.DataFrame(pci_list)
+    pci_df['condition'] = pci_condition(pci_df['pci'])
+    return pci_df
+
+if __name__ == '__main__':
+    n_cracks = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    n_roads = int(sys.argv[2]) if len(sys.argv) > 2 else 200_000
+    hot_road_share = float(sys.argv[3]) if len(sys.argv) > 3 else 0.0
+
+    rng = np.random.default_rng(0)
+    road_index = rng.integers(0, n_roads, n_cracks)
+    road_index[rng.random(n_cracks) < hot_road_share] = 0
+
+    df = pd.DataFrame({
+        'road_index': road_index,
+        'dv': np.round(rng.uniform(0, 90, n_cracks), 2)
+    })
+
+    start = time.perf_counter()
+    old = loop_pci(df)
+    old_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    new = compute_pci(df)
+    new_time = time.perf_counter() - start
+
+    print(f"cracks      : {n_cracks:,} on {old['road_index'].nunique():,} roads")
+    print(f"python loop : {old_time:8.2f}s")
+    print(f"column-wise : {new_time:8.2f}s ({old_time / new_time:.0f}x faster)")
+    print(f"identical   : {old.equals(new)}")
+    assert old.equals(new)
@@ -0,0 +1,173 @@
+# Columnar, paged and asynchronous reads from cassandra
+# Used by db.py: every query is sent with execute_async, its pages are fetched
+# in the background (fetch_size rows each) and kept as column tuples, the
+# DataFrame is built once from the columns at the end (no dict per row).
+
+import threading
+from itertools import chain
+import pandas as pd
+
+# dtypes of the dashboard columns (smaller frames, faster groupby on the categories)
+COLUMN_DTYPES = {
+  'lon': 'float32',
+  'lat': 'float32',
+  'confidence': 'float32',
+  'label': 'category',
+  'dist': 'category',
+}
+
+# end of the parameters (None is a valid parameters value, a query without markers)
+_END = object()
+
+# murmur3 partitioner token ring
+MIN_TOKEN = -2 ** 63
+MAX_TOKEN = 2 ** 63 - 1
+
+def columnar_factory(colnames, rows):
+  # row factory of the driver: one page as (column names, one tuple of values per column)
+  return colnames, list(zip(*rows)) if rows else [() for _ in colnames]
+
+def token_ranges(splits):
+  # splits contiguous (first, last) token ranges covering the whole ring
+  step = (MAX_TOKEN - MIN_TOKEN + 1) // splits
+  starts = [MIN_TOKEN + i * step for i in range(splits)]
+  ends = starts[1:]
+  return [(start, end - 1) for start, end in zip(starts, ends)] + [(starts[-1], MAX_TOKEN)]
+
+def to_frame(colnames, pages, dtypes=COLUMN_DTYPES):
+  """
+  Builds a DataFrame from the pages of a columnar read.
+
+  Parameters:
+  - colnames (list): names of the selected columns
+  - pages (list): pages of the columnar_factory (list of column tuples)
+  - dtypes (dict): dtype of the known columns
+
+  Returns:
+  - DataFrame: one column per selected column
+  """
+  data = {}
+
+  for i, name in enumerate(colnames):
+    values = list(chain.from_iterable(columns[i] for columns in pages))
+    column = pd.Series(values, dtype='object' if not values else None)
+
+    if name in dtypes:
+      column = column.astype(dtypes[name])
+
+    data[name] = column
+
+  return pd.DataFrame(data, columns=colnames)
+
+class PagedReader:
+  # Runs a statement once per parameters tuple, at most `concurrency` queries in flight,
+  # every page of every query is fetched asynchronously (driver callbacks).
+  # Thread safe, the state of each read is kept in its own _PagedRead.
+  def __init__(self, session, concurrency=32, timeout_s=120):
+    self.session = session
+    self.concurrency = concurrency
+    self.timeout_s = timeout_s
+
+  def read(self, statement, params_list):
+    """
+    Parameters:
+    - statement (PreparedStatement or str): query, executed with each parameters tuple
+    - params_list (list): parameters of each query (one query per tuple)
+
+    Returns:
+    - list: column names (None when there was no query)
+    - list: pages of all the queries (list of column tuples)
+
+    Raises:
+    - TimeoutError: the queries didn't finish within timeout_s seconds
+    """
+    return _PagedRead(self.session, statement, params_list).run(self.concurrency, self.timeout_s)
+
+class _PagedRead:
+  def __init__(self, session, statement, params_list):
+    self.session = session
+    self.statement = statement
+    self.params = iter(params_list)
+    self.lock = threading.Lock()
+    self.done = threading.Event()
+    self.in_flight = 0
+    self.pages = []
+    self.colnames = None
+    self.error = None
+
+  def run(self, concurrency, timeout_s=None):
+    for _ in range(concurrency):
+      if not self._start_next():
+        break
+
+    with self.lock:
+      if self.in_flight == 0:
+        self.done.set()
+
+    if not self.done.wait(timeout_s):
+      with self.lock:
+        # no new query is started by the ones still in flight
+        self.error = self.error or TimeoutError(f"cassandra read not finished after {timeout_s}s")
+        raise self.error
+
+    if self.error is not None:
+      raise self.error
+
+    return self.colnames, self.pages
+
+  def _start_next(self):
+    with self.lock:
+      params = next(self.params, _END)
+      if params is _END or self.error is not None:
+        return False
+      self.in_flight += 1
+
+    # an exception in a driver callback is swallowed by the driver, so nothing is raised
+    # from here: the query is counted as finished with its error
+    try:
+      future = self.session.execute_async(self.statement, params)
+      future.add_callbacks(
+        callback=self._on_page, callback_args=(future,),
+        errback=self._on_error, errback_args=(future,)
+      )
+    except Exception as error:
+      self._on_error(error, None)
+      return False
+
+    return True
+
+  def _on_page(self, page, future):
+    try:
+      colnames, columns = page
+
+      with self.lock:
+        self.colnames = colnames
+        self.pages.append(columns)
+
+      if future.has_more_pages:
+        # the same callbacks are called with the next page
+        future.start_fetching_next_page()
+        return
+    except Exception as error:
+      self._on_error(error, future)
+      return
+
+    self._finish()
+
+  def _on_error(self, error, future):
+    with self.lock:
+      if self.error is None:
+        self.error = error
+    self._finish()
+
+  def _finish(self):
+    # one query finished, start the next one or wake up run() after the last one
+    # (the next query is counted before this one, so in_flight only reaches 0 at the end,
+    # even when the next query already finished in another thread)
+    try:
+      self._start_next()
+    finally:
+      with self.lock:
+        self.in_flight -= 1
+        if self.in_flight == 0:
+          self.done.set()
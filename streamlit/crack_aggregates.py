@@ -0,0 +1,52 @@
+# Crack counts of the dashboard charts from the counters maintained by the stream
+# road_pci has the number of cracks of each type on each road (crack_counts map),
+# so a count by road attributes and crack type (fclass, maxspeed, bridge, ...)
+# is a group-by of (roads with cracks x crack types) rows instead of the crack rows:
+# its cost doesn't grow with the crack table.
+#
+# Only the cracks matched to a road are counted (road_pci has no row for road_index -1).
+# Used by db.py (Cassandra.crack_counts).
+
+from itertools import chain
+import numpy as np
+import pandas as pd
+
+def road_label_counts(road_pci):
+  """
+  One row per road and crack type from the crack_counts maps of road_pci.
+
+  Parameters:
+  - road_pci (DataFrame): rows with 'road_index' and 'crack_counts' (label -> cracks)
+
+  Returns:
+  - DataFrame: 'road_index', 'label' and 'count' columns
+  """
+  maps = [crack_counts or {} for crack_counts in road_pci['crack_counts']]
+  sizes = np.fromiter((len(crack_counts) for crack_counts in maps), dtype='int64', count=len(maps))
+
+  return pd.DataFrame({
+    'road_index': np.repeat(road_pci['road_index'].to_numpy(dtype='int64'), sizes),
+    'label': pd.Series(list(chain.from_iterable(maps)), dtype='object').astype('category'),
+    'count': np.fromiter(chain.from_iterable(m.values() for m in maps), dtype='int64', count=int(sizes.sum())),
+  })
+
+def count_by(counts, attributes, by):
+  """
+  Number of cracks of each type by road attributes.
+
+  Parameters:
+  - counts (DataFrame): output of road_label_counts
+  - attributes (RoadAttributes): road attribute store (scripts/road_index.py)
+  - by (list): road attributes (or 'road_index') to group by, before the crack type
+
+  Returns:
+  - DataFrame: by columns, 'label' and 'count' (rows with a missing attribute are dropped)
+  """
+  columns = [name for name in by if name != 'road_index']
+
+  keys = pd.concat([counts, attributes.take(counts['road_index'], columns)], axis=1)
+
+  return keys\
+    .groupby(list(by) + ['label'], observed=True)['count']\
+    .sum()\
+    .reset_index()
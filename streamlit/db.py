@@ -1,52 +1,249 @@
 # This class to init connection with 
 # the running cassandra container
 
-from cassandra.cluster import Cluster
-import geopandas as gpd
+from cassandra.cluster import Cluster, ExecutionProfile, EXEC_PROFILE_DEFAULT
+from functools import lru_cache
 import pandas as pd
-from deduct_value_func import get_deduct_value
-import numpy as np
+import pyarrow as pa
+import pyarrow.dataset as ds
+from pyarrow.fs import LocalFileSystem
+from pci import crack_deduct_values, compute_pci, pci_condition
+from cassandra_reader import PagedReader, COLUMN_DTYPES, columnar_factory, token_ranges, to_frame
+from result_cache import ResultCache
+from crack_aggregates import road_label_counts, count_by
+from road_geometry import zoom_level, road_paths, encode_layer
+import sys
+import os
+
+# shared road network modules live in scripts/
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+from road_index import load_roads, load_road_attributes
+
+# query results shared by all the pages (dropped when the stream writes a new micro-batch)
+result_cache = ResultCache(
+  max_entries=int(os.getenv("DASHBOARD_CACHE_MAX_ENTRIES", 64)),
+  max_mb=float(os.getenv("DASHBOARD_CACHE_MAX_MB", 512)),
+  ttl_s=float(os.getenv("DASHBOARD_CACHE_TTL_S", 300)),
+  check_interval_s=float(os.getenv("DASHBOARD_CACHE_CHECK_S", 5))
+)
+
+# max time of a read (all the pages of all its queries) before it fails
+READ_TIMEOUT_S = float(os.getenv("DASHBOARD_READ_TIMEOUT_S", 120))
+
+# parquet snapshots of the cracks written by scripts/export_snapshots.py
+SNAPSHOT_PATH = os.getenv("DASHBOARD_SNAPSHOT_PATH", "../data/snapshots/cracks")
+
+# day=YYYY-MM-DD/dist=... directories of the snapshot
+snapshot_partitioning = ds.partitioning(pa.schema([('day', pa.date32()), ('dist', pa.string())]), flavor='hive')
+
+class Connection:
+  # one cluster + session per process, thread safe and shared by all the pages and users
+  def __init__(self, host, port, fetch_size, concurrency):
+    print(f"Connecting to cassandra on host = {host}, port = {port} ...")
+
+    # Connect to the cluster (results as column tuples, see cassandra_reader.py)
+    self.cluster = Cluster(
+      [host],
+      port=port,
+      execution_profiles={EXEC_PROFILE_DEFAULT: ExecutionProfile(row_factory=columnar_factory)}
+    )
+
+    # Create a session
+    self.session = self.cluster.connect()
+
+    # rows per page of every query
+    self.session.default_fetch_size = fetch_size
+
+    # use our keyspace database
+    self.session.set_keyspace('pavementeye')
+
+    self.reader = PagedReader(self.session, concurrency, READ_TIMEOUT_S)
+    self.prepared = {}
+
+    print("Cassnadra connected successfully !")
+
+@lru_cache(maxsize=None)
+def connect(host='localhost', port=9042, fetch_size=5000, concurrency=32):
+  return Connection(host, port, fetch_size, concurrency)
 
 class Cassandra:
-  def __init__(self, CASSANDRA_HOST='localhost', CASSANDRA_PORT=9042):
+  def __init__(self, CASSANDRA_HOST='localhost', CASSANDRA_PORT=9042, fetch_size=5000, concurrency=32):
     try:
-      print(f"Connecting to cassandra on host = {CASSANDRA_HOST}, port = {CASSANDRA_PORT} ...")
-
-      # Connect to the cluster
-      self.cluster = Cluster([CASSANDRA_HOST], port=CASSANDRA_PORT)
-
-      # Create a session
-      self.session = self.cluster.connect()
-
-      # use our keyspace database
-      self.session.set_keyspace('pavementeye')
+      # the connection is opened by the first page only
+      connection = connect(CASSANDRA_HOST, CASSANDRA_PORT, fetch_size, concurrency)
 
+      self.cluster = connection.cluster
+      self.session = connection.session
+      self.reader = connection.reader
+      self.prepared = connection.prepared
       self.data = None
-      
-      print("Cassnadra connected successfully !")
     except:
       return "Error in cassandra connection"
 
-  def exec(self, query):
+  def data_version(self):
+    # last micro-batch written by each stream / job, None if unknown (results then only expire with the TTL)
     try:
-      rows = self.session.execute(query)
+      colnames, pages = self.reader.read("SELECT stream, batch_id, updated_at FROM stream_progress", [None])
+      return tuple(sorted(to_frame(colnames, pages).itertuples(index=False, name=None)))
+    except Exception:
+      return None
 
-      # parse data to be as normal python lists and dic
-      data = []
-      for row in rows:
-        row_dict = dict(row._asdict())
-        data.append(row_dict)
+  def read(self, statement, params_list):
+    # runs the statement once per parameters tuple (in parallel), all the rows as one DataFrame
+    query = statement if isinstance(statement, str) else statement.query_string
+    key = (query, tuple(params_list))
 
-      self.data = pd.DataFrame(data)
+    result_cache.check(self.data_version)
 
-      return self.data
+    data = result_cache.get(key)
+    if data is None:
+      colnames, pages = self.reader.read(statement, params_list)
+
+      if colnames is None:
+        colnames = [column.name for column in statement.result_metadata]
+
+      data = to_frame(colnames, pages)
+      result_cache.put(key, data.copy())
+
+    self.data = data
+
+    return self.data
+
+  def exec(self, query, params=None):
+    try:
+      return self.read(query, [params])
     except:
       return "Error in the cassandra query"
     
-  def join_roads(self):
-    roads_df = gpd.read_file('../data/egypt/geo.geojson').to_crs(epsg=4326)
+  def prepare(self, query):
+    # prepared once per connection (shared by the pages)
+    if query not in self.prepared:
+      self.prepared[query] = self.session.prepare(query)
+    return self.prepared[query]
+
+  def query_partitions(self, query, params):
+    """
+    Runs a query once per partition key, the partitions are read in parallel.
+
+    Parameters:
+    - query (str): CQL query with ? markers for the partition key
+    - params (list): one tuple of partition key values per partition
+
+    Returns:
+    - DataFrame: rows of all the partitions
+    """
+    return self.read(self.prepare(query), params)
+
+  def scan(self, table, columns="*", splits=64):
+    """
+    Reads a whole table as `splits` token ranges read in parallel (instead of one
+    coordinator walking the whole ring page by page).
+
+    Parameters:
+    - table (str): table name
+    - columns (str): selected columns
+
+    Returns:
+    - DataFrame: selected columns of all the rows
+    """
+    partition_key = self.cluster.metadata.keyspaces['pavementeye'].tables[table].partition_key
+    token = f"token({', '.join(column.name for column in partition_key)})"
+
+    query = f"SELECT {columns} FROM {table} WHERE {token} >= ? AND {token} <= ?"
+
+    return self.read(self.prepare(query), token_ranges(splits))
+
+  def crack_days(self, start=None, end=None):
+    # (day, dist) partitions of the crack tables, newest first (small table)
+    days = self.scan("crack_days", "day, dist", splits=1)
+    days['day'] = [day.date() for day in days['day']]
+
+    if start is not None:
+      days = days[days['day'] >= start]
+    if end is not None:
+      days = days[days['day'] <= end]
+
+    return days.sort_values('day', ascending=False, ignore_index=True)
+
+  def cracks(self, columns="*", start=None, end=None, dists=None, road_index=None, labels=None, limit=None):
+    """
+    Reads the cracks from the partitions of the table of the access pattern
+    (crack_by_road, crack_by_label or crack_by_dist), in parallel.
+
+    Parameters:
+    - columns (str): selected columns
+    - start, end (date): first and last day (default: all days)
+    - dists (list): only the cracks of these districts
+    - road_index (list): only the cracks of these roads
+    - labels (list): only the cracks of these types
+    - limit (int): max cracks per partition (newest first)
+
+    Returns:
+    - DataFrame: selected columns of the cracks
+    """
+    days = self.crack_days(start, end)
+
+    if road_index is not None:
+      months = sorted({day.replace(day=1) for day in days['day']})
+      table, where = "crack_by_road", "road_index = ? AND month = ?"
+      params = [(int(road), month) for road in road_index for month in months]
+    elif labels is not None:
+      table, where = "crack_by_label", "label = ? AND day = ?"
+      params = [(label, day) for label in labels for day in days['day'].unique()]
+    else:
+      if dists is not None:
+        days = days[days['dist'].isin(dists)]
+      table, where = "crack_by_dist", "dist = ? AND day = ?"
+      params = list(zip(days['dist'], days['day']))
+
+    query = f"SELECT {columns} FROM {table} WHERE {where}" + (f" LIMIT {int(limit)}" if limit else "")
+
+    return self.query_partitions(query, params)
+
+  def latest_cracks(self, n=10, columns="*"):
+    # newest cracks (columns must include timestamp), reading one day (all districts) at a time until there are enough
+    frames = []
+    found = 0
+
+    for day in self.crack_days()['day'].unique():
+      frames.append(self.cracks(columns, start=day, end=day, limit=n))
+      found += len(frames[-1])
+      if found >= n:
+        break
+
+    if not frames:
+      return self.cracks(columns, limit=n)
+
+    self.data = pd.concat(frames, ignore_index=True)\
+      .sort_values('timestamp', ascending=False)\
+      .head(n)\
+      .reset_index(drop=True)
+
+    return self.data
+
+  def join_roads(self, columns=None):
+    """
+    Adds the attributes of the road of every row (road_index column).
+
+    Parameters:
+    - columns (list): road attributes needed (e.g. ['maxspeed', 'oneway']), looked up by
+      road_index without loading the geometries. None merges the whole road network
+      GeoDataFrame (geometry included) for the pages that draw the roads.
+
+    Returns:
+    - DataFrame: rows with the road attributes (GeoDataFrame when columns is None)
+    """
+    if columns is not None:
+      # array-backed attribute store, loaded once per dashboard process
+      attributes = load_road_attributes().take(self.data['road_index'], columns)
+
+      self.data = pd.concat([self.data.reset_index(drop=True), attributes], axis=1)
+
+      return self.data
+
+    # prebuilt artifact, loaded once per dashboard process
+    roads_df = load_roads()
 
-    roads_df['road_index'] = roads_df.index
     joined = roads_df\
       .merge(self.data, how='right', left_on='road_index', right_on='road_index')
 
@@ -57,77 +254,154 @@ class Cassandra:
   def calc_pci(self):
     df = self.data[self.data['road_index'] != -1].copy()
 
-    # Calculate crack dimensions in meters (change 200 to actual ppm if needed)
-    df['crack_width'] = abs(df['x2'] - df['x1']) / df['ppm']
-    df['crack_length'] = abs(df['y2'] - df['y1']) / df['ppm']
-
-    # Crack area in m²
-    df['crack_area'] = df['crack_width'] * df['crack_length']
-
     # Project to metric CRS to get accurate lengths
     df = df.to_crs("EPSG:3857")
-    df['road_length'] = df.geometry.length
 
-    # Assume road width = 10m
-    df['road_area'] = df['road_length'] * 10
+    # Deduct value of each crack (medium severity)
+    df['dv'] = crack_deduct_values(df, df.geometry.length)
 
-    # Distress density (% of road area)
-    df['dd'] = (df['crack_area'] / df['road_area']) * 100
+    # PCI and condition of each road (column-wise, no python loop)
+    pci_df = compute_pci(df)
 
-    # Deduct value (medium severity)
-    df['dv'] = df.apply(lambda row: get_deduct_value(row['label'], row['dd']), axis=1)
+    self.data = self.data\
+      .merge(pci_df,how='left', left_on='road_index', right_on='road_index')
 
-    # Sort by road_index and DV (descending)
-    df = df.sort_values(by=['road_index', 'dv'], ascending=[True, False])
+    return self.data
+  
+  def road_pci(self, columns="road_index, crack_count, crack_area, crack_counts, pci, condition, last_updated", road_columns=None):
+    # PCI per road maintained by the spark stream (no scan of the crack table),
+    # with the road attributes in road_columns (None: the road geometries too)
+    self.scan("road_pci", columns)
 
-    # Group by road and calculate PCI
-    pci_list = []
-    for road_index, group in df.groupby('road_index'):
-        deduct_values = group['dv'].tolist()
-        q = sum(1 for dv in deduct_values if dv > 2)
+    return self.join_roads(road_columns)
 
-        if not deduct_values:
-            pci = 100.0
-        elif len(deduct_values) == 1:
-            pci = 100 - deduct_values[0]
-        else:
-            # Total Deduct Value
-            tdv = sum(deduct_values)
+  def road_pci_layer(self, zoom):
+    """
+    PCI map layer of the roads with cracks, lines simplified for a zoom level, encoded to JSON
+    once per zoom level and PCI snapshot (cached until the stream writes a new micro-batch).
 
-            # Simple CDV correction approximation (more precise formula can be added)
-            if tdv <= 100:
-                cdv = tdv - (tdv**2 / 250)
-            else:
-                cdv = 100 - 10 * np.sqrt(tdv - 100)
+    Parameters:
+    - zoom (int): map zoom level (see road_geometry.ZOOM_LEVELS)
 
-            pci = max(0, 100 - cdv)
+    Returns:
+    - EncodedLayer: JSON records with 'path', 'color', 'name', 'condition', 'pci' and 'label'
+      (most frequent crack type), one per line of a road, and the view showing all the roads
+    """
+    result_cache.check(self.data_version)
 
-        pci_list.append({'road_index': road_index, 'pci': round(pci, 2)})
+    key = ('road_pci_layer', zoom_level(zoom), result_cache.version)
 
-    # Convert to DataFrame for export/plot
-    pci_df = pd.DataFrame(pci_list)
+    layer = result_cache.get(key)
+    if layer is None:
+      roads = self.road_pci(columns="road_index, crack_counts, pci, condition", road_columns=['name'])
 
-    pci_df['condition'] = pci_df['pci'].apply(self.pci_condition_label)
+      roads['label'] = roads['crack_counts'].map(lambda counts: max(counts, key=counts.get) if counts else None)
+      roads['pci'] = roads['pci'].round(1)
 
-    
-    self.data = self.data\
-      .merge(pci_df,how='left', left_on='road_index', right_on='road_index')
+      layer = encode_layer(
+        roads
+          .drop(columns=['crack_counts'])
+          .merge(road_paths(zoom_level(zoom)), on='road_index')
+      )
+
+      # the size of the encoded records (grows with the number of coordinates)
+      result_cache.put(key, layer, size=len(layer.json))
+
+    return layer
+
+  def crack_counts(self, by=()):
+    """
+    Number of cracks of each type by road attributes, from the crack counts per road
+    maintained by the stream (no read of the crack tables, no groupby of crack rows).
+
+    Parameters:
+    - by (list): road attributes to group by (e.g. ['maxspeed'], ['bridge', 'tunnel'] or ['road_index'])
+
+    Returns:
+    - DataFrame: by columns, 'label' and 'count' (cracks matched to a road only)
+    """
+    key = ('crack_counts', tuple(by))
+
+    result_cache.check(self.data_version)
+
+    data = result_cache.get(key)
+    if data is None:
+      counts = road_label_counts(self.scan("road_pci", "road_index, crack_counts"))
+      data = count_by(counts, load_road_attributes(), by)
+      result_cache.put(key, data.copy())
+
+    self.data = data
 
     return self.data
-  
+
+  def snapshot(self, columns=None, start=None, end=None, dists=None, road_index=None, labels=None, path=SNAPSHOT_PATH):
+    """
+    Reads the cracks from the parquet snapshots instead of cassandra (for heavy analytical
+    reads, the snapshot is as recent as the last export). Only the (day, district) directories
+    and the row groups matching the filters are read, the files are memory-mapped.
+
+    Parameters:
+    - columns (list): selected columns (default: all, road attributes included)
+    - start, end (date): first and last day (default: all days)
+    - dists (list): only the cracks of these districts
+    - road_index (list): only the cracks of these roads
+    - labels (list): only the cracks of these types
+
+    Returns:
+    - DataFrame: selected columns of the cracks
+    """
+    conditions = []
+    if start is not None:
+      conditions.append(ds.field('day') >= start)
+    if end is not None:
+      conditions.append(ds.field('day') <= end)
+    if dists is not None:
+      conditions.append(ds.field('dist').isin(list(dists)))
+    if road_index is not None:
+      conditions.append(ds.field('road_index').isin([int(road) for road in road_index]))
+    if labels is not None:
+      conditions.append(ds.field('label').isin(list(labels)))
+
+    key = ('snapshot', path, tuple(columns or ()), start, end,
+           tuple(dists or ()) if dists is not None else None,
+           tuple(road_index) if road_index is not None else None,
+           tuple(labels) if labels is not None else None)
+
+    result_cache.check(self.data_version)
+
+    data = result_cache.get(key)
+    if data is None:
+      if not os.path.isdir(path):
+        data = pd.DataFrame(columns=columns)
+      else:
+        dataset = ds.dataset(
+          path, format='parquet', partitioning=snapshot_partitioning,
+          filesystem=LocalFileSystem(use_mmap=True)
+        )
+
+        condition = None
+        for c in conditions:
+          condition = c if condition is None else condition & c
+
+        data = dataset.to_table(columns=columns, filter=condition).to_pandas()
+        data = data.astype({name: dtype for name, dtype in COLUMN_DTYPES.items() if name in data.columns})
+
+      result_cache.put(key, data.copy())
+
+    self.data = data
+
+    return self.data
+
+  def pci_history(self, period='month', scope='all', scope_key='all'):
+    # daily / monthly PCI maintained by the spark stream, one partition in bucket order
+    # scope: 'all', 'district' (scope_key = district name) or 'road' (scope_key = road_index)
+    return self.exec(
+      "SELECT bucket, crack_count, road_count, pci FROM pci_rollup WHERE scope = %s AND scope_key = %s AND period = %s",
+      (scope, str(scope_key), period)
+    )
+
   def pci_condition_label(self, pci):
-    if pci >= 85:
-        return "Excellent"
-    elif pci >= 70:
-        return "Good"
-    elif pci >= 55:
-        return "Fair"
-    elif pci >= 40:
-        return "Poor"
-    elif pci >= 25:
-        return "Very Poor"
-    else:
-        return "Failed"
+    return str(pci_condition([pci])[0])
 
 
 
@@ -1,4 +1,117 @@
 import numpy as np
+import pandas as pd
+
+# Logistic curve parameters for each crack type and severity
+CRACK_CURVES = {
+    'Rutting': {
+        'Low':    {'Dmax': 40, 'k': 0.15, 'x0': 35},
+        'Medium': {'Dmax': 60, 'k': 0.20, 'x0': 30},
+        'High':   {'Dmax': 80, 'k': 0.25, 'x0': 25}
+    },
+    'Reflective & Transverse Crack': {
+        'Low':    {'Dmax': 35, 'k': 0.14, 'x0': 40},
+        'Medium': {'Dmax': 55, 'k': 0.18, 'x0': 35},
+        'High':   {'Dmax': 75, 'k': 0.22, 'x0': 30}
+    },
+    'Block Crack': {
+        'Low':    {'Dmax': 45, 'k': 0.16, 'x0': 30},
+        'Medium': {'Dmax': 65, 'k': 0.20, 'x0': 25},
+        'High':   {'Dmax': 85, 'k': 0.24, 'x0': 20}
+    },
+    'Longitudinal Crack': {
+        'Low':    {'Dmax': 35, 'k': 0.15, 'x0': 35},
+        'Medium': {'Dmax': 55, 'k': 0.18, 'x0': 30},
+        'High':   {'Dmax': 75, 'k': 0.22, 'x0': 25}
+    },
+    'Alligator Crack': {
+        'Low':    {'Dmax': 45, 'k': 0.15, 'x0': 30},
+        'Medium': {'Dmax': 65, 'k': 0.20, 'x0': 25},
+        'High':   {'Dmax': 85, 'k': 0.25, 'x0': 20}
+    },
+    'Patching': {
+        'Low':    {'Dmax': 30, 'k': 0.12, 'x0': 40},
+        'Medium': {'Dmax': 50, 'k': 0.16, 'x0': 35},
+        'High':   {'Dmax': 70, 'k': 0.20, 'x0': 30}
+    },
+    'Potholes': {
+        'Low':    {'Dmax': 50, 'k': 0.20, 'x0': 25},
+        'Medium': {'Dmax': 70, 'k': 0.25, 'x0': 20},
+        'High':   {'Dmax': 90, 'k': 0.30, 'x0': 15}
+    },
+    'Bleeding': {
+        'Low':    {'Dmax': 25, 'k': 0.10, 'x0': 45},
+        'Medium': {'Dmax': 45, 'k': 0.14, 'x0': 40},
+        'High':   {'Dmax': 65, 'k': 0.18, 'x0': 35}
+    },
+    'Corrugation': {
+        'Low':    {'Dmax': 35, 'k': 0.13, 'x0': 40},
+        'Medium': {'Dmax': 55, 'k': 0.17, 'x0': 35},
+        'High':   {'Dmax': 75, 'k': 0.21, 'x0': 30}
+    },
+    'Raveling & Weathering': {
+        'Low':    {'Dmax': 30, 'k': 0.11, 'x0': 45},
+        'Medium': {'Dmax': 50, 'k': 0.15, 'x0': 40},
+        'High':   {'Dmax': 70, 'k': 0.19, 'x0': 35}
+    },
+    'Bumps & Sags': {
+        'Low':    {'Dmax': 40, 'k': 0.14, 'x0': 35},
+        'Medium': {'Dmax': 60, 'k': 0.18, 'x0': 30},
+        'High':   {'Dmax': 80, 'k': 0.22, 'x0': 25}
+    },
+}
+
+CRACK_TYPES = list(CRACK_CURVES.keys())
+SEVERITIES = ['Low', 'Medium', 'High']
+
+# Curves precompiled into parameter arrays indexed by [crack type code, severity code]
+DMAX = np.array([[CRACK_CURVES[t][s]['Dmax'] for s in SEVERITIES] for t in CRACK_TYPES], dtype='float64')
+K = np.array([[CRACK_CURVES[t][s]['k'] for s in SEVERITIES] for t in CRACK_TYPES], dtype='float64')
+X0 = np.array([[CRACK_CURVES[t][s]['x0'] for s in SEVERITIES] for t in CRACK_TYPES], dtype='float64')
+
+CRACK_TYPE_INDEX = pd.Index(CRACK_TYPES)
+SEVERITY_INDEX = pd.Index(SEVERITIES)
+
+def check_codes(codes, values, available, name, available_name):
+    # codes of -1 are values that are not in the curves
+    if (codes == -1).any():
+        value = np.atleast_1d(np.asarray(values, dtype=object))[codes == -1][0]
+        raise ValueError(f"Unsupported {name}: {value}. Available {available_name}: {available}")
+
+def deduct_values_from_codes(type_codes, severity_codes, densities) -> np.ndarray:
+    # Cap density between 0 and 100 (missing densities count as 100 like max(0, min(100, nan)))
+    density = np.asarray(densities, dtype='float64')
+    density = np.where(np.isnan(density), 100, np.clip(density, 0, 100))
+
+    Dmax = DMAX[type_codes, severity_codes]
+    k = K[type_codes, severity_codes]
+    x0 = X0[type_codes, severity_codes]
+
+    # Logistic function
+    deduct_values = Dmax / (1 + np.exp(-k * (density - x0)))
+    return np.round(deduct_values, 2)
+
+def get_deduct_values(crack_types, densities, severities='Medium') -> np.ndarray:
+    """
+    Returns the deduct values for whole columns of crack types and densities in one pass.
+    
+    Parameters:
+    - crack_types (array-like of str): crack type of each row
+    - densities (array-like of float): distress density of each row as a percentage (0-100)
+    - severities (str or array-like of str): one severity for all rows or one per row ('Low', 'Medium', 'High')
+    
+    Returns:
+    - np.ndarray: Deduct values (0-100) rounded to 2 decimals
+    """
+    type_codes = CRACK_TYPE_INDEX.get_indexer(np.asarray(crack_types, dtype=object))
+    check_codes(type_codes, crack_types, CRACK_TYPES, 'crack type', 'types')
+
+    if isinstance(severities, str):
+        severity_codes = np.array([SEVERITIES.index(severities) if severities in SEVERITIES else -1])
+    else:
+        severity_codes = SEVERITY_INDEX.get_indexer(np.asarray(severities, dtype=object))
+    check_codes(severity_codes, severities, SEVERITIES, 'severity', 'severities')
+
+    return deduct_values_from_codes(type_codes, severity_codes, densities)
 
 def get_deduct_value(crack_type: str, density: float, severity: str = 'Medium') -> float:
     """
@@ -12,81 +125,11 @@ def get_deduct_value(crack_type: str, density: float, severity: str = 'Medium')
     Returns:
     - float: Deduct value (0-100)
     """
-    
-    # Define logistic curve parameters for each crack type and severity
-    crack_curves = {
-        'Rutting': {
-            'Low':    {'Dmax': 40, 'k': 0.15, 'x0': 35},
-            'Medium': {'Dmax': 60, 'k': 0.20, 'x0': 30},
-            'High':   {'Dmax': 80, 'k': 0.25, 'x0': 25}
-        },
-        'Reflective & Transverse Crack': {
-            'Low':    {'Dmax': 35, 'k': 0.14, 'x0': 40},
-            'Medium': {'Dmax': 55, 'k': 0.18, 'x0': 35},
-            'High':   {'Dmax': 75, 'k': 0.22, 'x0': 30}
-        },
-        'Block Crack': {
-            'Low':    {'Dmax': 45, 'k': 0.16, 'x0': 30},
-            'Medium': {'Dmax': 65, 'k': 0.20, 'x0': 25},
-            'High':   {'Dmax': 85, 'k': 0.24, 'x0': 20}
-        },
-        'Longitudinal Crack': {
-            'Low':    {'Dmax': 35, 'k': 0.15, 'x0': 35},
-            'Medium': {'Dmax': 55, 'k': 0.18, 'x0': 30},
-            'High':   {'Dmax': 75, 'k': 0.22, 'x0': 25}
-        },
-        'Alligator Crack': {
-            'Low':    {'Dmax': 45, 'k': 0.15, 'x0': 30},
-            'Medium': {'Dmax': 65, 'k': 0.20, 'x0': 25},
-            'High':   {'Dmax': 85, 'k': 0.25, 'x0': 20}
-        },
-        'Patching': {
-            'Low':    {'Dmax': 30, 'k': 0.12, 'x0': 40},
-            'Medium': {'Dmax': 50, 'k': 0.16, 'x0': 35},
-            'High':   {'Dmax': 70, 'k': 0.20, 'x0': 30}
-        },
-        'Potholes': {
-            'Low':    {'Dmax': 50, 'k': 0.20, 'x0': 25},
-            'Medium': {'Dmax': 70, 'k': 0.25, 'x0': 20},
-            'High':   {'Dmax': 90, 'k': 0.30, 'x0': 15}
-        },
-        'Bleeding': {
-            'Low':    {'Dmax': 25, 'k': 0.10, 'x0': 45},
-            'Medium': {'Dmax': 45, 'k': 0.14, 'x0': 40},
-            'High':   {'Dmax': 65, 'k': 0.18, 'x0': 35}
-        },
-        'Corrugation': {
-            'Low':    {'Dmax': 35, 'k': 0.13, 'x0': 40},
-            'Medium': {'Dmax': 55, 'k': 0.17, 'x0': 35},
-            'High':   {'Dmax': 75, 'k': 0.21, 'x0': 30}
-        },
-        'Raveling & Weathering': {
-            'Low':    {'Dmax': 30, 'k': 0.11, 'x0': 45},
-            'Medium': {'Dmax': 50, 'k': 0.15, 'x0': 40},
-            'High':   {'Dmax': 70, 'k': 0.19, 'x0': 35}
-        },
-        'Bumps & Sags': {
-            'Low':    {'Dmax': 40, 'k': 0.14, 'x0': 35},
-            'Medium': {'Dmax': 60, 'k': 0.18, 'x0': 30},
-            'High':   {'Dmax': 80, 'k': 0.22, 'x0': 25}
-        },
-    }
-    
-    if crack_type not in crack_curves:
-        available_types = list(crack_curves.keys())
-        raise ValueError(f"Unsupported crack type: {crack_type}. Available types: {available_types}")
-    
-    if severity not in crack_curves[crack_type]:
-        available_severities = list(crack_curves[crack_type].keys())
-        raise ValueError(f"Unsupported severity: {severity}. Available severities: {available_severities}")
-    
-    # Cap density between 0 and 100
-    density = max(0, min(100, density))
-    
-    # Get parameters for the specific crack type and severity
-    params = crack_curves[crack_type][severity]
-    Dmax, k, x0 = params['Dmax'], params['k'], params['x0']
-    
-    # Logistic function
-    deduct_value = Dmax / (1 + np.exp(-k * (density - x0)))
-    return round(deduct_value, 2)
\ No newline at end of file
+    # list lookups instead of get_indexer, cheaper for a single value
+    type_code = np.array([CRACK_TYPES.index(crack_type) if crack_type in CRACK_TYPES else -1])
+    check_codes(type_code, crack_type, CRACK_TYPES, 'crack type', 'types')
+
+    severity_code = np.array([SEVERITIES.index(severity) if severity in SEVERITIES else -1])
+    check_codes(severity_code, severity, SEVERITIES, 'severity', 'severities')
+
+    return deduct_values_from_codes(type_code, severity_code, [density])[0]
@@ -1,5 +1,6 @@
 import streamlit as st
 from db import Cassandra
+from road_index import ROAD_COLUMNS, road_lengths
 import matplotlib.pyplot as plt
 import plotly.express as px
 import numpy as np
@@ -16,9 +17,9 @@ local_css("style.css")
 # ---------------------------------------------------------------------------------
 
 cassandra = Cassandra()
-cassandra.exec("SELECT * FROM crack LIMIT 10")
-data = cassandra.join_roads()
-data = data.drop(['geometry', 'index', 'road_index', 'id'], axis=1)
+cassandra.latest_cracks(10)
+data = cassandra.join_roads(ROAD_COLUMNS)
+data = data.drop(['road_index', 'id', 'day'], axis=1)
 
 st.title("Pavement eye 🛣️")
 
@@ -32,7 +33,8 @@ col1, col2 = st.columns([1, 2])
 
 with col1:
   st.markdown("###### Percentage of each crack type")
-  data1 = cassandra.exec("SELECT label FROM crack")
+  # counts maintained by the stream (no read of the crack rows)
+  data1 = cassandra.crack_counts()
 
   cmap = plt.get_cmap('Dark2')
 
@@ -40,16 +42,13 @@ with col1:
 
   fig, ax = plt.subplots(1, 1)
 
-  plot = data1.groupby('label')['label'].count()
+  plot = data1.set_index('label')['count']
 
   colors = cmap(np.linspace(0, 1, len(plot.index)))
   ax.pie(plot, labels=plot.index, autopct='%.2f%%', colors=colors)
   st.pyplot(fig)
 # -----------------------------------------------------------------------------------
-cassandra.exec("SELECT road_index, label FROM crack")
-data2 = cassandra.join_roads()
-
-grouped_df = data2.groupby(["fclass", "label"]).size().reset_index(name='count')
+grouped_df = cassandra.crack_counts(['fclass'])
 
 with col2:
   # Title
@@ -67,12 +66,13 @@ with col2:
 
   st.plotly_chart(fig, use_container_width=True)
 # ----------------------------------------------------------------------------------
-data2 = data2.to_crs("EPSG:3857")
-data2['length_km'] = data2.geometry.length / 1000
-total_len_km = data2['length_km'].sum()
+# cracks per road, road lengths stored in the road network artifact (no geometry projection)
+data2 = cassandra.crack_counts(['road_index'])
+data2['length_km'] = road_lengths().reindex(data2['road_index']).to_numpy() / 1000
+total_len_km = (data2['length_km'] * data2['count']).sum()
 
 st.markdown(f"""
-##### Total Number of cracks = {len(data2)} Crack
+##### Total Number of cracks = {data2['count'].sum()} Crack
 
 
 ##### Total length in Km = {total_len_km} KM
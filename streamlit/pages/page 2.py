@@ -1,7 +1,7 @@
 import streamlit as st
 import pydeck as pdk
 from db import Cassandra
-import json
+from road_geometry import ZOOM_LEVELS, EncodedDeck
 import matplotlib.pyplot as plt
 import contextily as ctx
 
@@ -17,15 +17,15 @@ local_css("./style.css")
 # ---------------------------------------------------------------------------------
 
 cassandra = Cassandra()
-cassandra.exec("SELECT lon, lat, confidence FROM crack")
+cassandra.cracks("lon, lat, confidence")
 data = cassandra.data
 
 st.title("Cracks heatmap")
 
 view_state = pdk\
 .ViewState(
-    latitude=data['lat'].iloc[0], 
-    longitude=data['lon'].iloc[0], 
+    latitude=float(data['lat'].iloc[0]), 
+    longitude=float(data['lon'].iloc[0]), 
     zoom=10, 
     pitch=45
 )
@@ -55,21 +55,12 @@ st.pydeck_chart(deck)
 # -----------------------------------------------------------------------------------------------
 st.title("Roads PCI")
 
-cassandra.exec("SELECT x1,x2,y1,y2, road_index, label, ppm FROM crack")
-cassandra.join_roads()
-cassandra.calc_pci()
-data = cassandra.data
-
-data["color"] = data["condition"].map({
-    "Excellent": [0, 255, 0],        # Bright neon green
-    "Good": [0, 200, 255],           # Cyan / bright sky blue
-    "Fair": [255, 255, 0],           # Pure yellow
-    "Poor": [255, 165, 0],           # Bright orange
-    "Very Poor": [255, 0, 255],      # Magenta (very visible)
-    "Failed": [255, 0, 0],           # Bright red
-})
+# road lines simplified for the zoom level (less points to send at low zoom)
+zoom = st.select_slider("Road detail (map zoom)", options=ZOOM_LEVELS, value=12)
 
-geojson_data = json.loads(data.to_json())
+# PCI per road maintained by the stream, lines, colors and tooltip columns already encoded
+# (the same JSON is sent on every rerun until the stream writes new PCI values)
+layer_data = cassandra.road_pci_layer(zoom)
 
 tooltip = {
     "html": """
@@ -85,25 +76,23 @@ tooltip = {
     }
 }
 
-# 2. Create Pydeck Layer
+# 2. Create Pydeck Layer (its data is replaced by the encoded records)
 layer = pdk.Layer(
-    "GeoJsonLayer",
-    data=geojson_data,  # must be a dict or URL
-    get_line_color="properties.color",  # must be stored in properties
-    get_line_width=7,
+    "PathLayer",
+    data=EncodedDeck.PLACEHOLDER,
+    get_path="path",
+    get_color="color",
+    get_width=7,
+    width_units="pixels",
     pickable=True,
     auto_highlight=True
 )
 
-# 3. Define view
-view_state = pdk.ViewState(
-    latitude=data.geometry.centroid.y.mean(),
-    longitude=data.geometry.centroid.x.mean(),
-    zoom=12
-)
+# 3. Define view (all the roads with a PCI)
+view_state = pdk.ViewState(**layer_data.view)
 
 # 4. Render
-deck = pdk.Deck(layers=[layer], initial_view_state=view_state, tooltip=tooltip, map_style="light")
+deck = EncodedDeck(layer_data, layers=[layer], initial_view_state=view_state, tooltip=tooltip, map_style="light")
 st.pydeck_chart(deck)
 # --------------------------------------------------------------------------------------------------
 # data = data.to_crs(epsg=3857)
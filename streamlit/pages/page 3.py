@@ -1,6 +1,7 @@
 import streamlit as st
 import matplotlib.pyplot as plt
 from db import Cassandra
+from crack_aggregates import road_label_counts
 import plotly.express as px
 import pandas as pd
 import numpy as np
@@ -24,13 +25,20 @@ Normal road means road that is not tunnel or bridge.
 """)
 
 cassandra = Cassandra()
-cassandra.exec("SELECT road_index, label FROM crack")
-df = cassandra.join_roads()
 
-bridge = df[df['bridge'] == 'T'].groupby(['label']).size().rename('count')
-tunnel = df[df['tunnel'] == 'T'].groupby(['label']).size().rename('count')
+# PCI and crack counts per road maintained by the stream (no scan of the crack table)
+roads = cassandra.road_pci(columns="road_index, crack_counts, pci", road_columns=['name', 'fclass'])
 
-normal = df[(df['bridge'] == 'F') & (df['bridge'] == 'F')].groupby(['label']).size().rename('count')
+# one row per road and crack type
+counts = road_label_counts(roads).merge(roads[['road_index', 'name']], on='road_index')
+
+# crack counts by bridge / tunnel (small result, cached by db.py)
+types = cassandra.crack_counts(['bridge', 'tunnel'])
+
+bridge = types[types['bridge'] == 'T'].groupby(['label'], observed=True)['count'].sum().rename('count')
+tunnel = types[types['tunnel'] == 'T'].groupby(['label'], observed=True)['count'].sum().rename('count')
+
+normal = types[(types['bridge'] == 'F') & (types['tunnel'] == 'F')].groupby(['label'], observed=True)['count'].sum().rename('count')
 
 colors1 = cmap(np.linspace(0, 1, len(bridge.index)))
 colors2 = cmap(np.linspace(0, 1, len(tunnel.index)))
@@ -76,12 +84,7 @@ col1, col2 = st.columns(2)
 
 with col1:
 
-    cassandra.exec("SELECT x1,x2,y1,y2, road_index, label, ppm FROM crack")
-    cassandra.join_roads()
-    cassandra.calc_pci()
-    df = cassandra.data
-
-    df = df[df['road_index'] != -1]
+    df = roads[roads['road_index'] != -1]
 
     group = df.groupby(['road_index']).agg({
     'name': 'first',
@@ -112,7 +115,7 @@ with col1:
     st.plotly_chart(fig, use_container_width=True)
 # -----------------------------------------------------------------------------------------
 with col2:
-    top_damaged_df = df[df['road_index'].isin(top_10_damaged_roads)]
+    top_damaged_df = counts[counts['road_index'].isin(top_10_damaged_roads)]
 
     # Step 1: Replace missing names
     top_damaged_df['name'] = top_damaged_df['name'].fillna(top_damaged_df['road_index'])
@@ -122,8 +125,8 @@ with col2:
         top_damaged_df,
         index=['road_index', 'name'],    # include name in index
         columns='label',
-        values='geometry',
-        aggfunc='count'
+        values='count',
+        aggfunc='sum'
     ).fillna(0).astype(int)
 
     # Step 3: Reset index to flatten
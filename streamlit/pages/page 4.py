@@ -21,17 +21,16 @@ cmap = plt.get_cmap('Dark2')
 st.title("Historical PCI (Pavement Condition index)")
 
 cassandra = Cassandra()
-cassandra.exec("SELECT x1,x2,y1,y2, road_index, label, ppm, timestamp FROM crack")
-cassandra.join_roads()
-cassandra.calc_pci()
-data = cassandra.data
 
-data = data.to_crs(epsg=3857)
+# monthly PCI of all roads maintained by the stream (one row per month with new cracks)
+data = cassandra.pci_history(period='month')
 
-data = data.sort_values("timestamp")
-data = data.set_index("timestamp")
+st.markdown("###### Mean PCI of the roads at the end of each month, from all the cracks seen up to then")
 
-monthly_pci = data["pci"].resample("ME").mean().fillna(method='ffill')
+data = data.set_index("bucket")
+
+# months without new cracks keep the last PCI
+monthly_pci = data["pci"].resample("ME").mean().ffill()
 
 
 x = monthly_pci.index.astype(int)
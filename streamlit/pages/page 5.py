@@ -17,9 +17,9 @@ cmap = plt.get_cmap('Dark2')
 # ---------------------------------------------------------------------------------
 
 cassandra = Cassandra()
-cassandra.exec("SELECT label, road_index FROM crack")
-cassandra.join_roads()
-cracks_df = cassandra.data
+# crack counts by road attributes maintained by the stream (no read of the crack rows)
+cracks_df = cassandra.crack_counts(['maxspeed'])
+oneway_df = cassandra.crack_counts(['oneway'])
 
 col1, col2 = st.columns([2, 1])
 
@@ -29,11 +29,7 @@ with col1:
 
   cracks_df = cracks_df[cracks_df['maxspeed'] > 0]
 
-  speed_cracks = (
-      cracks_df.groupby(["maxspeed", "label"])
-      .size()
-      .reset_index(name="count")
-  )
+  speed_cracks = cracks_df
 
   pivot_speed = speed_cracks.pivot(
       index="maxspeed", columns="label", values="count"
@@ -54,8 +50,8 @@ with col1:
 
   # Corrected annotation loop
   counts = cracks_df\
-    .groupby(['maxspeed'])\
-    .size()\
+    .groupby(['maxspeed'])['count']\
+    .sum()\
     .sort_index()\
     .to_list()
 
@@ -73,13 +69,13 @@ with col1:
 
 with col2:
   st.markdown("##### One way roads vs both")
-  df = cassandra.data
+  df = oneway_df
 
-  oneway_B = df[df['oneway'] == 'B'].groupby(['label']).size()
-  oneway_F = df[df['oneway'] == 'F'].groupby(['label']).size()
+  oneway_B = df[df['oneway'] == 'B'].groupby(['label'], observed=True)['count'].sum()
+  oneway_F = df[df['oneway'] == 'F'].groupby(['label'], observed=True)['count'].sum()
 
-  categories_B = df[df['oneway'] == 'B']['label'].unique()
-  categories_F = df[df['oneway'] == 'F']['label'].unique()
+  categories_B = oneway_B.index
+  categories_F = oneway_F.index
 
   fig = go.Figure()
 
@@ -0,0 +1,177 @@
+# PCI (Pavement Condition Index) engine
+# Column-wise version of the per-road loop, used by the dashboard (db.py)
+# and by batch / streaming jobs.
+
+import sys
+import numpy as np
+import pandas as pd
+from deduct_value_func import get_deduct_values
+
+# Assume road width = 10m
+ROAD_WIDTH_M = 10
+
+# python's sum() of floats (used by the per-road loop for the TDV) is compensated
+# (Neumaier) since python 3.12, plain left to right before
+COMPENSATED_SUM = sys.version_info >= (3, 12)
+
+# roads with more deduct values than this are summed by sum() itself (one call per road)
+SMALL_GROUP = 32
+
+# lower PCI bound of each condition (checked in order)
+PCI_CONDITIONS = [
+    (85, "Excellent"),
+    (70, "Good"),
+    (55, "Fair"),
+    (40, "Poor"),
+    (25, "Very Poor"),
+]
+
+def crack_deduct_values(cracks, road_length):
+    """
+    Returns the deduct value of every crack (medium severity).
+
+    Parameters:
+    - cracks (DataFrame): cracks with 'x1', 'x2', 'y1', 'y2', 'ppm' and 'label' columns
+    - road_length (array-like): length in meters of the road of each crack
+
+    Returns:
+    - np.ndarray: deduct value of each crack
+    """
+    # Calculate crack dimensions in meters
+    crack_width = np.abs(cracks['x2'] - cracks['x1']) / cracks['ppm']
+    crack_length = np.abs(cracks['y2'] - cracks['y1']) / cracks['ppm']
+
+    # Crack area in m²
+    crack_area = crack_width * crack_length
+
+    road_area = np.asarray(road_length) * ROAD_WIDTH_M
+
+    # Distress density (% of road area)
+    dd = (crack_area / road_area) * 100
+
+    return get_deduct_values(cracks['label'], dd)
+
+def pci_from_totals(count, tdv):
+    """
+    PCI of each road from its number of deduct values and their sum (TDV).
+
+    Parameters:
+    - count (array-like): number of deduct values of each road
+    - tdv (array-like): total deduct value of each road
+
+    Returns:
+    - np.ndarray: PCI of each road rounded to 2 decimals
+    """
+    count = np.asarray(count)
+    tdv = np.asarray(tdv, dtype='float64')
+
+    # Simple CDV correction approximation (more precise formula can be added)
+    with np.errstate(invalid='ignore'):
+        cdv = np.where(tdv <= 100, tdv - (tdv ** 2 / 250), 100 - 10 * np.sqrt(tdv - 100))
+
+    pci = np.where(
+        count == 0, 100.0,
+        np.where(count == 1, 100 - tdv, np.maximum(0, 100 - cdv))
+    )
+
+    rounded = np.round(pci, 2)
+
+    # The per-road loop rounded plain python floats (one crack or TDV <= 100) with round(),
+    # which is exact on halfway values where np.round can be 0.01 off, so those few are redone
+    # (a 0.01 shift can move a road to another condition)
+    scaled = pci * 100
+    halfway = np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6
+    redo = np.flatnonzero(halfway & ((count == 1) | (tdv <= 100)))
+    rounded[redo] = [round(float(value), 2) for value in pci[redo]]
+
+    return rounded
+
+def pci_condition(pci):
+    # condition label of each PCI value
+    pci = np.asarray(pci, dtype='float64')
+    return np.select(
+        [pci >= bound for bound, _ in PCI_CONDITIONS],
+        [label for _, label in PCI_CONDITIONS],
+        default="Failed"
+    )
+
+def python_group_sums(values, starts, sizes):
+    """
+    Sum of each group of values with the same floating point result as python's sum() of the group.
+
+    The groups of at most SMALL_GROUP values are summed column-wise (step j adds the j-th value
+    of every group that has one), the larger ones with sum() itself: at most
+    len(values) / SMALL_GROUP calls, and one call for a road with most of the cracks.
+
+    Parameters:
+    - values (np.ndarray): values of all the groups, each group contiguous
+    - starts (np.ndarray): index of the first value of each group
+    - sizes (np.ndarray): number of values of each group
+
+    Returns:
+    - np.ndarray: sum of each group
+    """
+    totals = np.zeros(len(sizes))
+    small = sizes <= SMALL_GROUP
+
+    # small groups sorted by size, the first k have a j-th value
+    order = np.flatnonzero(small)
+    order = order[np.argsort(-sizes[order], kind='stable')]
+    sorted_sizes = sizes[order]
+    sorted_starts = starts[order]
+
+    sums = np.zeros(len(order))
+    compensation = np.zeros(len(order))
+
+    with np.errstate(invalid='ignore'):
+        for j in range(sorted_sizes[0] if len(order) else 0):
+            k = np.searchsorted(-sorted_sizes, -j, side='left')
+            x = values[sorted_starts[:k] + j]
+            s = sums[:k]
+            t = s + x
+
+            if COMPENSATED_SUM:
+                compensation[:k] += np.where(np.abs(s) >= np.abs(x), (s - t) + x, (x - t) + s)
+
+            sums[:k] = t
+
+        if COMPENSATED_SUM:
+            # sum() only adds a non zero and finite compensation
+            sums = np.where((compensation != 0) & np.isfinite(compensation), sums + compensation, sums)
+
+    totals[order] = sums
+
+    for i in np.flatnonzero(~small):
+        totals[i] = sum(values[starts[i]:starts[i] + sizes[i]].tolist())
+
+    return totals
+
+def compute_pci(df, road_col='road_index', dv_col='dv'):
+    """
+    Computes the PCI of every road from the deduct values of its cracks.
+
+    Parameters:
+    - df (DataFrame): one row per crack with the road index and deduct value columns
+
+    Returns:
+    - DataFrame: one row per road with 'road_index', 'pci' and 'condition'
+    """
+    # Sort by road_index and DV (descending), the TDV is added in this order like the per-road loop
+    dvs = df[[road_col, dv_col]].sort_values(by=[road_col, dv_col], ascending=[True, False])
+    roads = dvs[road_col].to_numpy()
+    values = dvs[dv_col].to_numpy(dtype='float64')
+
+    # start and size of each road's block of deduct values
+    starts = np.flatnonzero(np.r_[True, roads[1:] != roads[:-1]]) if len(roads) else np.array([], dtype='int64')
+    sizes = np.diff(np.r_[starts, len(roads)])
+
+    # Total Deduct Value of each road
+    tdv = python_group_sums(values, starts, sizes)
+
+    pci_df = pd.DataFrame({
+        road_col: roads[starts],
+        'pci': pci_from_totals(sizes, tdv),
+    })
+    pci_df['condition'] = pci_condition(pci_df['pci'])
+
+    return pci_df
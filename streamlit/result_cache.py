@@ -0,0 +1,105 @@
+# Process-wide cache of query results, shared by all the pages and users of the dashboard
+# - at most max_entries results and max_mb of data (least recently used dropped first)
+# - every result expires after ttl_s seconds
+# - every result is dropped when the data version changes (new micro-batch written by the
+#   stream, see stream_progress in scripts/cassandra.cql), checked at most every check_interval_s
+
+import threading
+import time
+from collections import OrderedDict
+
+class ResultCache:
+  def __init__(self, max_entries=64, max_mb=512, ttl_s=300, check_interval_s=5):
+    self.max_entries = max_entries
+    self.max_bytes = max_mb * 2 ** 20
+    self.ttl_s = ttl_s
+    self.check_interval_s = check_interval_s
+
+    self._lock = threading.Lock()
+    self._entries = OrderedDict()  # key -> (expires_at, size, value)
+    self._bytes = 0
+    self._version = None
+    self._checked_at = float('-inf')
+
+    # stats
+    self._hits = 0
+    self._misses = 0
+    self._invalidations = 0
+
+  @property
+  def version(self):
+    # data version of the cached results (last version_fn value of check)
+    with self._lock:
+      return self._version
+
+  def get(self, key):
+    # copy of the cached DataFrame (pages modify their frames), immutable values
+    # (e.g. encoded layers) as they are, or None
+    with self._lock:
+      entry = self._entries.get(key)
+
+      if entry is None or entry[0] < time.monotonic():
+        if entry is not None:
+          self._drop(key)
+        self._misses += 1
+        return None
+
+      self._entries.move_to_end(key)
+      self._hits += 1
+      value = entry[2]
+      return value.copy() if hasattr(value, 'copy') else value
+
+  def put(self, key, data, size=None):
+    # size: bytes of the value (default: memory usage of the DataFrame, which doesn't
+    # count the content of nested lists)
+    if size is None:
+      size = int(data.memory_usage(index=True, deep=True).sum())
+    if size > self.max_bytes:
+      return
+
+    with self._lock:
+      if key in self._entries:
+        self._drop(key)
+
+      self._entries[key] = (time.monotonic() + self.ttl_s, size, data)
+      self._bytes += size
+
+      while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+        self._drop(next(iter(self._entries)))
+
+  def _drop(self, key):
+    _, size, _ = self._entries.pop(key)
+    self._bytes -= size
+
+  def invalidate(self):
+    with self._lock:
+      self._entries.clear()
+      self._bytes = 0
+      self._invalidations += 1
+
+  def check(self, version_fn):
+    # drops every result when the version returned by version_fn changed
+    now = time.monotonic()
+    with self._lock:
+      if now - self._checked_at < self.check_interval_s:
+        return
+      self._checked_at = now
+
+    version = version_fn()
+
+    with self._lock:
+      changed = version != self._version
+      self._version = version
+
+    if changed:
+      self.invalidate()
+
+  def stats(self):
+    with self._lock:
+      return {
+        "entries": len(self._entries),
+        "mb": round(self._bytes / 2 ** 20, 1),
+        "hits": self._hits,
+        "misses": self._misses,
+        "invalidations": self._invalidations,
+      }
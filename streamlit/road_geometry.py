@@ -0,0 +1,138 @@
+# Road lines of the PCI map (page 2), pre-simplified per zoom level
+# The road geometries are simplified once per process and zoom level to about half
+# a pixel at that zoom, and kept as PathLayer paths ([lon, lat] lists rounded to ~1 m)
+# indexed by road_index: a map render only joins them to the PCI rows of the roads
+# with cracks, without GeoJSON encoding or geometry operations.
+# The layer data (paths, colors and tooltip columns) is encoded to JSON once per zoom
+# level and PCI snapshot (cached by db.Cassandra.road_pci_layer), EncodedDeck sends it
+# as it is instead of serializing every path again on each rerun.
+
+import sys
+import os
+from collections import namedtuple
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+import pydeck as pdk
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+from road_index import ROADS_ARTIFACT, load_roads
+
+# zoom levels with simplified lines (the closest one is used)
+ZOOM_LEVELS = [8, 10, 12, 14, 16]
+
+# decimals of the path coordinates (5 decimals ~ 1 m)
+COORD_DECIMALS = 5
+
+# line color of each PCI condition
+CONDITION_COLORS = {
+  "Excellent": [0, 255, 0],        # Bright neon green
+  "Good": [0, 200, 255],           # Cyan / bright sky blue
+  "Fair": [255, 255, 0],           # Pure yellow
+  "Poor": [255, 165, 0],           # Bright orange
+  "Very Poor": [255, 0, 255],      # Magenta (very visible)
+  "Failed": [255, 0, 0],           # Bright red
+}
+
+# columns sent to the map (path, color and tooltip)
+LAYER_COLUMNS = ["path", "color", "name", "condition", "pci", "label"]
+
+# PathLayer data encoded as a JSON array of records, and the view showing all its roads
+EncodedLayer = namedtuple('EncodedLayer', ['json', 'view'])
+
+def zoom_level(zoom):
+  # closest zoom level with simplified lines
+  return min(ZOOM_LEVELS, key=lambda level: abs(level - zoom))
+
+def tolerance_deg(zoom):
+  # half a pixel (256 px tiles) at this zoom, in degrees
+  return 360 / (256 * 2 ** zoom) / 2
+
+@lru_cache(maxsize=None)
+def road_paths(zoom, path=ROADS_ARTIFACT):
+  """
+  Simplified lines of all the roads at a zoom level (cached per process).
+
+  Parameters:
+  - zoom (int): map zoom level (rounded to the closest of ZOOM_LEVELS)
+
+  Returns:
+  - DataFrame: 'road_index', 'path' (list of [lon, lat]), 'lon' and 'lat' (center of the road),
+    more than one row for the roads made of more than one line
+  """
+  roads_df = load_roads(path)
+
+  lines = gpd.GeoSeries(
+    roads_df.geometry.simplify(tolerance_deg(zoom_level(zoom)), preserve_topology=False).to_numpy(),
+    index=roads_df['road_index'].to_numpy()
+  ).explode(index_parts=False)
+
+  coords, part = shapely.get_coordinates(lines.to_numpy(), return_index=True)
+  coords = np.round(coords, COORD_DECIMALS)
+
+  sizes = np.bincount(part, minlength=len(lines))
+  bounds = shapely.bounds(lines.to_numpy())
+
+  paths = pd.DataFrame({
+    'road_index': lines.index.to_numpy(),
+    'path': [points.tolist() for points in np.split(coords, np.cumsum(sizes)[:-1])],
+    'lon': ((bounds[:, 0] + bounds[:, 2]) / 2).astype('float32'),
+    'lat': ((bounds[:, 1] + bounds[:, 3]) / 2).astype('float32'),
+  })
+
+  # lines without a segment
+  return paths[sizes >= 2].reset_index(drop=True)
+
+def fit_view(paths):
+  """
+  Initial view of the map showing all the roads.
+
+  Parameters:
+  - paths (DataFrame): rows with 'lon' and 'lat' (output of road_paths)
+
+  Returns:
+  - dict: 'latitude', 'longitude' and 'zoom'
+  """
+  if paths.empty:
+    return {'latitude': 30.0444, 'longitude': 31.2357, 'zoom': 10}
+
+  lon_min, lon_max = float(paths['lon'].min()), float(paths['lon'].max())
+  lat_min, lat_max = float(paths['lat'].min()), float(paths['lat'].max())
+
+  # zoom where the larger extent fits in ~2 tiles (512 px)
+  extent = max(lon_max - lon_min, lat_max - lat_min, 1e-4)
+  zoom = float(np.clip(np.log2(360 * 2 / extent), 0, 16))
+
+  return {'latitude': (lat_min + lat_max) / 2, 'longitude': (lon_min + lon_max) / 2, 'zoom': zoom}
+
+def encode_layer(data):
+  """
+  Encodes the PathLayer data of the PCI map once (JSON records of the layer columns).
+
+  Parameters:
+  - data (DataFrame): output of db.Cassandra.road_pci_layer before encoding ('path', 'condition',
+    tooltip columns, 'lon' and 'lat')
+
+  Returns:
+  - EncodedLayer: JSON records and the initial view
+  """
+  data = data.assign(color=data['condition'].map(CONDITION_COLORS))
+
+  return EncodedLayer(
+    json=data[LAYER_COLUMNS].to_json(orient='records'),
+    view=fit_view(data)
+  )
+
+class EncodedDeck(pdk.Deck):
+  # Deck with the data of a layer already encoded (EncodedLayer): the layer is serialized
+  # with a placeholder that is replaced by the cached JSON
+  PLACEHOLDER = "__encoded_layer_data__"
+
+  def __init__(self, encoded_layer, layers, **kwargs):
+    super().__init__(layers=layers, **kwargs)
+    self.encoded_layer = encoded_layer
+
+  def to_json(self):
+    return super().to_json().replace(f'"{self.PLACEHOLDER}"', self.encoded_layer.json, 1)